@@ -27,20 +27,52 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 def inject_current_year():
     from datetime import datetime
     return {'current_year': datetime.utcnow().year}
+
+from services.pagination import page_url
+from services.images import cover_sources, process_covers_command
+from services.covers import mirror_covers_command
+from services.user_import import import_users_command
+from services.borrowing import reconcile_borrow_counts_command
+from services.events import init_events
+from services.fragments import init_fragment_cache, slot
+from services.assets import asset_url, compress_response
+from services.perf import init_perf_monitor
+from services.profiling import init_profiler
+from services.metrics import init_metrics
+from services.database import sqlite_pragmas, apply_sqlite_pragmas, init_wal_checkpointer
+app.add_template_global(page_url)
+app.add_template_global(cover_sources)
+app.add_template_global(slot)
+app.add_template_global(asset_url)
+app.after_request(compress_response)
+app.cli.add_command(process_covers_command)
+app.cli.add_command(mirror_covers_command)
+app.cli.add_command(import_users_command)
+app.cli.add_command(reconcile_borrow_counts_command)
+
 # Initialize the database
 db.init_app(app)
+init_events(app)
+init_wal_checkpointer(app)
+init_fragment_cache(app)
+init_perf_monitor(app)
+init_profiler(app)
+init_metrics(app)
+
+
+# Validated once at start-up so a bad SQLITE_* setting fails fast
+SQLITE_PRAGMAS = sqlite_pragmas(app.config)
 
 
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
-    # For SQLite only
+    # For SQLite only: foreign keys plus the SQLITE_* tuning settings
     if isinstance(dbapi_connection, sqlite3.Connection):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON;")
-        cursor.close()
+        apply_sqlite_pragmas(dbapi_connection, SQLITE_PRAGMAS)
         
         
-# Initialize Flask-Migrate
+# Initialize Flask-Migrate. The schema is created and updated by the
+# migrations in migrations/: run `flask db upgrade` before starting the app.
 migrate = Migrate(app, db)
 
 # Register Blueprints (modular routes)
@@ -48,17 +80,19 @@ from routes.auth import auth_bp
 from routes.admin import admin_bp
 from routes.student import student_bp
 from routes.teacher import teacher_bp
+from routes.media import media_bp
+from routes.assets import assets_bp
+from routes.metrics import metrics_bp
 
 app.register_blueprint(teacher_bp)
 app.register_blueprint(student_bp)
 app.register_blueprint(admin_bp)
 app.register_blueprint(auth_bp)
+app.register_blueprint(media_bp)
+app.register_blueprint(assets_bp)
+app.register_blueprint(metrics_bp)
 
 
-# Create database tables if they don't exist
-with app.app_context():
-    db.create_all()
-
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port='5001')
 
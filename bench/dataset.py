@@ -0,0 +1,237 @@
+# dataset.py
+"""Fill an empty database with a deterministic synthetic library.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m bench.dataset --scale medium --seed 1
+
+The same scale and seed always give the same rows, so benchmark runs are
+comparable. Every user's password is "bench". There are no schools in
+the schema, so a "school" is just a group of classes that share teachers.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, func
+from werkzeug.security import generate_password_hash
+import click
+import os
+import random
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# schools, classes per school, teachers per school, students per class,
+# books per class, years of borrow history, borrows per student per year
+SCALES = {
+    'small': dict(schools=1, classes=4, teachers=2, students=25, books=150, years=1, borrows=12),
+    'medium': dict(schools=3, classes=8, teachers=4, students=28, books=400, years=2, borrows=18),
+    'large': dict(schools=5, classes=12, teachers=6, students=30, books=1000, years=3, borrows=24),
+}
+
+PASSWORD = 'bench'
+
+MIGRATIONS = os.path.join(ROOT, 'migrations')
+
+# History ends here rather than at the current time, so runs on different
+# days generate the same rows
+END_DATE = datetime(2025, 6, 30)
+
+WORDS = [
+    'dragon', 'garden', 'river', 'secret', 'moon', 'star', 'shadow', 'king', 'queen', 'island',
+    'forest', 'night', 'winter', 'summer', 'city', 'ghost', 'magic', 'stone', 'fire', 'sea',
+    'mountain', 'clock', 'mirror', 'lantern', 'storm', 'whisper', 'castle', 'journey', 'map', 'wolf',
+]
+NAMES = [
+    'Adam', 'Amira', 'Ben', 'Chloe', 'Dina', 'Elias', 'Fatima', 'Gabriel', 'Hana', 'Ivan',
+    'Jana', 'Karim', 'Lea', 'Malik', 'Nour', 'Omar', 'Paula', 'Rami', 'Sara', 'Tom',
+]
+SURNAMES = [
+    'Haddad', 'Martin', 'Nasser', 'Dubois', 'Khalil', 'Lambert', 'Mansour', 'Girard', 'Saleh', 'Moreau',
+]
+
+
+def _isbn13(rng):
+    digits = '978' + ''.join(str(rng.randrange(10)) for _ in range(9))
+    check = (10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits)) % 10) % 10
+    return digits + str(check)
+
+
+def generate(scale='small', seed=1, **overrides):
+    """Insert the dataset for `scale` into the app's (empty) database; returns row counts.
+
+    Must run inside an app context. Keyword arguments override single
+    sizes of the scale, e.g. books=5000.
+    """
+    from models import (db, User, Student, Teacher, Class, Book, BorrowHistory, BorrowState,
+                        DonationRequest, student_class, teacher_class)
+
+    if db.session.scalar(select(func.count()).select_from(User)):
+        raise click.ClickException('The database already has users; point DATABASE_URL at an empty one.')
+
+    sizes = dict(SCALES[scale], **overrides)
+    rng = random.Random(seed)
+    password = generate_password_hash(PASSWORD)
+    rows = {name: [] for name in ('user', 'teacher', 'student', 'class', 'book', 'borrow', 'donation',
+                                  'student_class', 'teacher_class')}
+
+    rows['user'].append({'id': 1, 'username': 'admin', 'password': password, 'role': 'admin'})
+    next_user = 2
+
+    def add_user(username, role):
+        nonlocal next_user
+        rows['user'].append({'id': next_user, 'username': username, 'password': password, 'role': role})
+        next_user += 1
+        return next_user - 1
+
+    def person():
+        return f'{rng.choice(NAMES)} {rng.choice(SURNAMES)}'
+
+    class_id = teacher_id = student_id = book_id = 0
+    class_students, class_books = {}, {}
+    for school in range(1, sizes['schools'] + 1):
+        school_classes = []
+        for number in range(1, sizes['classes'] + 1):
+            class_id += 1
+            school_classes.append(class_id)
+            rows['class'].append({'id': class_id, 'name': f'School {school} Class {number}', 'version': 0})
+
+            class_students[class_id] = []
+            for _ in range(sizes['students']):
+                student_id += 1
+                user_id = add_user(f'student{student_id}', 'student')
+                rows['student'].append({'id': student_id, 'user_id': user_id, 'name': person(), 'active_borrows': 0})
+                rows['student_class'].append({'student_id': student_id, 'class_id': class_id})
+                class_students[class_id].append(student_id)
+
+            class_books[class_id] = []
+            for _ in range(sizes['books']):
+                book_id += 1
+                title = ' '.join(rng.sample(WORDS, rng.randint(2, 4))).capitalize()
+                rows['book'].append({
+                    'id': book_id,
+                    'title': title,
+                    'series': f'{rng.choice(WORDS).capitalize()} series' if rng.random() < 0.3 else None,
+                    'author': person(),
+                    'isbn': _isbn13(rng),
+                    'class_id': class_id,
+                    'donated_by_id': rng.choice(class_students[class_id]) if rng.random() < 0.2 else None,
+                    'borrowed_by_id': None,
+                    'borrowed_date': None,
+                })
+                class_books[class_id].append(book_id)
+
+        # Teachers share their school's classes round robin
+        for number in range(sizes['teachers']):
+            teacher_id += 1
+            user_id = add_user(f'teacher{teacher_id}', 'teacher')
+            rows['teacher'].append({'id': teacher_id, 'user_id': user_id, 'name': person()})
+            for index, school_class in enumerate(school_classes):
+                if index % sizes['teachers'] == number:
+                    rows['teacher_class'].append({'teacher_id': teacher_id, 'class_id': school_class})
+
+    books_by_id = {book['id']: book for book in rows['book']}
+    students_by_id = {student['id']: student for student in rows['student']}
+    start = END_DATE - timedelta(days=365 * sizes['years'])
+    span = (END_DATE - start).total_seconds()
+    closed_states = [BorrowState.RETURNED] * 8 + [BorrowState.REJECTED, BorrowState.CANCELLED]
+
+    for current_class, students in class_students.items():
+        books = class_books[current_class]
+        for student in students:
+            # Past borrows, in date order
+            dates = sorted(start + timedelta(seconds=rng.random() * span)
+                           for _ in range(sizes['borrows'] * sizes['years']))
+            for borrow_date in dates:
+                state = rng.choice(closed_states)
+                rows['borrow'].append({
+                    'book_id': rng.choice(books),
+                    'student_id': student,
+                    'state': int(state),
+                    'borrow_date': borrow_date if state == BorrowState.RETURNED else None,
+                    'return_date': borrow_date + timedelta(days=rng.randint(1, 21)) if state == BorrowState.RETURNED else None,
+                    'status': '',
+                })
+            # What is open now: up to two pending requests or current borrows
+            for _ in range(rng.choice([0, 0, 1, 2])):
+                book = books_by_id[rng.choice(books)]
+                if book['borrowed_by_id'] is not None:
+                    continue
+                lent = rng.random() < 0.5
+                if lent:
+                    book['borrowed_by_id'] = student
+                    book['borrowed_date'] = END_DATE - timedelta(days=rng.randint(0, 14))
+                rows['borrow'].append({
+                    'book_id': book['id'],
+                    'student_id': student,
+                    'state': int(BorrowState.BORROWED if lent else BorrowState.PENDING),
+                    'borrow_date': book['borrowed_date'] if lent else None,
+                    'return_date': None,
+                    'status': '',
+                })
+                students_by_id[student]['active_borrows'] += 1
+
+        for student in rng.sample(students, min(3, len(students))):
+            rows['donation'].append({
+                'title': ' '.join(rng.sample(WORDS, 3)).capitalize(),
+                'author': person(),
+                'isbn': _isbn13(rng),
+                'student_id': student,
+                'class_id': current_class,
+                'status': '',
+                'created_at': END_DATE - timedelta(days=rng.randint(0, 30)),
+            })
+
+    tables = [
+        (User, 'user'), (Class, 'class'), (Teacher, 'teacher'), (Student, 'student'),
+        (student_class, 'student_class'), (teacher_class, 'teacher_class'), (Book, 'book'),
+        (BorrowHistory, 'borrow'), (DonationRequest, 'donation'),
+    ]
+    for table, name in tables:
+        for offset in range(0, len(rows[name]), 5000):
+            db.session.execute(insert(table), rows[name][offset:offset + 5000])
+    db.session.commit()
+    return {name: len(table_rows) for name, table_rows in rows.items()}
+
+
+def upgrade_database(app):
+    """Bring the app's database up to the current schema with the migrations."""
+    from flask_migrate import upgrade
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+
+
+def open_database(scale, seed, db_path=None):
+    """Point the app at a benchmark database, generating it on first use; returns (app, path).
+
+    The database defaults to instance/bench-<scale>-<seed>.db and is
+    migrated to the current schema first. Call this before anything
+    imports the app, which reads DATABASE_URL on import.
+    """
+    db_path = os.path.abspath(db_path or os.path.join(ROOT, 'instance', f'bench-{scale}-{seed}.db'))
+    fresh = not os.path.exists(db_path)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+
+    from app import app
+
+    upgrade_database(app)
+    if fresh:
+        click.echo(f'Generating the {scale} dataset in {db_path}')
+        with app.app_context():
+            generate(scale, seed)
+    return app, db_path
+
+
+@click.command()
+@click.option('--scale', type=click.Choice(sorted(SCALES)), default='small', show_default=True)
+@click.option('--seed', type=int, default=1, show_default=True)
+def main(scale, seed):
+    """Fill the database named by DATABASE_URL with a synthetic library."""
+    from app import app
+
+    upgrade_database(app)
+
+    with app.app_context():
+        counts = generate(scale, seed)
+    for name, count in counts.items():
+        click.echo(f'{name}: {count}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+# load.py
+"""Simulate the start-of-lesson borrow rush against the app under a multi-process server.
+
+    python -m bench.load --scale small --workers 4 --rounds 3
+
+Starts the app with bench/serve.py (or gunicorn, with --server gunicorn)
+on a fresh synthetic library, then replays a lesson for one class a few
+times over. Each round has three steps:
+
+1. Every student opens their page and requests a few books at the same
+   moment, drawn from a small shelf so that they compete for the same
+   copies.
+2. The teacher bulk-approves the pending requests from several tabs at
+   once. The tabs race each other for the same requests and books.
+3. The students return what they got and cancel what is still pending.
+
+Each HTTP request is timed from the client. Redirects are not followed,
+so a form post and the page it redirects to count as two requests. After
+every round the database is checked for invariant violations:
+- a book lent to two students
+- a book whose borrower disagrees with the borrow history
+- a student over BORROW_LIMIT
+- duplicate open requests
+- active-borrow counters that disagree with the history
+
+The report gives throughput, latency percentiles and histograms per
+action, error responses, and the "database is locked" errors found in the
+server log. The run exits with status 1 if anything went wrong.
+"""
+
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+import click
+import importlib.util
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from bench.dataset import ROOT, PASSWORD, SCALES, open_database
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+RETURN_LINK = re.compile(r'/return_book/(\d+)')
+CANCEL_LINK = re.compile(r'/cancel_request/(\d+)')
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Stats:
+    """Latencies and failed requests per action, shared by all session threads."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, action, elapsed_ms, status):
+        with self._lock:
+            self.latencies[action].append(elapsed_ms)
+            if not isinstance(status, int) or status >= 400:
+                self.errors[(action, status)] += 1
+
+    def histogram(self, action):
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for elapsed in self.latencies[action]:
+            index = next((i for i, bound in enumerate(BUCKETS_MS) if elapsed <= bound), len(BUCKETS_MS))
+            counts[index] += 1
+        return counts
+
+    def summary(self):
+        actions = {}
+        for action, samples in sorted(self.latencies.items()):
+            actions[action] = {
+                'count': len(samples),
+                'errors': sum(n for (name, _), n in self.errors.items() if name == action),
+                'p50_ms': round(_percentile(samples, 0.5), 1),
+                'p95_ms': round(_percentile(samples, 0.95), 1),
+                'p99_ms': round(_percentile(samples, 0.99), 1),
+                'max_ms': round(max(samples), 1),
+                'histogram': self.histogram(action),
+            }
+        return actions
+
+
+class Session:
+    """One user's browser: a cookie jar and a base URL."""
+
+    def __init__(self, base_url, username, stats):
+        self.base_url = base_url
+        self.username = username
+        self.stats = stats
+        self.http = requests.Session()
+
+    def call(self, action, method, path, **kwargs):
+        start = perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, allow_redirects=False, timeout=120, **kwargs)
+        except requests.RequestException as e:
+            self.stats.record(action, (perf_counter() - start) * 1000, type(e).__name__)
+            return None
+        self.stats.record(action, (perf_counter() - start) * 1000, response.status_code)
+        return response
+
+    def login(self):
+        response = self.call('login', 'POST', '/login', data={'username': self.username, 'password': PASSWORD})
+        if response is None or response.status_code != 302 or response.headers['Location'].endswith('/login'):
+            raise click.ClickException(f'Could not log in as {self.username}')
+
+
+def student_rush(session, shelf, borrows, rng, start):
+    session.call('student page', 'GET', '/')
+    start.wait()
+    for book_id in rng.sample(shelf, min(borrows, len(shelf))):
+        session.call('request borrow', 'POST', f'/request_borrow/{book_id}')
+        session.call('student page', 'GET', '/')
+
+
+def teacher_approvals(session, class_id, rng, start):
+    session.call('teacher dashboard', 'GET', f'/teacher?class_id={class_id}')
+    start.wait()
+    response = session.call('pending requests', 'GET', f'/api/pending_requests?class_id={class_id}')
+    if response is None or response.status_code != 200:
+        return
+    request_ids = [item['request_id'] for item in response.json()['borrow_requests']]
+    rng.shuffle(request_ids)
+    for request_id in request_ids:
+        session.call('approve', 'POST', f'/approve_borrow/{request_id}')
+
+
+def student_wrap_up(session, start):
+    start.wait()
+    page = session.call('student page', 'GET', '/')
+    if page is None or page.status_code != 200:
+        return
+    for borrow_id in sorted(set(int(match) for match in RETURN_LINK.findall(page.text))):
+        session.call('return', 'POST', f'/return_book/{borrow_id}')
+    for request_id in sorted(set(int(match) for match in CANCEL_LINK.findall(page.text))):
+        session.call('cancel', 'POST', f'/cancel_request/{request_id}')
+
+
+def run_concurrently(tasks):
+    """Run each (function, args) in its own thread, all released together by a barrier."""
+    start = threading.Barrier(len(tasks))
+    with ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+        futures = [pool.submit(function, *args, start) for function, args in tasks]
+        for future in futures:
+            future.result()
+
+
+def invariant_violations(app):
+    """Descriptions of every inconsistency in the borrowing data."""
+    from sqlalchemy import and_, func, select
+    from models import db, Book, BorrowHistory, BorrowState
+    from services.borrowing import ACTIVE_STATES, counter_drift
+
+    limit = app.config['BORROW_LIMIT']
+    problems = []
+    with app.app_context():
+        lent = BorrowHistory.state == BorrowState.BORROWED
+        for book_id, count in db.session.execute(
+                select(BorrowHistory.book_id, func.count()).where(lent)
+                .group_by(BorrowHistory.book_id).having(func.count() > 1)):
+            problems.append(f'book {book_id} is lent in {count} borrow records')
+
+        for book_id, borrower, student_id in db.session.execute(
+                select(Book.id, Book.borrowed_by_id, BorrowHistory.student_id)
+                .outerjoin(BorrowHistory, and_(BorrowHistory.book_id == Book.id, lent))
+                .where(func.coalesce(Book.borrowed_by_id, -1) != func.coalesce(BorrowHistory.student_id, -1))):
+            problems.append(f'book {book_id} is lent to student {borrower}, its borrow record says {student_id}')
+
+        for student_id, count in db.session.execute(
+                select(BorrowHistory.student_id, func.count()).where(BorrowHistory.state.in_(ACTIVE_STATES))
+                .group_by(BorrowHistory.student_id).having(func.count() > limit)):
+            problems.append(f'student {student_id} has {count} open requests and borrows, over the limit of {limit}')
+
+        for student_id, book_id, count in db.session.execute(
+                select(BorrowHistory.student_id, BorrowHistory.book_id, func.count())
+                .where(BorrowHistory.state.in_(ACTIVE_STATES))
+                .group_by(BorrowHistory.student_id, BorrowHistory.book_id).having(func.count() > 1)):
+            problems.append(f'student {student_id} has {count} open records for book {book_id}')
+
+        for student_id, name, stored, actual in counter_drift():
+            problems.append(f'student {student_id} ({name}) has counter {stored}, actual {actual}')
+    return problems
+
+
+def participants(app, class_id, limit, shelf_size):
+    """Usernames of the class's students and a teacher, and the IDs of free books to fight over."""
+    from sqlalchemy import select
+    from models import db, Book, Student, Teacher, User, student_class, teacher_class
+
+    with app.app_context():
+        students = db.session.scalars(
+            select(User.username).join(Student, Student.user_id == User.id)
+            .join(student_class, student_class.c.student_id == Student.id)
+            .where(student_class.c.class_id == class_id).order_by(Student.id).limit(limit)
+        ).all()
+        teacher = db.session.scalar(
+            select(User.username).join(Teacher, Teacher.user_id == User.id)
+            .join(teacher_class, teacher_class.c.teacher_id == Teacher.id)
+            .where(teacher_class.c.class_id == class_id).order_by(Teacher.id)
+        )
+        shelf = db.session.scalars(
+            select(Book.id).where(Book.class_id == class_id, Book.borrowed_by_id.is_(None))
+            .order_by(Book.id).limit(shelf_size)
+        ).all()
+    if not students or teacher is None:
+        raise click.ClickException(f'Class {class_id} needs students and a teacher')
+    return students, teacher, shelf
+
+
+def start_server(server, db_path, workers, log):
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    if server == 'gunicorn':
+        if importlib.util.find_spec('gunicorn') is None:
+            raise click.ClickException('gunicorn is not installed')
+        command = [sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+                   '--bind', f'127.0.0.1:{port}', 'app:app']
+    else:
+        command = [sys.executable, '-m', 'bench.serve', '--port', str(port), '--workers', str(workers)]
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + db_path)
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise click.ClickException(f'The server exited with status {process.returncode}; see {log.name}')
+        try:
+            requests.get(base_url + '/login', timeout=5)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.terminate()
+    raise click.ClickException('The server did not start within 60 seconds')
+
+
+def report(stats, elapsed, lock_errors, violations):
+    total = sum(len(samples) for samples in stats.latencies.values())
+    click.echo(f'\n{total} requests in {elapsed:.1f} s: {total / elapsed:.1f} requests/s\n')
+    click.echo(f'{"action":18} {"count":>6} {"errors":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8}')
+    summary = stats.summary()
+    for action, row in summary.items():
+        click.echo(f'{action:18} {row["count"]:6} {row["errors"]:6} {row["p50_ms"]:8} {row["p95_ms"]:8} '
+                   f'{row["p99_ms"]:8} {row["max_ms"]:8}')
+
+    labels = [f'<={bound}' for bound in BUCKETS_MS] + ['more']
+    click.echo('\nLatency histograms (ms)')
+    click.echo(f'{"action":18} ' + ' '.join(f'{label:>7}' for label in labels))
+    for action, row in summary.items():
+        click.echo(f'{action:18} ' + ' '.join(f'{count:7}' for count in row['histogram']))
+
+    click.echo('')
+    for (action, status), count in sorted(stats.errors.items(), key=str):
+        click.echo(f'{action}: {count} x {status}')
+    click.echo(f'"database is locked" errors in the server log: {lock_errors}')
+    click.echo(f'Invariant violations: {len(violations)}')
+    for violation in violations:
+        click.echo(f'  {violation}')
+    return summary
+
+
+@click.command()
+@click.option('--scale', type=click.Choice(sorted(SCALES)), default='small', show_default=True)
+@click.option('--seed', type=int, default=1, show_default=True)
+@click.option('--db', 'db_path', help='SQLite file to use (modified by the run); a fresh one by default.')
+@click.option('--server', type=click.Choice(['werkzeug', 'gunicorn']), default='werkzeug', show_default=True)
+@click.option('--workers', type=int, default=4, show_default=True, help='Server processes.')
+@click.option('--class-id', type=int, default=1, show_default=True)
+@click.option('--students', type=int, default=30, show_default=True, help='Most students to simulate.')
+@click.option('--tabs', type=int, default=3, show_default=True, help='Teacher tabs approving at once.')
+@click.option('--shelf', type=int, default=10, show_default=True, help='Free books the students compete for.')
+@click.option('--borrows', type=int, default=2, show_default=True, help='Books each student requests per round.')
+@click.option('--rounds', type=int, default=3, show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Write the results here as JSON.')
+def main(scale, seed, db_path, server, workers, class_id, students, tabs, shelf, borrows, rounds, output):
+    """Load-test borrowing with concurrent student and teacher sessions."""
+    scratch = tempfile.mkdtemp(prefix='library-load-')
+    try:
+        app, db_path = open_database(scale, seed, db_path or os.path.join(scratch, 'library.db'))
+        usernames, teacher, shelf_ids = participants(app, class_id, students, shelf)
+        violations = invariant_violations(app)
+        if violations:
+            raise click.ClickException(f'The database is inconsistent before the run: {violations[0]}')
+
+        log_path = os.path.join(scratch, 'server.log')
+        with open(log_path, 'w+') as log:
+            process, base_url = start_server(server, db_path, workers, log)
+            try:
+                stats = Stats()
+                rng = random.Random(seed)
+                student_sessions = [Session(base_url, username, stats) for username in usernames]
+                teacher_sessions = [Session(base_url, teacher, stats) for _ in range(tabs)]
+                for session in student_sessions + teacher_sessions:
+                    session.login()
+                click.echo(f'{len(student_sessions)} students and {tabs} teacher tabs, class {class_id}, '
+                           f'{workers} {server} workers')
+
+                began = perf_counter()
+                for number in range(1, rounds + 1):
+                    run_concurrently([(student_rush, (session, shelf_ids, borrows, random.Random(rng.random())))
+                                      for session in student_sessions])
+                    run_concurrently([(teacher_approvals, (session, class_id, random.Random(rng.random())))
+                                      for session in teacher_sessions])
+                    run_concurrently([(student_wrap_up, (session,)) for session in student_sessions])
+                    found = invariant_violations(app)
+                    click.echo(f'Round {number}: {len(found)} invariant violations')
+                    violations.extend(f'round {number}: {problem}' for problem in found)
+                elapsed = perf_counter() - began
+            finally:
+                process.terminate()
+                process.wait()
+            log.seek(0)
+            lock_errors = sum(line.count('database is locked') for line in log)
+
+        summary = report(stats, elapsed, lock_errors, violations)
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'meta': {'scale': scale, 'seed': seed, 'server': server, 'workers': workers,
+                             'students': len(student_sessions), 'tabs': tabs, 'rounds': rounds,
+                             'buckets_ms': BUCKETS_MS},
+                    'requests_per_second': round(sum(row['count'] for row in summary.values()) / elapsed, 1),
+                    'actions': summary,
+                    'lock_errors': lock_errors,
+                    'violations': violations,
+                }, f, indent=2)
+                f.write('\n')
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if violations or lock_errors or stats.errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
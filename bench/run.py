@@ -0,0 +1,177 @@
+# run.py
+"""Time the busiest pages against a synthetic library.
+
+    python -m bench.run --scale small --output bench/results.json
+    python -m bench.run --scale small --baseline bench/baseline.json
+
+The database (instance/bench-<scale>-<seed>.db unless --db is given) is
+generated by bench/dataset.py the first time it is needed and reused after
+that. Each route is requested through the Flask test client, so the
+numbers cover the view, its queries and template rendering but not a
+WSGI server or the network.
+
+For every route the run records median and 95th percentile latency, the
+number of SQL statements per request and the peak memory Python allocated
+while serving it. With --baseline, the run fails if a route got slower by
+more than --tolerance, issues more queries, or allocates much more memory
+than the baseline recorded. Latency depends on the machine, so compare
+against a baseline made on the same one; query counts do not.
+"""
+
+from statistics import mean, median
+import click
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+# Memory is noisier than query counts; only flag large jumps
+MEMORY_TOLERANCE = 0.5
+# Latencies this small are mostly noise, whatever the ratio
+LATENCY_SLACK_MS = 1.0
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _routes(class_id):
+    """(name, login, url) for each page under test."""
+    return [
+        ('student.index', 'student1', '/'),
+        ('teacher.teacher_dashboard', 'teacher1', f'/teacher?class_id={class_id}'),
+        ('admin.admin_dashboard', 'admin', '/admin'),
+        ('teacher.get_pending_requests', 'teacher1', f'/api/pending_requests?class_id={class_id}'),
+        ('student.search', 'student1', '/api/search?q=dragon'),
+    ]
+
+
+class QueryCounter:
+    """Counts statements sent to the database while active."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def measure(client, engine, url, iterations, warmup):
+    from sqlalchemy import event
+
+    for _ in range(warmup):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise click.ClickException(f'{url} returned {response.status_code}')
+
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    timings = []
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+
+    # A separate pass: tracing allocations slows every request down
+    tracemalloc.start()
+    try:
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(median(timings), 2),
+        'p95_ms': round(_percentile(timings, 0.95), 2),
+        'mean_ms': round(mean(timings), 2),
+        'queries': counter.count / iterations,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Messages for every route that regressed against `baseline`."""
+    problems = []
+    for name, now in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            continue
+        if now['p95_ms'] > before['p95_ms'] * (1 + tolerance) + LATENCY_SLACK_MS:
+            problems.append(f'{name}: p95 {now["p95_ms"]} ms, baseline {before["p95_ms"]} ms')
+        if now['queries'] > before['queries']:
+            problems.append(f'{name}: {now["queries"]:g} queries per request, baseline {before["queries"]:g}')
+        if now['peak_kib'] > before['peak_kib'] * (1 + MEMORY_TOLERANCE):
+            problems.append(f'{name}: peak memory {now["peak_kib"]} KiB, baseline {before["peak_kib"]} KiB')
+    return problems
+
+
+@click.command()
+@click.option('--scale', type=click.Choice(['small', 'medium', 'large']), default='small', show_default=True)
+@click.option('--seed', type=int, default=1, show_default=True)
+@click.option('--db', 'db_path', help='SQLite file to use; generated if it does not exist.')
+@click.option('--iterations', type=int, default=50, show_default=True)
+@click.option('--warmup', type=int, default=5, show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Write the results here as JSON.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Fail on regressions against this file.')
+@click.option('--tolerance', type=float, default=0.25, show_default=True,
+              help='Allowed p95 slowdown against the baseline, as a fraction.')
+def main(scale, seed, db_path, iterations, warmup, output, baseline, tolerance):
+    """Benchmark the main pages and API endpoints."""
+    from bench.dataset import open_database, PASSWORD
+
+    app = open_database(scale, seed, db_path)[0]
+
+    from models import db, Class, student_class
+    from sqlalchemy import func, select
+
+    with app.app_context():
+        # The class student1 is in, which teacher1 also teaches
+        class_id = db.session.scalar(select(student_class.c.class_id).where(student_class.c.student_id == 1))
+        classes = db.session.scalar(select(func.count()).select_from(Class))
+        engine = db.engine
+
+    results = {
+        'meta': {
+            'scale': scale,
+            'seed': seed,
+            'classes': classes,
+            'iterations': iterations,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+        },
+        'routes': {},
+    }
+    clients = {}
+    for name, username, url in _routes(class_id):
+        client = clients.get(username)
+        if client is None:
+            client = clients[username] = app.test_client()
+            response = client.post('/login', data={'username': username, 'password': PASSWORD})
+            if response.status_code != 302:
+                raise click.ClickException(f'Could not log in as {username}')
+        results['routes'][name] = result = measure(client, engine, url, iterations, warmup)
+        click.echo(f'{name:32} p50 {result["p50_ms"]:7.2f} ms  p95 {result["p95_ms"]:7.2f} ms  '
+                   f'{result["queries"]:5g} queries  peak {result["peak_kib"]:8.1f} KiB')
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+    if baseline:
+        with open(baseline, encoding='utf-8') as f:
+            problems = compare(results, json.load(f), tolerance)
+        for problem in problems:
+            click.echo(f'REGRESSION {problem}', err=True)
+        if problems:
+            sys.exit(1)
+        click.echo('No regressions against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
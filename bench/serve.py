@@ -0,0 +1,73 @@
+# serve.py
+"""Serve the app from several worker processes, for bench/load.py.
+
+    DATABASE_URL=sqlite:////path/to/bench.db python -m bench.serve --port 5055 --workers 4
+
+A small pre-forking server in the style of gunicorn's sync workers: the
+parent opens the listening socket, then forks --workers long-lived
+processes that each accept and serve one request at a time with
+Werkzeug's server. Caches and compiled templates stay warm in each
+worker, and the workers contend for the SQLite write lock as they would
+in a real deployment.
+"""
+
+from werkzeug.serving import make_server
+import click
+import os
+import signal
+import socket
+import sys
+
+
+def _serve(host, port, app, fd):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    make_server(host, port, app, fd=fd).serve_forever()
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=int, default=5055, show_default=True)
+@click.option('--workers', type=int, default=4, show_default=True)
+def main(host, port, workers):
+    """Run the app under a pre-forking multi-process WSGI server."""
+    from app import app
+    from models import db
+
+    with app.app_context():
+        engine = db.engine
+    # Connections must not be shared across a fork: each worker starts
+    # with an empty pool and opens its own
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve(host, port, app, listener.fileno())
+            finally:
+                os._exit(0)
+        children.append(pid)
+    click.echo(f'Serving on http://{host}:{port} with {workers} workers', err=True)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        os.waitpid(pid, 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,5 +4,131 @@ here = os.path.dirname(__file__)
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your_secret_key'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + here + '/instance/library.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///' + here + '/instance/library.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Rows per page for the server-side paginated lists
+    BOOKS_PER_PAGE = int(os.environ.get('BOOKS_PER_PAGE', 12))
+    HISTORY_PER_PAGE = int(os.environ.get('HISTORY_PER_PAGE', 10))
+
+    # Threads that run background jobs such as Open Library lookups
+    BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', 4))
+
+    # Open Library metadata lookups (the URLs can point at a local stub)
+    OPENLIBRARY_URL = os.environ.get('OPENLIBRARY_URL', 'https://openlibrary.org')
+    OPENLIBRARY_COVERS_URL = os.environ.get('OPENLIBRARY_COVERS_URL', 'https://covers.openlibrary.org')
+    OPENLIBRARY_TIMEOUT = float(os.environ.get('OPENLIBRARY_TIMEOUT', 5))  # seconds per attempt
+    OPENLIBRARY_RETRIES = int(os.environ.get('OPENLIBRARY_RETRIES', 3))
+    OPENLIBRARY_BACKOFF = float(os.environ.get('OPENLIBRARY_BACKOFF', 1))  # first retry delay, doubled each time
+    OPENLIBRARY_RATE_LIMIT = float(os.environ.get('OPENLIBRARY_RATE_LIMIT', 5))  # requests per second per host, per process; 0 turns it off
+
+    # ISBN metadata cache: lifetimes of found / not-found entries in the
+    # isbn_metadata table, and the size of the in-process LRU in front of it
+    ISBN_CACHE_TTL = int(os.environ.get('ISBN_CACHE_TTL', 30 * 24 * 3600))  # seconds
+    ISBN_CACHE_NEGATIVE_TTL = int(os.environ.get('ISBN_CACHE_NEGATIVE_TTL', 24 * 3600))  # seconds
+    ISBN_CACHE_SIZE = int(os.environ.get('ISBN_CACHE_SIZE', 1024))
+
+    # Cover images: largest external cover that will be mirrored locally, and
+    # how long browsers may cache cover files served from /covers
+    COVER_MIRROR_MAX_BYTES = int(os.environ.get('COVER_MIRROR_MAX_BYTES', 5 * 1024 * 1024))
+    COVER_CACHE_MAX_AGE = int(os.environ.get('COVER_CACHE_MAX_AGE', 365 * 24 * 3600))  # seconds
+
+    # Pending-request event stream. 'database' shares events between worker
+    # processes through the class_event table; 'memory' only reaches
+    # listeners in the same process. Every open teacher dashboard holds a
+    # worker thread for up to EVENT_STREAM_TIMEOUT seconds, so run the app
+    # with threaded or async workers (see README.md), never sync ones.
+    EVENT_BROKER = os.environ.get('EVENT_BROKER', 'database')
+    EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 1))  # seconds between table reads per worker
+    EVENT_HEARTBEAT = float(os.environ.get('EVENT_HEARTBEAT', 15))  # seconds between keep-alive comments
+    EVENT_STREAM_TIMEOUT = float(os.environ.get('EVENT_STREAM_TIMEOUT', 300))  # seconds before a stream is closed
+    EVENT_RETRY = float(os.environ.get('EVENT_RETRY', 3))  # seconds the browser waits before reconnecting
+    EVENT_RETENTION = int(os.environ.get('EVENT_RETENTION', 3600))  # seconds old events are kept
+
+    # SQLite tuning, applied to every connection (see services/database.py).
+    # WAL lets readers carry on while a write is in progress, busy_timeout
+    # makes a blocked writer wait for the lock instead of failing with
+    # "database is locked", and synchronous=NORMAL is safe under WAL.
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 15000))  # milliseconds
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -32000))  # pages, or KiB when negative
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))  # bytes, 0 turns it off
+    SQLITE_WAL_AUTOCHECKPOINT = int(os.environ.get('SQLITE_WAL_AUTOCHECKPOINT', 1000))  # pages; past this the checkpointer also runs a RESTART
+    SQLITE_CHECKPOINT_INTERVAL = float(os.environ.get('SQLITE_CHECKPOINT_INTERVAL', 300))  # seconds, 0 turns it off
+    SQLITE_CHECKPOINT_MODE = os.environ.get('SQLITE_CHECKPOINT_MODE', 'PASSIVE')
+
+    # Connection pool, per worker process. Size it to the worker's thread
+    # count; SQLite still allows only one writer at a time across them all.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),  # seconds to wait for a free connection
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 3600)),  # seconds before a connection is replaced
+        # Python's sqlite3 has its own lock wait; keep it in step with busy_timeout
+        'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT / 1000},
+    }
+
+    # Per-process cache of the logged-in user's role profile and classes.
+    # Admin changes to class membership only clear it in the worker that
+    # made them, so it is off by default; only turn it on for a single
+    # worker process, where a removed teacher or student loses access at once.
+    IDENTITY_CACHE_TTL = float(os.environ.get('IDENTITY_CACHE_TTL', 0))  # seconds, 0 turns it off
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 4096))
+
+    # Rows per page on the admin dashboard and its JSON list endpoints
+    ADMIN_PAGE_SIZE = int(os.environ.get('ADMIN_PAGE_SIZE', 25))
+
+    # Bulk user import: rows per transaction, and processes hashing passwords
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 500))
+    IMPORT_HASH_WORKERS = int(os.environ.get('IMPORT_HASH_WORKERS', os.cpu_count() or 2))
+
+    # Bulk ISBN intake: concurrent Open Library lookups, books per INSERT,
+    # and the most ISBNs accepted in one submission
+    INTAKE_WORKERS = int(os.environ.get('INTAKE_WORKERS', 8))
+    INTAKE_BATCH_SIZE = int(os.environ.get('INTAKE_BATCH_SIZE', 25))
+    INTAKE_MAX_ISBNS = int(os.environ.get('INTAKE_MAX_ISBNS', 500))
+
+    # Most results returned by the catalog search box
+    SEARCH_RESULTS_LIMIT = int(os.environ.get('SEARCH_RESULTS_LIMIT', 20))
+
+    # Most borrow requests and borrowed books a student can have open at once
+    BORROW_LIMIT = int(os.environ.get('BORROW_LIMIT', 2))
+
+    # Cache of rendered class book grids: 'memory' (per process), 'filesystem'
+    # (shared by the workers on a host) or 'none'
+    FRAGMENT_CACHE = os.environ.get('FRAGMENT_CACHE', 'memory')
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 256))  # fragments, memory backend
+    FRAGMENT_CACHE_DIR = os.environ.get('FRAGMENT_CACHE_DIR')  # defaults to instance/fragments
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 86400))  # seconds unused before a file is pruned
+    FRAGMENT_CACHE_PRUNE_EVERY = int(os.environ.get('FRAGMENT_CACHE_PRUNE_EVERY', 200))  # writes between prunes
+
+    # Fingerprinted static assets are cached by browsers for this long (seconds)
+    ASSET_MAX_AGE = int(os.environ.get('ASSET_MAX_AGE', 365 * 24 * 3600))
+    # On-the-fly compression of HTML and JSON responses
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))  # bytes; smaller bodies are sent as they are
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))  # gzip, 1-9
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))  # brotli, 0-11, if installed
+
+    # SQL instrumentation: query counts and database time per request, the
+    # Server-Timing header and the admin performance page ('off' disables it)
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', 'on') != 'off'
+    SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))  # slower statements are logged with their plan
+    SQL_REPEAT_THRESHOLD = int(os.environ.get('SQL_REPEAT_THRESHOLD', 5))  # identical statements per request flagged as N+1
+    PERF_ROUTE_SAMPLES = int(os.environ.get('PERF_ROUTE_SAMPLES', 200))  # recent requests kept per endpoint
+    PERF_LOG_SIZE = int(os.environ.get('PERF_LOG_SIZE', 50))  # slow and repeated statements kept for /admin/perf
+
+    # Profiles of single requests, taken on demand (see services/profiling.py).
+    # Off by default; unless set to 'on', no profiling hooks are installed at all.
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'off') == 'on'
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')  # lets non-admin sessions be profiled; unset means admins only
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')  # defaults to instance/profiles
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 20))  # newest profiles kept; older ones are deleted
+
+    # Prometheus metrics at /metrics ('off' removes the endpoint and hooks).
+    # Each worker writes its numbers to METRICS_DIR and /metrics adds them up,
+    # so every worker on the host must share the directory.
+    METRICS = os.environ.get('METRICS', 'on') != 'off'
+    METRICS_DIR = os.environ.get('METRICS_DIR')  # defaults to instance/metrics
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 2))  # seconds between a worker's writes
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # if set, scrapers must send it as a bearer token
@@ -4,8 +4,7 @@ from werkzeug.security import generate_password_hash
 
 
 with app.app_context():
-    # Create the database tables if they don't exist
-    db.create_all()
+    # The tables come from the migrations: run `flask db upgrade` first
 
     # Check if an admin user exists
     from models import User
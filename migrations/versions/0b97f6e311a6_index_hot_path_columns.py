@@ -0,0 +1,45 @@
+"""Index the borrow, book and donation hot-path columns
+
+Revision ID: 0b97f6e311a6
+Revises: fde9cd02e679
+Create Date: 2026-10-18 19:23:38.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b97f6e311a6'
+down_revision = 'fde9cd02e679'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_student_class_student_id_class_id', 'student_class', ['student_id', 'class_id'])
+    op.create_index('ix_student_class_class_id_student_id', 'student_class', ['class_id', 'student_id'])
+    op.create_index('ix_teacher_class_teacher_id_class_id', 'teacher_class', ['teacher_id', 'class_id'])
+    op.create_index('ix_teacher_class_class_id_teacher_id', 'teacher_class', ['class_id', 'teacher_id'])
+    op.create_index('ix_book_class_id', 'book', ['class_id'])
+    op.create_index('ix_book_state', 'book', ['class_id', 'borrowed_by_id'])
+    op.create_index('ix_borrow_history_student_open', 'borrow_history', ['student_id', 'return_date', 'borrow_date'])
+    op.create_index('ix_borrow_history_book_borrow_date', 'borrow_history', ['book_id', 'borrow_date'])
+    op.create_index('ix_borrow_history_open_by_book', 'borrow_history', ['book_id', 'borrow_date'],
+                    sqlite_where=sa.text('return_date IS NULL'))
+    op.create_index('ix_donation_request_class_status', 'donation_request', ['class_id', 'status'])
+    op.create_index('ix_donation_request_student_id', 'donation_request', ['student_id'])
+
+
+def downgrade():
+    op.drop_index('ix_donation_request_student_id', table_name='donation_request')
+    op.drop_index('ix_donation_request_class_status', table_name='donation_request')
+    op.drop_index('ix_borrow_history_open_by_book', table_name='borrow_history')
+    op.drop_index('ix_borrow_history_book_borrow_date', table_name='borrow_history')
+    op.drop_index('ix_borrow_history_student_open', table_name='borrow_history')
+    op.drop_index('ix_book_state', table_name='book')
+    op.drop_index('ix_book_class_id', table_name='book')
+    op.drop_index('ix_teacher_class_class_id_teacher_id', table_name='teacher_class')
+    op.drop_index('ix_teacher_class_teacher_id_class_id', table_name='teacher_class')
+    op.drop_index('ix_student_class_class_id_student_id', table_name='student_class')
+    op.drop_index('ix_student_class_student_id_class_id', table_name='student_class')
@@ -0,0 +1,62 @@
+"""Add the book_search full-text index over the book table
+
+An external-content FTS5 table: the text lives only in `book`, the index
+is keyed by book.id and triggers on `book` keep it in step, including for
+cascaded deletes and multi-row inserts. Existing books are indexed here.
+
+class_id is indexed as a token too, so the class filter is applied inside
+the full-text match rather than by checking every match against `book`.
+ISBNs are indexed without hyphens or spaces so that any leading part of
+the digits matches. The prefix indexes keep searches for the first few
+letters of a word fast.
+
+SQLite drops a table's triggers along with it, so a later revision that
+rebuilds `book` with batch_alter_table has to create them again.
+
+Revision ID: 0f674d230e73
+Revises: 7b153e8982a1
+Create Date: 2026-10-18 19:45:12.530914
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0f674d230e73'
+down_revision = '7b153e8982a1'
+branch_labels = None
+depends_on = None
+
+ISBN = "replace(replace({}.isbn, '-', ''), ' ', '')"
+NEW_ROW = f"new.id, new.title, new.author, new.series, {ISBN.format('new')}, new.class_id"
+OLD_ROW = f"old.id, old.title, old.author, old.series, {ISBN.format('old')}, old.class_id"
+
+
+def upgrade():
+    op.execute("""CREATE VIRTUAL TABLE book_search USING fts5(
+        title, author, series, isbn, class_id,
+        content='book', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='1 2 3'
+    )""")
+    op.execute(f"""CREATE TRIGGER book_search_insert AFTER INSERT ON book BEGIN
+        INSERT INTO book_search (rowid, title, author, series, isbn, class_id) VALUES ({NEW_ROW});
+    END""")
+    op.execute(f"""CREATE TRIGGER book_search_delete AFTER DELETE ON book BEGIN
+        INSERT INTO book_search (book_search, rowid, title, author, series, isbn, class_id) VALUES ('delete', {OLD_ROW});
+    END""")
+    op.execute(f"""CREATE TRIGGER book_search_update AFTER UPDATE OF title, author, series, isbn, class_id ON book BEGIN
+        INSERT INTO book_search (book_search, rowid, title, author, series, isbn, class_id) VALUES ('delete', {OLD_ROW});
+        INSERT INTO book_search (rowid, title, author, series, isbn, class_id) VALUES ({NEW_ROW});
+    END""")
+    op.execute(
+        'INSERT INTO book_search (rowid, title, author, series, isbn, class_id) '
+        f"SELECT id, title, author, series, {ISBN.format('book')}, class_id FROM book"
+    )
+
+
+def downgrade():
+    op.execute('DROP TRIGGER book_search_update')
+    op.execute('DROP TRIGGER book_search_delete')
+    op.execute('DROP TRIGGER book_search_insert')
+    op.execute('DROP TABLE book_search')
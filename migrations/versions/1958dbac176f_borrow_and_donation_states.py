@@ -0,0 +1,126 @@
+"""Replace free-text borrow/donation status with a state column
+
+Adds `state` and `actor_id` to borrow_history and donation_request and
+fills them in from the old free-text `status`, which is kept for rows
+whose actor cannot be worked out.
+
+Revision ID: 1958dbac176f
+Revises: 0b97f6e311a6
+Create Date: 2026-10-18 19:25:51.730264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import re
+
+
+# revision identifiers, used by Alembic.
+revision = '1958dbac176f'
+down_revision = '0b97f6e311a6'
+branch_labels = None
+depends_on = None
+
+# models.BorrowState and models.DonationState as of this revision
+BORROW_PENDING, BORROW_BORROWED, BORROW_RETURNED, BORROW_REJECTED = 0, 1, 2, 3
+DONATION_APPROVED, DONATION_REJECTED = 1, 2
+
+
+def upgrade():
+    op.drop_index('ix_borrow_history_student_open', table_name='borrow_history')
+    op.drop_index('ix_borrow_history_open_by_book', table_name='borrow_history')
+    op.drop_index('ix_donation_request_class_status', table_name='donation_request')
+
+    # SQLite cannot add a column with a foreign key to an existing table, so
+    # the tables are copied
+    for table in ('borrow_history', 'donation_request'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('state', sa.SmallInteger(), server_default=sa.text('0'), nullable=False))
+            batch_op.add_column(sa.Column('actor_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key(f'fk_{table}_actor_id_user', 'user', ['actor_id'], ['id'],
+                                        ondelete='SET NULL')
+
+    connection = op.get_bind()
+    backfill_borrow_states(connection)
+    backfill_donation_states(connection)
+
+    op.create_index('ix_borrow_history_student_state', 'borrow_history', ['student_id', 'state'])
+    op.create_index('ix_borrow_history_book_state', 'borrow_history', ['book_id', 'state'])
+    op.create_index('ix_donation_request_class_state', 'donation_request', ['class_id', 'state'])
+
+
+def downgrade():
+    op.drop_index('ix_donation_request_class_state', table_name='donation_request')
+    op.drop_index('ix_borrow_history_book_state', table_name='borrow_history')
+    op.drop_index('ix_borrow_history_student_state', table_name='borrow_history')
+
+    for table in ('donation_request', 'borrow_history'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(f'fk_{table}_actor_id_user', type_='foreignkey')
+            batch_op.drop_column('actor_id')
+            batch_op.drop_column('state')
+
+    op.create_index('ix_donation_request_class_status', 'donation_request', ['class_id', 'status'])
+    op.create_index('ix_borrow_history_open_by_book', 'borrow_history', ['book_id', 'borrow_date'],
+                    sqlite_where=sa.text('return_date IS NULL'))
+    op.create_index('ix_borrow_history_student_open', 'borrow_history', ['student_id', 'return_date', 'borrow_date'])
+
+
+def _user_ids_by_name(connection, table):
+    """Map profile names to user IDs, skipping names shared by several users."""
+    rows = connection.execute(sa.text(f'SELECT name, user_id FROM "{table}"')).all()
+    names = {}
+    for name, user_id in rows:
+        names[name] = None if name in names else user_id
+    return names
+
+
+def backfill_borrow_states(connection):
+    """Derive `state` and `actor_id` from the old free-text status.
+
+    Old rows hold strings such as "Pending approval", "Borrowed by <student>",
+    "Returned by <student>" and "Rejected by <teacher>". The borrow and
+    return dates win over the text when they disagree. Only rejections and
+    returns name the user who acted, so `actor_id` stays empty otherwise.
+    """
+    teachers = _user_ids_by_name(connection, 'teacher')
+    students = _user_ids_by_name(connection, 'student')
+
+    rows = connection.execute(sa.text(
+        'SELECT id, status, borrow_date, return_date FROM borrow_history'
+    )).all()
+    updates = []
+    for row_id, status, borrow_date, return_date in rows:
+        status = status or ''
+        match = re.match(r'^\s*(\w+) by (.+?)\s*$', status)
+        actor_name = match.group(2) if match else None
+        actor_id = None
+
+        if status.lower().startswith('rejected'):
+            state = BORROW_REJECTED
+            actor_id = teachers.get(actor_name)
+        elif return_date is not None:
+            state = BORROW_RETURNED
+            actor_id = students.get(actor_name) or teachers.get(actor_name)
+        elif borrow_date is not None:
+            state = BORROW_BORROWED
+        else:
+            state = BORROW_PENDING
+
+        updates.append({'state': state, 'actor_id': actor_id, 'id': row_id})
+
+    if updates:
+        connection.execute(
+            sa.text('UPDATE borrow_history SET state = :state, actor_id = :actor_id WHERE id = :id'),
+            updates
+        )
+
+
+def backfill_donation_states(connection):
+    connection.execute(
+        sa.text("UPDATE donation_request SET state = :approved WHERE status = 'Approved'"),
+        {'approved': DONATION_APPROVED}
+    )
+    connection.execute(
+        sa.text("UPDATE donation_request SET state = :rejected WHERE status LIKE 'Rejected%'"),
+        {'rejected': DONATION_REJECTED}
+    )
@@ -0,0 +1,26 @@
+"""Record whether a book's uploaded cover has resized variants
+
+Revision ID: 21fddd9bf4a8
+Revises: 355a99089bb9
+Create Date: 2026-10-18 19:31:04.270957
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '21fddd9bf4a8'
+down_revision = '355a99089bb9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('book') as batch_op:
+        batch_op.add_column(sa.Column('cover_variants', sa.Boolean(), server_default=sa.text('0'), nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('book') as batch_op:
+        batch_op.drop_column('cover_variants')
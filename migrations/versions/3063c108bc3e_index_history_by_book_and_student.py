@@ -0,0 +1,28 @@
+"""Index the borrow history by book and by student for keyset pagination
+
+Revision ID: 3063c108bc3e
+Revises: 1958dbac176f
+Create Date: 2026-10-18 19:27:35.114206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3063c108bc3e'
+down_revision = '1958dbac176f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_borrow_history_book_borrow_date', table_name='borrow_history')
+    op.create_index('ix_borrow_history_book_id', 'borrow_history', ['book_id'])
+    op.create_index('ix_borrow_history_student_id', 'borrow_history', ['student_id'])
+
+
+def downgrade():
+    op.drop_index('ix_borrow_history_student_id', table_name='borrow_history')
+    op.drop_index('ix_borrow_history_book_id', table_name='borrow_history')
+    op.create_index('ix_borrow_history_book_borrow_date', 'borrow_history', ['book_id', 'borrow_date'])
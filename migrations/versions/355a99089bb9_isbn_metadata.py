@@ -0,0 +1,33 @@
+"""Cache Open Library ISBN lookups in an isbn_metadata table
+
+Revision ID: 355a99089bb9
+Revises: 3063c108bc3e
+Create Date: 2026-10-18 19:29:42.508311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '355a99089bb9'
+down_revision = '3063c108bc3e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('isbn_metadata',
+        sa.Column('isbn', sa.String(length=20), nullable=False),
+        sa.Column('found', sa.Boolean(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=True),
+        sa.Column('author', sa.String(length=200), nullable=True),
+        sa.Column('cover_url', sa.String(length=500), nullable=True),
+        sa.Column('fetched_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('isbn')
+    )
+
+
+def downgrade():
+    op.drop_table('isbn_metadata')
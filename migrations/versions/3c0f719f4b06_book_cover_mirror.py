@@ -0,0 +1,26 @@
+"""Store a local mirror of each book's external cover
+
+Revision ID: 3c0f719f4b06
+Revises: 21fddd9bf4a8
+Create Date: 2026-10-18 19:32:21.693520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c0f719f4b06'
+down_revision = '21fddd9bf4a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('book') as batch_op:
+        batch_op.add_column(sa.Column('cover_mirror', sa.String(length=500), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('book') as batch_op:
+        batch_op.drop_column('cover_mirror')
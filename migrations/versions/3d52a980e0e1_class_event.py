@@ -0,0 +1,33 @@
+"""Add the class_event table behind the pending-request event stream
+
+Revision ID: 3d52a980e0e1
+Revises: 3c0f719f4b06
+Create Date: 2026-10-18 19:35:37.840172
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d52a980e0e1'
+down_revision = '3c0f719f4b06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('class_event',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_class_event_created_at', 'class_event', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_class_event_created_at', table_name='class_event')
+    op.drop_table('class_event')
@@ -0,0 +1,30 @@
+"""Add a change version to each class and index the profiles' user_id
+
+Revision ID: 7b153e8982a1
+Revises: 3d52a980e0e1
+Create Date: 2026-10-18 19:37:03.412689
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b153e8982a1'
+down_revision = '3d52a980e0e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('class') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default=sa.text('0'), nullable=False))
+    op.create_index('ix_student_user_id', 'student', ['user_id'])
+    op.create_index('ix_teacher_user_id', 'teacher', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_teacher_user_id', table_name='teacher')
+    op.drop_index('ix_student_user_id', table_name='student')
+    with op.batch_alter_table('class') as batch_op:
+        batch_op.drop_column('version')
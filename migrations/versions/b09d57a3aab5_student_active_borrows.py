@@ -0,0 +1,35 @@
+"""Count each student's pending requests and current borrows in student.active_borrows
+
+Revision ID: b09d57a3aab5
+Revises: 0f674d230e73
+Create Date: 2026-10-18 19:58:40.271163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b09d57a3aab5'
+down_revision = '0f674d230e73'
+branch_labels = None
+depends_on = None
+
+# models.BorrowState as of this revision
+BORROW_PENDING, BORROW_BORROWED = 0, 1
+
+
+def upgrade():
+    with op.batch_alter_table('student') as batch_op:
+        batch_op.add_column(sa.Column('active_borrows', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    op.execute(sa.text(
+        'UPDATE student SET active_borrows = ('
+        'SELECT count(*) FROM borrow_history '
+        'WHERE borrow_history.student_id = student.id AND state IN (:pending, :borrowed))'
+    ).bindparams(pending=BORROW_PENDING, borrowed=BORROW_BORROWED))
+
+
+def downgrade():
+    with op.batch_alter_table('student') as batch_op:
+        batch_op.drop_column('active_borrows')
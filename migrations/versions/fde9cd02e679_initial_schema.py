@@ -0,0 +1,116 @@
+"""Initial schema
+
+Databases created before the migrations were kept in the repository are
+already stamped with this revision, so `flask db upgrade` only applies the
+revisions after it to them.
+
+Revision ID: fde9cd02e679
+Revises:
+Create Date: 2026-10-18 19:24:02.113580
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fde9cd02e679'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('class',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=150), nullable=False),
+        sa.Column('password', sa.String(length=128), nullable=False),
+        sa.Column('role', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+    )
+    op.create_table('student',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('teacher',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('book',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('series', sa.String(length=200), nullable=True),
+        sa.Column('author', sa.String(length=200), nullable=False),
+        sa.Column('isbn', sa.String(length=20), nullable=True),
+        sa.Column('cover_url', sa.String(length=500), nullable=True),
+        sa.Column('cover_filename', sa.String(length=500), nullable=True),
+        sa.Column('donated_by_id', sa.Integer(), nullable=True),
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.Column('borrowed_by_id', sa.Integer(), nullable=True),
+        sa.Column('borrowed_date', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['borrowed_by_id'], ['student.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['donated_by_id'], ['student.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('donation_request',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('series', sa.String(length=200), nullable=True),
+        sa.Column('author', sa.String(length=200), nullable=False),
+        sa.Column('isbn', sa.String(length=20), nullable=True),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=50), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['student_id'], ['student.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('student_class',
+        sa.Column('student_id', sa.Integer(), nullable=True),
+        sa.Column('class_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['student_id'], ['student.id'], ondelete='CASCADE')
+    )
+    op.create_table('teacher_class',
+        sa.Column('teacher_id', sa.Integer(), nullable=True),
+        sa.Column('class_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['teacher_id'], ['teacher.id'], ondelete='CASCADE')
+    )
+    op.create_table('borrow_history',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('borrow_date', sa.DateTime(), nullable=True),
+        sa.Column('return_date', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['book.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['student_id'], ['student.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('borrow_history')
+    op.drop_table('teacher_class')
+    op.drop_table('student_class')
+    op.drop_table('donation_request')
+    op.drop_table('book')
+    op.drop_table('teacher')
+    op.drop_table('student')
+    op.drop_table('user')
+    op.drop_table('class')
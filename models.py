@@ -1,20 +1,40 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table
+from sqlalchemy import Column, Integer, SmallInteger, String, Boolean, DateTime, ForeignKey, Table, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
+import enum
 
 db = SQLAlchemy()
 
+
+class BorrowState(enum.IntEnum):
+    PENDING = 0
+    BORROWED = 1
+    RETURNED = 2
+    REJECTED = 3
+    CANCELLED = 4
+
+
+class DonationState(enum.IntEnum):
+    PENDING = 0
+    APPROVED = 1
+    REJECTED = 2
+
+
 # Many-to-Many relationship between students and classes
 student_class = db.Table('student_class',
     Column('student_id', Integer, ForeignKey('student.id', ondelete='CASCADE')),
-    Column('class_id', Integer, ForeignKey('class.id', ondelete='CASCADE'))
+    Column('class_id', Integer, ForeignKey('class.id', ondelete='CASCADE')),
+    Index('ix_student_class_student_id_class_id', 'student_id', 'class_id'),
+    Index('ix_student_class_class_id_student_id', 'class_id', 'student_id')
 )
 
 # Many-to-Many relationship between teachers and classes
 teacher_class = db.Table('teacher_class',
     Column('teacher_id', Integer, ForeignKey('teacher.id', ondelete='CASCADE')),
-    Column('class_id', Integer, ForeignKey('class.id', ondelete='CASCADE'))
+    Column('class_id', Integer, ForeignKey('class.id', ondelete='CASCADE')),
+    Index('ix_teacher_class_teacher_id_class_id', 'teacher_id', 'class_id'),
+    Index('ix_teacher_class_class_id_teacher_id', 'class_id', 'teacher_id')
 )
 
 class User(db.Model):
@@ -28,11 +48,18 @@ class User(db.Model):
     student_profile = relationship('Student', back_populates='user', uselist=False)
     teacher_profile = relationship('Teacher', back_populates='user', uselist=False)
 
+    @property
+    def display_name(self):
+        profile = self.teacher_profile or self.student_profile
+        return profile.name if profile else self.username
+
 class Student(db.Model):
     __tablename__ = 'student'
     id = Column(Integer, primary_key=True)
     name = Column(String(150), nullable=False)
-    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    # Pending requests plus current borrows, kept in step by services/borrowing.py
+    active_borrows = Column(Integer, nullable=False, default=0, server_default=text('0'))
 
     # Relationships
     user = relationship('User', back_populates='student_profile')
@@ -44,7 +71,7 @@ class Teacher(db.Model):
     __tablename__ = 'teacher'
     id = Column(Integer, primary_key=True)
     name = Column(String(150), nullable=False)
-    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
 
     # Relationships
     user = relationship('User', back_populates='teacher_profile')
@@ -54,6 +81,8 @@ class Class(db.Model):
     __tablename__ = 'class'
     id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False)
+    # Bumped by every change to the class's books, borrows or donations; see services/versions.py
+    version = Column(Integer, nullable=False, default=0, server_default=text('0'))
 
     # Relationships
     students = relationship('Student', secondary=student_class, back_populates='classes')
@@ -63,6 +92,12 @@ class Class(db.Model):
 
 class Book(db.Model):
     __tablename__ = 'book'
+    __table_args__ = (
+        # A class's books by whether they are lent out, for availability
+        # filters and the admin dashboard's per-class counts (covering).
+        # ix_book_class_id stays for walking a class's books in ID order.
+        Index('ix_book_state', 'class_id', 'borrowed_by_id'),
+    )
     id = Column(Integer, primary_key=True)
     title = Column(String(200), nullable=False)
     series = Column(String(200))
@@ -70,8 +105,10 @@ class Book(db.Model):
     isbn = Column(String(20))
     cover_url = Column(String(500))  # External URLs
     cover_filename = Column(String(500))  # Local filenames for uploaded images
+    cover_variants = Column(Boolean, nullable=False, default=False, server_default=text('0'))  # Resized copies exist
+    cover_mirror = Column(String(500))  # Local copy of cover_url, with resized variants
     donated_by_id = Column(Integer, ForeignKey('student.id', ondelete='SET NULL'))
-    class_id = Column(Integer, ForeignKey('class.id', ondelete='CASCADE'), nullable=False)
+    class_id = Column(Integer, ForeignKey('class.id', ondelete='CASCADE'), nullable=False, index=True)
     borrowed_by_id = Column(Integer, ForeignKey('student.id', ondelete='SET NULL'))
     borrowed_date = Column(DateTime)
 
@@ -83,29 +120,102 @@ class Book(db.Model):
 
 class BorrowHistory(db.Model):
     __tablename__ = 'borrow_history'
+    __table_args__ = (
+        # A student's pending requests and active borrows
+        Index('ix_borrow_history_student_state', 'student_id', 'state'),
+        # Pending requests and active borrows per book, for the teacher dashboard
+        Index('ix_borrow_history_book_state', 'book_id', 'state'),
+        # Per-book and per-student history, newest first (rows are ordered by id
+        # within each key, which is what the keyset pagination walks)
+        Index('ix_borrow_history_book_id', 'book_id'),
+        Index('ix_borrow_history_student_id', 'student_id'),
+    )
     id = Column(Integer, primary_key=True)
     book_id = Column(Integer, ForeignKey('book.id', ondelete='CASCADE'), nullable=False)
     student_id = Column(Integer, ForeignKey('student.id', ondelete='CASCADE'), nullable=False)
     borrow_date = Column(DateTime)
     return_date = Column(DateTime)
-    status = Column(String(50), nullable=False, default="Pending")
+    state = Column(SmallInteger, nullable=False, default=BorrowState.PENDING, server_default=text('0'))
+    actor_id = Column(Integer, ForeignKey('user.id', ondelete='SET NULL'))  # Who made the last state change
+    # Free-text status written before `state` existed; only read as a fallback
+    legacy_status = Column('status', String(50), nullable=False, default='')
 
     # Relationships
     book = relationship('Book', back_populates='borrow_histories', passive_deletes=True)
     student = relationship('Student', back_populates='borrow_histories')
+    actor = relationship('User')
+
+    @property
+    def status_label(self):
+        if self.state == BorrowState.PENDING:
+            return "Pending approval"
+        if self.state == BorrowState.BORROWED:
+            return f"Borrowed by {self.student.name}"
+        if self.state == BorrowState.RETURNED:
+            return f"Returned by {self.student.name}"
+        if self.state == BorrowState.REJECTED:
+            if self.actor:
+                return f"Rejected by {self.actor.display_name}"
+            return self.legacy_status or "Rejected"
+        return "Cancelled"
 
 class DonationRequest(db.Model):
     __tablename__ = 'donation_request'
+    __table_args__ = (
+        Index('ix_donation_request_class_state', 'class_id', 'state'),
+    )
     id = Column(Integer, primary_key=True)
     title = Column(String(200), nullable=False)
     series = Column(String(200))
     author = Column(String(200), nullable=False)
     isbn = Column(String(20))
-    student_id = Column(Integer, ForeignKey('student.id', ondelete='CASCADE'), nullable=False)
+    student_id = Column(Integer, ForeignKey('student.id', ondelete='CASCADE'), nullable=False, index=True)
     class_id = Column(Integer, ForeignKey('class.id', ondelete='CASCADE'), nullable=False)
-    status = Column(String(50), nullable=False, default="Pending")
+    state = Column(SmallInteger, nullable=False, default=DonationState.PENDING, server_default=text('0'))
+    actor_id = Column(Integer, ForeignKey('user.id', ondelete='SET NULL'))  # Who approved or rejected it
+    # Free-text status written before `state` existed
+    legacy_status = Column('status', String(50), nullable=False, default='')
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
     student = relationship('Student', back_populates='donation_requests')
     class_ = relationship('Class', back_populates='donation_requests')
+    actor = relationship('User')
+
+    @property
+    def status_label(self):
+        if self.state == DonationState.APPROVED:
+            return "Approved"
+        if self.state == DonationState.REJECTED:
+            return "Rejected"
+        return "Pending approval"
+
+class IsbnMetadata(db.Model):
+    """Cached Open Library lookups, keyed by normalized ISBN.
+
+    `found` is False for ISBNs Open Library has no record of, so repeated
+    misses are not re-fetched until the (shorter) negative TTL runs out.
+    """
+    __tablename__ = 'isbn_metadata'
+    isbn = Column(String(20), primary_key=True)
+    found = Column(Boolean, nullable=False)
+    title = Column(String(200))
+    author = Column(String(200))
+    cover_url = Column(String(500))
+    fetched_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+class ClassEvent(db.Model):
+    """A change to a class's books, borrows or donations, for /api/pending_requests/stream.
+
+    Rows are written in the same transaction as the change they describe and
+    tailed by every worker process (see services/events.py), then pruned
+    after EVENT_RETENTION seconds. AUTOINCREMENT keeps IDs from being reused
+    once old rows are deleted, so "newer than ID n" stays meaningful.
+    """
+    __tablename__ = 'class_event'
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = Column(Integer, primary_key=True)
+    class_id = Column(Integer, nullable=False)
+    kind = Column(String(50), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
@@ -1,9 +1,22 @@
 # admin.py
 
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort
-from models import db, User, Student, Teacher, Class, Book, BorrowHistory
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, abort, jsonify, current_app, Response, stream_with_context, send_from_directory
+from models import db, User, Student, Teacher, Class, Book, BorrowHistory, DonationRequest, BorrowState, DonationState, student_class, teacher_class
+from sqlalchemy import select, func
+from sqlalchemy.orm import selectinload
 from werkzeug.security import generate_password_hash
+from services.openlibrary import isbn_cache
+from services.images import delete_cover_files
+from services.events import notify_class_change
+from services.identity import identity_cache
+from services.pagination import keyset_paginate, page_url
+from services.user_import import import_users
+from services import borrowing
+from services.perf import get_perf_monitor
+from services.profiling import get_profiler
 from functools import wraps
+import io
+import json
 from datetime import datetime
 
 
@@ -21,11 +34,230 @@ def admin_required(f):
 @admin_bp.route('/admin')
 @admin_required
 def admin_dashboard():
-    classes = Class.query.all()
-    teachers = Teacher.query.all()
-    students = Student.query.all()
-    books = Book.query.all()
-    return render_template('admin_dashboard.html', classes=classes, teachers=teachers, students=students, books=books)
+    # One page of classes (optionally filtered by name) with their counts;
+    # teachers, students and books are loaded by the page from the JSON
+    # endpoints below when a section is opened
+    search = request.args.get('q', '').strip()
+    query = Class.query
+    if search:
+        query = query.filter(contains(Class.name, search))
+    classes = keyset_paginate(query, Class.id, 'classes', current_app.config['ADMIN_PAGE_SIZE'])
+
+    totals = db.session.execute(select(
+        select(func.count()).select_from(Class).scalar_subquery().label('classes'),
+        select(func.count()).select_from(Teacher).scalar_subquery().label('teachers'),
+        select(func.count()).select_from(Student).scalar_subquery().label('students'),
+        select(func.count()).select_from(Book).scalar_subquery().label('books'),
+    )).one()
+
+    return render_template(
+        'admin_dashboard.html',
+        classes=classes,
+        counts=class_counts([class_.id for class_ in classes]),
+        totals=totals,
+        search=search
+    )
+
+
+def contains(column, text):
+    """Case-insensitive substring match with LIKE wildcards in `text` escaped."""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.ilike(f'%{escaped}%', escape='\\')
+
+
+def class_counts(class_ids):
+    """Per-class teacher, student, book, borrowed and pending counts for `class_ids`.
+
+    Each count is one grouped query restricted to the given classes, so the
+    cost depends on the size of the page, not of the whole database.
+    """
+    counts = {class_id: dict.fromkeys(('teachers', 'students', 'books', 'borrowed', 'pending'), 0)
+              for class_id in class_ids}
+    if not class_ids:
+        return counts
+
+    def fill(name, rows):
+        for class_id, count in rows:
+            counts[class_id][name] += count
+
+    for name, link in (('teachers', teacher_class), ('students', student_class)):
+        fill(name, db.session.execute(
+            select(link.c.class_id, func.count())
+            .where(link.c.class_id.in_(class_ids))
+            .group_by(link.c.class_id)
+        ).all())
+
+    book_rows = db.session.execute(
+        select(Book.class_id, func.count(), func.count(Book.borrowed_by_id))
+        .where(Book.class_id.in_(class_ids))
+        .group_by(Book.class_id)
+    ).all()
+    fill('books', [(class_id, books) for class_id, books, _ in book_rows])
+    fill('borrowed', [(class_id, borrowed) for class_id, _, borrowed in book_rows])
+
+    fill('pending', db.session.execute(
+        select(Book.class_id, func.count())
+        .join(BorrowHistory, BorrowHistory.book_id == Book.id)
+        .where(Book.class_id.in_(class_ids), BorrowHistory.state == BorrowState.PENDING)
+        .group_by(Book.class_id)
+    ).all())
+    fill('pending', db.session.execute(
+        select(DonationRequest.class_id, func.count())
+        .where(DonationRequest.class_id.in_(class_ids), DonationRequest.state == DonationState.PENDING)
+        .group_by(DonationRequest.class_id)
+    ).all())
+    return counts
+
+
+def json_page(page, serialize):
+    """A keyset page as JSON: its items and the URL of the next page, if any."""
+    return jsonify({
+        'items': [serialize(item) for item in page],
+        'next_url': page_url(page, after=page.next_cursor) if page.next_cursor is not None else None,
+    })
+
+
+# Paginated, searchable lists behind the dashboard's sections. `class_id`
+# limits a list to one class, `q` searches names (titles and authors for
+# books), and `next_url` in the response fetches the following page.
+@admin_bp.route('/admin/api/teachers')
+@admin_required
+def api_teachers():
+    class_id = request.args.get('class_id', type=int)
+    search = request.args.get('q', '').strip()
+    query = Teacher.query
+    if class_id:
+        query = query.join(teacher_class).filter(teacher_class.c.class_id == class_id)
+    if search:
+        query = query.filter(contains(Teacher.name, search))
+    page = keyset_paginate(query, Teacher.id, 'teachers', current_app.config['ADMIN_PAGE_SIZE'])
+    return json_page(page, lambda teacher: {
+        'id': teacher.id,
+        'name': teacher.name,
+        'delete_url': url_for('admin.delete_teacher', teacher_id=teacher.id),
+        'unassign_url': url_for('admin.unassign_teacher', class_id=class_id, teacher_id=teacher.id) if class_id else None,
+    })
+
+
+@admin_bp.route('/admin/api/students')
+@admin_required
+def api_students():
+    class_id = request.args.get('class_id', type=int)
+    search = request.args.get('q', '').strip()
+    query = Student.query
+    if class_id:
+        query = query.join(student_class).filter(student_class.c.class_id == class_id)
+    if search:
+        query = query.filter(contains(Student.name, search))
+    page = keyset_paginate(query, Student.id, 'students', current_app.config['ADMIN_PAGE_SIZE'])
+    return json_page(page, lambda student: {
+        'id': student.id,
+        'name': student.name,
+        'delete_url': url_for('admin.delete_student', student_id=student.id),
+        'unassign_url': url_for('admin.unassign_student', class_id=class_id, student_id=student.id) if class_id else None,
+    })
+
+
+@admin_bp.route('/admin/api/books')
+@admin_required
+def api_books():
+    class_id = request.args.get('class_id', type=int)
+    search = request.args.get('q', '').strip()
+    query = Book.query.options(selectinload(Book.borrower))
+    if class_id:
+        query = query.filter(Book.class_id == class_id)
+    if search:
+        query = query.filter(contains(Book.title, search) | contains(Book.author, search))
+    page = keyset_paginate(query, Book.id, 'books', current_app.config['ADMIN_PAGE_SIZE'])
+    return json_page(page, lambda book: {
+        'id': book.id,
+        'title': book.title,
+        'author': book.author,
+        'series': book.series,
+        'borrower': book.borrower.name if book.borrower else None,
+        'delete_url': url_for('admin.delete_book', book_id=book.id),
+    })
+
+@admin_bp.route('/admin/api/isbn_cache')
+@admin_required
+def isbn_cache_stats():
+    # Hit/miss counters for the ISBN metadata cache, from the metrics of every worker
+    return jsonify(isbn_cache.stats())
+
+@admin_bp.route('/admin/perf')
+@admin_required
+def perf():
+    # Slowest endpoints and recent slow or repeated statements, as seen by
+    # this worker process since it started
+    monitor = get_perf_monitor()
+    if monitor is None:
+        flash('SQL instrumentation is turned off (SQL_INSTRUMENTATION).', 'warning')
+        return redirect(url_for('admin.admin_dashboard'))
+    return render_template(
+        'admin_perf.html',
+        routes=monitor.worst_routes(),
+        slow_queries=list(reversed(monitor.slow_queries)),
+        repeated_queries=list(reversed(monitor.repeated_queries)),
+        slow_ms=monitor.slow_ms,
+        repeat_threshold=monitor.repeat_threshold
+    )
+
+@admin_bp.route('/admin/profiles')
+@admin_required
+def profiles():
+    # Saved profiles of single requests, newest first
+    profiler = get_profiler()
+    if profiler is None:
+        flash('Request profiling is turned off; set PROFILING_ENABLED=on to turn it on.', 'warning')
+        return redirect(url_for('admin.admin_dashboard'))
+    return render_template('admin_profiles.html', profiles=profiler.profiles(), keep=profiler.keep)
+
+@admin_bp.route('/admin/profiles/<filename>')
+@admin_required
+def download_profile(filename):
+    profiler = get_profiler()
+    if profiler is None:
+        abort(404)
+    return send_from_directory(profiler.directory, filename, as_attachment=True)
+
+@admin_bp.route('/import_users', methods=['GET', 'POST'])
+@admin_required
+def import_users_view():
+    if request.method == 'GET':
+        return render_template('import_users.html')
+
+    file = request.files.get('csv_file')
+    if not file or not file.filename:
+        return jsonify({'error': 'Choose a CSV file to import.'}), 400
+    role = request.form.get('role', 'student')
+    # Read now: uploaded files are closed once the view returns, before the
+    # response is streamed (uploads are capped by MAX_CONTENT_LENGTH anyway)
+    try:
+        lines = io.StringIO(file.read().decode('utf-8-sig'), newline='')
+    except UnicodeDecodeError:
+        return jsonify({'error': 'The CSV file must be UTF-8 encoded.'}), 400
+
+    # One JSON line per chunk as it is committed, so the page can show
+    # progress; errors and generated passwords are sent once each
+    def generate():
+        reported_errors = reported_passwords = 0
+        try:
+            for progress in import_users(lines, role):
+                yield json.dumps(dict(
+                    progress.to_dict(),
+                    errors=progress.errors[reported_errors:],
+                    passwords=progress.passwords[reported_passwords:]
+                )) + '\n'
+                reported_errors, reported_passwords = len(progress.errors), len(progress.passwords)
+        except ValueError as e:
+            yield json.dumps({'error': str(e)}) + '\n'
+            return
+        yield json.dumps({'done': True}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    })
 
 @admin_bp.route('/add_class', methods=['GET', 'POST'])
 @admin_required
@@ -131,6 +363,7 @@ def assign_teacher():
         else:
             class_.teachers.append(teacher)
             db.session.commit()
+            identity_cache.invalidate(teacher.user_id)
             flash(f'Teacher "{teacher.name}" assigned to class "{class_.name}" successfully!', 'success')
         return redirect(url_for('admin.admin_dashboard'))
     classes = Class.query.all()
@@ -153,6 +386,7 @@ def assign_student():
         else:
             class_.students.append(student)
             db.session.commit()
+            identity_cache.invalidate(student.user_id)
             flash(f'Student "{student.name}" assigned to class "{class_.name}" successfully!', 'success')
         return redirect(url_for('admin.admin_dashboard'))
     classes = Class.query.all()
@@ -165,8 +399,20 @@ def assign_student():
 def delete_class(class_id):
     class_ = Class.query.get_or_404(class_id)
     try:
+        # Its books, and their borrow history, go with it
+        covers = db.session.execute(
+            select(Book.cover_filename, Book.cover_mirror).where(
+                Book.class_id == class_.id,
+                (Book.cover_filename != None) | (Book.cover_mirror != None)
+            )
+        ).all()
+        notify_class_change(class_.id, 'class_deleted')
+        borrowing.release_books(select(Book.id).where(Book.class_id == class_.id))
         db.session.delete(class_)
         db.session.commit()
+        for book in covers:
+            delete_cover_files(book)
+        identity_cache.invalidate()  # Any number of members had it in their class list
         flash(f'Class "{class_.name}" has been deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -186,6 +432,7 @@ def delete_teacher(teacher_id):
         db.session.delete(user)  # Delete the associated user record
     db.session.delete(teacher)  # Delete the teacher record
     db.session.commit()
+    identity_cache.invalidate(teacher.user_id)
 
     flash(f'Teacher "{teacher.name}" has been deleted.', 'success')
     return redirect(url_for('admin.admin_dashboard'))
@@ -197,9 +444,13 @@ def delete_student(student_id):
     student = Student.query.get_or_404(student_id)
     user = student.user
     try:
+        # Their borrows and donation requests go with them
+        for class_ in student.classes:
+            notify_class_change(class_.id, 'student_deleted')
         db.session.delete(student)
         db.session.delete(user)
         db.session.commit()
+        identity_cache.invalidate(student.user_id)
         flash(f'Student "{student.name}" has been deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -212,8 +463,11 @@ def delete_student(student_id):
 def delete_book(book_id):
     book = Book.query.get_or_404(book_id)
     try:
+        notify_class_change(book.class_id, 'book_deleted')
+        borrowing.release_books(select(Book.id).where(Book.id == book.id))
         db.session.delete(book)
         db.session.commit()
+        delete_cover_files(book)
         flash('Book deleted successfully.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -232,6 +486,7 @@ def unassign_student(class_id, student_id):
         try:
             class_.students.remove(student)
             db.session.commit()
+            identity_cache.invalidate(student.user_id)
             flash(f'Student "{student.name}" has been unassigned from class "{class_.name}".', 'success')
         except Exception as e:
             db.session.rollback()
@@ -252,6 +507,7 @@ def unassign_teacher(class_id, teacher_id):
         try:
             class_.teachers.remove(teacher)
             db.session.commit()
+            identity_cache.invalidate(teacher.user_id)
             flash(f'Teacher "{teacher.name}" has been unassigned from class "{class_.name}".', 'success')
         except Exception as e:
             db.session.rollback()
@@ -0,0 +1,39 @@
+# assets.py
+
+from flask import Blueprint, current_app, request, send_from_directory, make_response
+from werkzeug.exceptions import NotFound
+from services.assets import manifest, split_fingerprint, preferred_coding
+
+assets_bp = Blueprint('assets', __name__)
+
+@assets_bp.route('/assets/<path:filename>')
+def asset(filename):
+    # Fingerprinted URLs from asset_url(): the name changes with the content,
+    # so a matching file can be cached forever
+    source, digest = split_fingerprint(filename)
+    asset = manifest.get(source)
+    if asset is None:
+        raise NotFound()
+    # An old or unknown digest (say, a page rendered before a deploy) still
+    # gets the current file, just not with the long-lived caching
+    current = asset.digest == digest
+    max_age = current_app.config['ASSET_MAX_AGE'] if current else None
+
+    if asset.bodies is None:
+        response = send_from_directory(current_app.static_folder, source, max_age=max_age)
+    else:
+        coding = preferred_coding(asset.bodies)
+        response = make_response(asset.bodies[coding])
+        response.mimetype = asset.mimetype
+        if coding != 'identity':
+            response.headers['Content-Encoding'] = coding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f'{asset.digest}-{coding}')
+        if max_age is not None:
+            response.cache_control.max_age = max_age
+        response.make_conditional(request)
+
+    if current:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
@@ -0,0 +1,29 @@
+# media.py
+
+from flask import Blueprint, current_app, send_from_directory, redirect
+from werkzeug.exceptions import NotFound
+from models import db, Book
+from services.covers import mirror_book_id
+
+media_bp = Blueprint('media', __name__)
+
+@media_bp.route('/covers/<path:filename>')
+def cover(filename):
+    # Cover files are never rewritten under the same name, so they can be
+    # cached for as long as browsers allow
+    try:
+        response = send_from_directory(
+            current_app.config['UPLOAD_FOLDER'], filename,
+            max_age=current_app.config['COVER_CACHE_MAX_AGE']
+        )
+    except NotFound:
+        # A mirrored cover that has gone missing: send the browser to the original
+        book_id = mirror_book_id(filename)
+        book = db.session.get(Book, book_id) if book_id else None
+        if book and book.cover_url:
+            return redirect(book.cover_url)
+        raise
+
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
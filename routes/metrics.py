@@ -0,0 +1,21 @@
+# metrics.py
+
+from flask import Blueprint, Response, current_app, request
+from werkzeug.exceptions import NotFound, Unauthorized
+from services.metrics import registry, exposition, metrics_enabled
+import hmac
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    # Prometheus scrape endpoint, summed over every worker process
+    if not metrics_enabled():
+        raise NotFound()
+    token = current_app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                         f'Bearer {token}'.encode()):
+        raise Unauthorized()
+    response = Response(exposition(registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
@@ -1,7 +1,18 @@
 # student.py
 
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models import db, User, Student, Class, Book, BorrowHistory, DonationRequest
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app, g, jsonify, get_template_attribute
+from markupsafe import Markup
+from models import db, User, Student, Class, Book, BorrowHistory, DonationRequest, BorrowState
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from services.pagination import keyset_paginate
+from services.fragments import get_fragment_cache, fill_slots
+from services.versions import class_version
+from services.events import notify_class_change
+from services.identity import load_identity
+from services.search import search_books
+from services import borrowing
+from services.borrowing import BorrowError
 from functools import wraps
 from datetime import datetime
 
@@ -13,125 +24,142 @@ def student_required(f):
         if 'role' not in session or session['role'] != 'student':
             flash('You do not have permission to access this page.', 'danger')
             return redirect(url_for('auth.login'))
+        # Resolves the student and their class once for the whole request
+        if load_identity().profile_id is None:
+            flash('Student profile not found.', 'danger')
+            return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
     return decorated_function
 
 @student_bp.route('/')
 @student_required
 def index():
-    user = User.query.get(session['user_id'])
-    student = user.student_profile
-    if not student:
-        flash('Student profile not found.', 'danger')
+    identity = g.identity
+    student_class = identity.first_class()
+    if student_class is None:
+        flash('You are not assigned to a class yet.', 'danger')
         return redirect(url_for('auth.login'))
 
-    student_class = student.classes[0]
+    # The book cards are the same for the whole class, so they come from the
+    # fragment cache; the buttons for this student are filled in below
+    books, grid = class_book_grid(student_class.id)
+
+    # Borrow history for the student, newest first
+    borrow_history = keyset_paginate(
+        BorrowHistory.query.filter(
+            BorrowHistory.student_id == identity.profile_id,
+            BorrowHistory.state.in_([BorrowState.PENDING, BorrowState.BORROWED, BorrowState.RETURNED])
+        ).options(
+            selectinload(BorrowHistory.book),
+            selectinload(BorrowHistory.student)
+        ),
+        BorrowHistory.id, 'borrows', current_app.config['HISTORY_PER_PAGE'], descending=True
+    )
+
+    # Donation requests made by the student, newest first
+    donation_requests = keyset_paginate(
+        DonationRequest.query.filter_by(student_id=identity.profile_id),
+        DonationRequest.id, 'donations', current_app.config['HISTORY_PER_PAGE'], descending=True
+    )
 
-    # Get books from the student's class
-    books = Book.query.filter_by(class_id=student_class.id).all()
+    # Total active requests and borrows, from the student's maintained counter
+    total_active = borrowing.active_count(identity.profile_id)
 
-    # Borrow history for the student
-    borrow_history = BorrowHistory.query.filter_by(student_id=student.id).order_by(BorrowHistory.id.desc()).filter(~BorrowHistory.status.contains('Rejected')).all()
+    # Book ID -> BorrowHistory ID of the student's pending requests and current borrows
+    pending_request_ids = {}
+    borrowed_book_ids = {}
 
-    # Donation requests made by the student
-    donation_requests = DonationRequest.query.filter_by(student_id=student.id).order_by(DonationRequest.id.desc()).all()
+    # Only look the requests up when the counter says there are some
+    if total_active:
+        rows = db.session.execute(
+            select(BorrowHistory.book_id, BorrowHistory.id, BorrowHistory.state).where(
+                BorrowHistory.student_id == identity.profile_id,
+                BorrowHistory.state.in_(borrowing.ACTIVE_STATES)
+            )
+        )
+        for book_id, borrow_id, state in rows:
+            if state == BorrowState.PENDING:
+                pending_request_ids[book_id] = borrow_id
+            else:
+                borrowed_book_ids[book_id] = borrow_id
 
-    # Get IDs of books the student has requested to borrow or currently borrowed and not returned
-    requested_book_ids = set()
-    
-    # Books with pending borrow requests (exclude rejected requests)
-    pending_requests = BorrowHistory.query.filter(
-        BorrowHistory.student_id == student.id,
-        BorrowHistory.borrow_date == None,
-        ~BorrowHistory.status.contains('Rejected')
-    ).all()
-    requested_book_ids.update([request.book_id for request in pending_requests])
-
-    # Books currently borrowed and not returned
-    active_borrows = BorrowHistory.query.filter(
-        BorrowHistory.student_id == student.id,
-        BorrowHistory.return_date == None,
-        BorrowHistory.borrow_date != None
-    ).all()
-    requested_book_ids.update([borrow.book_id for borrow in active_borrows])
-
-    # Create a dictionary to map book IDs to borrow request IDs for borrowed books
-    borrowed_book_ids = {borrow.book_id: borrow.id for borrow in active_borrows}
-    #print(borrowed_book_ids)
-
-    # Calculate total active requests and borrows
-    total_active = len(pending_requests) + len(active_borrows)
+    book_actions = get_template_attribute('student_book_grid.html', 'book_actions')
+    book_grid = fill_slots(grid['desktop'], 'book_actions', lambda book_id, lent: book_actions(
+        int(book_id), lent == '1', pending_request_ids, borrowed_book_ids, total_active
+    ))
 
     # Pass all variables to the template
     return render_template(
         'student_index.html',
         books=books,
+        book_grid=book_grid,
+        book_slides=Markup(grid['mobile']),
         borrow_history=borrow_history,
         donation_requests=donation_requests,
         student_class=student_class,
-        requested_book_ids=requested_book_ids,  # Pending borrow request IDs
-        borrowed_book_ids=borrowed_book_ids,    # Borrowed book IDs
-        pending_requests=pending_requests,      # Pass pending requests to match requests with books
         total_active=total_active
     )
 
 
+def class_book_grid(class_id):
+    """The requested page of a class's catalog and its rendered book cards.
+
+    The page's book IDs are looked up first, and the cards are cached under
+    the first and last of them and the class's change version, which every
+    write to its books or borrows bumps. So a cached grid is never stale,
+    and cursors that land on the same page share its entry, however the
+    client came by them. Returns the page (of book IDs, for the pager) and
+    the desktop and mobile markup.
+    """
+    page = keyset_paginate(
+        db.session.query(Book.id).filter_by(class_id=class_id),
+        Book.id, 'books', current_app.config['BOOKS_PER_PAGE']
+    )
+    first_id, last_id = (page.items[0].id, page.items[-1].id) if page.items else (None, None)
+    key = (class_id, class_version(class_id), first_id, last_id)
+
+    def build():
+        # Books with donor and borrower loaded in bulk
+        books = Book.query.filter(
+            Book.class_id == class_id, Book.id.between(first_id, last_id)
+        ).options(
+            selectinload(Book.donor),
+            selectinload(Book.borrower)
+        ).order_by(Book.id).all() if page.items else []
+        return {
+            'desktop': str(get_template_attribute('student_book_grid.html', 'desktop_grid')(books)),
+            'mobile': str(get_template_attribute('student_book_grid.html', 'mobile_grid')(books)),
+        }
+
+    return page, get_fragment_cache().fetch('student_book_grid.html', key, build)
+
+
+# Catalog search for the search box, limited to the student's class
+@student_bp.route('/api/search')
+@student_required
+def search():
+    identity = g.identity
+    if identity.class_id is None:
+        return jsonify({'results': []})
+    results = search_books(identity.class_id, request.args.get('q', ''), current_app.config['SEARCH_RESULTS_LIMIT'])
+    for result in results:
+        result['url'] = url_for('student.book_details', book_id=result['id'])
+    return jsonify({'results': results})
+
 @student_bp.route('/request_borrow/<int:book_id>', methods=['POST'])
 @student_required
 def request_borrow(book_id):
-    user = User.query.get(session['user_id'])
-    student = user.student_profile
-
-    # Check if the student has reached the limit of 2 active borrow requests or borrowed books
-    pending_requests_count = BorrowHistory.query.filter(
-        BorrowHistory.student_id == student.id,
-        BorrowHistory.borrow_date == None,
-        ~BorrowHistory.status.contains('Rejected')
-    ).count()
-    active_borrows_count = BorrowHistory.query.filter(
-        BorrowHistory.student_id == student.id,
-        BorrowHistory.return_date == None,
-        BorrowHistory.borrow_date != None
-    ).count()
-    total_active = pending_requests_count + active_borrows_count
-
-    if total_active >= 2:
-        flash("You cannot have more than 2 active borrow requests or borrowed books at a time.", 'danger')
-        return redirect(url_for('student.index'))
-
+    identity = g.identity
     book = Book.query.get_or_404(book_id)
 
-    # Check if the book belongs to the student's class
-    if book.class_id != student.classes[0].id:
-        flash("You cannot request books from another class.", 'danger')
+    # Availability, duplicate and limit checks happen in the same statement
+    # as the insert, so concurrent requests cannot get past them together
+    try:
+        borrowing.request_borrow(identity.profile_id, identity.class_id, book, identity.user_id)
+    except BorrowError as e:
+        flash(str(e), 'danger')
         return redirect(url_for('student.index'))
 
-    # Check if the book is already borrowed
-    if book.borrowed_by_id:
-        flash(f'The book "{book.title}" is already borrowed by someone else.', 'danger')
-        return redirect(url_for('student.index'))
-
-    # Check if the student has an active request or borrow for this book
-    existing_request = BorrowHistory.query.filter(
-        BorrowHistory.student_id == student.id,
-        BorrowHistory.book_id == book_id,
-        BorrowHistory.return_date == None,
-        ~BorrowHistory.status.contains('Rejected')
-    ).first()
-    if existing_request:
-        flash(f'You have already requested or borrowed "{book.title}".', 'danger')
-        return redirect(url_for('student.index'))
-
-    # Create a new borrow request
-    borrow_request = BorrowHistory(
-        book_id=book.id,
-        student_id=student.id,
-        borrow_date=None,
-        status="Pending approval"
-    )
-    db.session.add(borrow_request)
-    db.session.commit()
-
     flash(f'Request to borrow "{book.title}" has been sent successfully!', 'success')
     return redirect(url_for('student.index'))
 
@@ -139,20 +167,18 @@ def request_borrow(book_id):
 @student_required
 def cancel_request(request_id):
     borrow_request = BorrowHistory.query.get_or_404(request_id)
-    user = User.query.get(session['user_id'])
-    student = user.student_profile
+    identity = g.identity
 
-    if borrow_request.student_id != student.id:
+    if borrow_request.student_id != identity.profile_id:
         flash("You cannot cancel a request you didn't make.", 'danger')
         return redirect(url_for('student.index'))
 
-    if borrow_request.borrow_date:
+    try:
+        borrowing.cancel_request(borrow_request, identity.profile_id, identity.user_id)
+    except BorrowError:
         flash("You cannot cancel a request that has already been approved.", 'danger')
         return redirect(url_for('student.index'))
 
-    db.session.delete(borrow_request)
-    db.session.commit()
-
     flash("Your borrow request has been canceled.", 'success')
     return redirect(url_for('student.index'))
 
@@ -162,22 +188,21 @@ def return_book(borrow_id):
     borrow_record = BorrowHistory.query.get_or_404(borrow_id)
     book = borrow_record.book
 
-    user = User.query.get(session['user_id'])
-    student = user.student_profile
+    identity = g.identity
 
-    if borrow_record.student_id != student.id:
+    if borrow_record.student_id != identity.profile_id:
         flash("You cannot return books borrowed by other students.", 'danger')
         return redirect(url_for('student.index'))
 
-    if borrow_record.return_date:
+    if borrow_record.state == BorrowState.RETURNED:
         flash("This book has already been returned.", 'danger')
         return redirect(url_for('student.index'))
 
-    book.borrowed_by_id = None
-    borrow_record.return_date = datetime.utcnow()
-    borrow_record.status = f"Returned by {student.name}"
-
-    db.session.commit()
+    try:
+        borrowing.return_book(borrow_record, identity.user_id)
+    except BorrowError:
+        flash("This book has not been borrowed yet.", 'danger')
+        return redirect(url_for('student.index'))
 
     flash(f'Book "{book.title}" has been returned successfully!', 'success')
     return redirect(url_for('student.index'))
@@ -187,30 +212,29 @@ def return_book(borrow_id):
 def book_details(book_id):
     book = Book.query.get_or_404(book_id)
 
-    user = User.query.get(session['user_id'])
-    student = user.student_profile
-    if book.class_id != student.classes[0].id:
+    identity = g.identity
+    if book.class_id != identity.class_id:
         flash("You cannot view details of books from another class.", 'danger')
         return redirect(url_for('student.index'))
 
-    borrow_histories = BorrowHistory.query.filter_by(book_id=book.id).order_by(BorrowHistory.borrow_date.desc()).all()
+    borrow_histories = keyset_paginate(
+        BorrowHistory.query.filter_by(book_id=book.id).options(
+            selectinload(BorrowHistory.student)
+        ),
+        BorrowHistory.id, 'history', current_app.config['HISTORY_PER_PAGE'], descending=True
+    )
+
+    total_active = borrowing.active_count(identity.profile_id)
 
-    # Get IDs of books the student has requested or borrowed
+    # Get IDs of books the student has requested or borrowed, if they have any
     requested_book_ids = set()
-    pending_requests = BorrowHistory.query.filter(
-        BorrowHistory.student_id == student.id,
-        BorrowHistory.borrow_date == None,
-        ~BorrowHistory.status.contains('Rejected')
-    ).all()
-    requested_book_ids.update([request.book_id for request in pending_requests])
-    active_borrows = BorrowHistory.query.filter(
-        BorrowHistory.student_id == student.id,
-        BorrowHistory.return_date == None,
-        BorrowHistory.borrow_date != None
-    ).all()
-    requested_book_ids.update([borrow.book_id for borrow in active_borrows])
-
-    total_active = len(pending_requests) + len(active_borrows)
+    if total_active:
+        requested_book_ids.update(db.session.scalars(
+            select(BorrowHistory.book_id).where(
+                BorrowHistory.student_id == identity.profile_id,
+                BorrowHistory.state.in_(borrowing.ACTIVE_STATES)
+            )
+        ))
 
     return render_template(
         'book_details.html',
@@ -223,10 +247,13 @@ def book_details(book_id):
 @student_bp.route('/request_donate', methods=['GET', 'POST'])
 @student_required
 def request_donate():
-    user = User.query.get(session['user_id'])
-    student = user.student_profile
+    identity = g.identity
 
     if request.method == 'POST':
+        if identity.class_id is None:
+            flash('You are not assigned to a class yet.', 'danger')
+            return redirect(url_for('student.index'))
+
         isbn = request.form.get('isbn')
         title = request.form.get('title')
         series = request.form.get('series')
@@ -238,11 +265,11 @@ def request_donate():
             series=series,
             author=author,
             isbn=isbn,
-            student_id=student.id,
-            class_id=student.classes[0].id,
-            status="Pending approval"
+            student_id=identity.profile_id,
+            class_id=identity.class_id
         )
         db.session.add(new_request)
+        notify_class_change(new_request.class_id, 'donation_requested')
         db.session.commit()
 
         flash('Your donation request has been sent successfully!', 'success')
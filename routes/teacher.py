@@ -1,11 +1,23 @@
 # teacher.py
 
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app, jsonify
-from models import db, User, Teacher, Class, Book, BorrowHistory, DonationRequest, Student
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app, jsonify, g, Response, stream_with_context
+from models import db, User, Teacher, Class, Book, BorrowHistory, DonationRequest, Student, BorrowState, DonationState, teacher_class
+from sqlalchemy import select, case, update
+from sqlalchemy.orm import selectinload, contains_eager
+from services.pagination import keyset_paginate
+from services.openlibrary import enrich_book
+from services.book_intake import parse_isbns, intake_books
+from services.search import search_books
+from services import borrowing
+from services.borrowing import BorrowError
+from services.tasks import run_in_background
+from services.images import save_cover, remove_cover, delete_cover_files
+from services.events import notify_class_change, event_stream
+from services.versions import class_etag, conditional_response
+from services.identity import load_identity
 from functools import wraps
 from datetime import datetime
-import os, requests
-from werkzeug.utils import secure_filename
+import json
 
 teacher_bp = Blueprint('teacher', __name__, template_folder='templates')
 
@@ -14,7 +26,7 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
     
-def teacher_required(f):
+def teacher_role_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'role' not in session or session['role'] != 'teacher':
@@ -23,17 +35,27 @@ def teacher_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def teacher_required(f):
+    @teacher_role_required
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # Resolves the teacher and their classes once for the whole request
+        if load_identity().profile_id is None:
+            flash('Teacher profile not found.', 'danger')
+            return redirect(url_for('auth.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
 @teacher_bp.route('/teacher')
 @teacher_required
 def teacher_dashboard():
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
+    identity = g.identity
 
     # Fetch all classes the teacher is assigned to
-    teacher_classes = teacher.classes
+    teacher_classes = identity.classes
 
     # If there's only one class, we can directly use it, else the user needs to select one
-    selected_class = teacher_classes[0] if len(teacher_classes) == 1 else None
+    selected_class_id = identity.class_id if len(teacher_classes) == 1 else None
 
     # Initialize collections for students, books, requests, borrows, and donations
     students = []
@@ -43,33 +65,41 @@ def teacher_dashboard():
     pending_donations = []
 
     # If the teacher has more than one class, allow selecting a class via a dropdown
-    if not selected_class and 'class_id' in request.args:
-        selected_class = Class.query.get(request.args.get('class_id'))
+    if not selected_class_id and identity.in_class(request.args.get('class_id', type=int)):
+        selected_class_id = request.args.get('class_id', type=int)
+    selected_class = Class.query.get(selected_class_id) if selected_class_id else None
 
     # If selected_class exists, gather data
     if selected_class:
         students = selected_class.students
-        books = Book.query.filter_by(class_id=selected_class.id).all()
+        books = Book.query.filter_by(class_id=selected_class.id).options(
+            selectinload(Book.donor),
+            selectinload(Book.borrower)
+        ).all()
 
         # Gather pending borrow requests for the current class
-        pending_requests = BorrowHistory.query.filter(
-            BorrowHistory.borrow_date == None,
-            BorrowHistory.book.has(class_id=selected_class.id),
-            ~BorrowHistory.status.contains('Rejected')
+        pending_requests = BorrowHistory.query.join(BorrowHistory.book).filter(
+            Book.class_id == selected_class.id,
+            BorrowHistory.state == BorrowState.PENDING
+        ).options(
+            contains_eager(BorrowHistory.book),
+            selectinload(BorrowHistory.student)
         ).all()
 
         # Gather active borrows for the current class
-        active_borrows = BorrowHistory.query.filter(
-            BorrowHistory.borrow_date != None,
-            BorrowHistory.return_date == None,
-            BorrowHistory.book.has(class_id=selected_class.id)
+        active_borrows = BorrowHistory.query.join(BorrowHistory.book).filter(
+            Book.class_id == selected_class.id,
+            BorrowHistory.state == BorrowState.BORROWED
+        ).options(
+            contains_eager(BorrowHistory.book),
+            selectinload(BorrowHistory.student)
         ).all()
 
         # Gather pending donation requests for the current class
         pending_donations = DonationRequest.query.filter_by(
-            status="Pending approval",
+            state=DonationState.PENDING,
             class_id=selected_class.id
-        ).all()
+        ).options(selectinload(DonationRequest.student)).all()
 
     return render_template('teacher_dashboard.html',
                            students=students,
@@ -82,25 +112,53 @@ def teacher_dashboard():
 
 
 
-# API to get pending requests (for AJAX polling)
+def api_class():
+    """The class an /api/pending_requests call is about, as (id, name, version).
+
+    That is the `class_id` argument if it is one of the logged-in teacher's
+    classes, otherwise their first class, or None if they have no class. It
+    is a single indexed query, and the whole of an unchanged poll, so these
+    endpoints use teacher_role_required rather than resolving the identity.
+    """
+    class_id = request.args.get('class_id', type=int)
+    return db.session.execute(
+        select(Class.id, Class.name, Class.version)
+        .join(teacher_class, teacher_class.c.class_id == Class.id)
+        .join(Teacher, Teacher.id == teacher_class.c.teacher_id)
+        .where(Teacher.user_id == session['user_id'])
+        .order_by(case((Class.id == class_id, 0), else_=1), Class.id)
+        .limit(1)
+    ).first()
+
+
+# API to get pending requests, fetched by the dashboard when the stream below
+# reports a change. Answers 304 while the class's change version is the same.
 @teacher_bp.route('/api/pending_requests')
-@teacher_required
+@teacher_role_required
 def get_pending_requests():
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
-    teacher_class = teacher.classes[0]  # Assume teacher is assigned to one class for simplicity
+    teacher_class = api_class()
+    if teacher_class is None:
+        return jsonify({'error': 'You are not assigned to a class.'}), 404
+
+    etag = class_etag('pending-requests', teacher_class.id, teacher_class.version)
+    return conditional_response(etag, lambda: pending_requests_json(teacher_class))
 
+
+def pending_requests_json(teacher_class):
     # Get only pending borrow requests
-    pending_borrow_requests = BorrowHistory.query.filter(
-        BorrowHistory.borrow_date == None,  # Only requests with no borrow date
-        BorrowHistory.book.has(class_id=teacher_class.id)
+    pending_borrow_requests = BorrowHistory.query.join(BorrowHistory.book).filter(
+        Book.class_id == teacher_class.id,
+        BorrowHistory.state == BorrowState.PENDING  # Only requests awaiting approval
+    ).options(
+        contains_eager(BorrowHistory.book),
+        selectinload(BorrowHistory.student)
     ).all()
 
     # Get only pending donation requests
     pending_donation_requests = DonationRequest.query.filter_by(
-        status="Pending approval",  # Only requests pending approval
+        state=DonationState.PENDING,  # Only requests pending approval
         class_id=teacher_class.id
-    ).all()
+    ).options(selectinload(DonationRequest.student)).all()
 
     # Return the data in JSON format with request_id and other relevant info
     return jsonify({
@@ -120,35 +178,54 @@ def get_pending_requests():
                 'book_title': request.title,
                 'student_name': request.student.name,
                 'class_name': teacher_class.name,
-                'request_date': request.submitted_at.strftime('%Y-%m-%d') if request.submitted_at else 'N/A'
+                'request_date': request.created_at.strftime('%Y-%m-%d') if request.created_at else 'N/A'
             }
             for request in pending_donation_requests
         ]
     })
 
 
+# Server-Sent Events: one event each time a borrow or donation request in the
+# class is created or changes state
+@teacher_bp.route('/api/pending_requests/stream')
+@teacher_role_required
+def pending_requests_stream():
+    teacher_class = api_class()
+    if teacher_class is None:
+        return jsonify({'error': 'You are not assigned to a class.'}), 404
+
+    return event_stream(teacher_class.id, request.headers.get('Last-Event-ID', type=int))
+
+
+# Catalog search for the search box, limited to one of the teacher's classes
+@teacher_bp.route('/teacher/api/search')
+@teacher_required
+def search():
+    class_id = request.args.get('class_id', type=int)
+    if not g.identity.in_class(class_id):
+        return jsonify({'error': "You cannot search a class that you don't manage."}), 403
+    results = search_books(class_id, request.args.get('q', ''), current_app.config['SEARCH_RESULTS_LIMIT'])
+    for result in results:
+        result['url'] = url_for('teacher.book_details', book_id=result['id'])
+    return jsonify({'results': results})
+
 @teacher_bp.route('/delete_book/<int:book_id>', methods=['POST'])
 @teacher_required
 def delete_book(book_id):
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
-    teacher_class = teacher.classes[0]
+    identity = g.identity
 
     book = Book.query.get_or_404(book_id)
 
-    if book.class_id != teacher_class.id:
+    if not identity.in_class(book.class_id):
         flash('You cannot delete books outside your class.', 'danger')
         return redirect(url_for('teacher.teacher_dashboard'))
 
     try:
-        # Remove the cover image file if it exists
-        if book.cover_filename:
-            cover_path = os.path.join(current_app.config['UPLOAD_FOLDER'], book.cover_filename)
-            if os.path.exists(cover_path):
-                os.remove(cover_path)
-
+        notify_class_change(book.class_id, 'book_deleted')
+        borrowing.release_books(select(Book.id).where(Book.id == book.id))
         db.session.delete(book)
         db.session.commit()
+        delete_cover_files(book)
         flash('Book deleted successfully.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -164,35 +241,21 @@ def approve_borrow(request_id):
     borrow_request = BorrowHistory.query.get_or_404(request_id)
     book = borrow_request.book
 
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
-    teacher_classes = teacher.classes  # Get all classes assigned to the teacher
+    identity = g.identity
 
     # Check if the book belongs to any class that the teacher manages
-    if book.class_id not in [class_.id for class_ in teacher_classes]:
+    if not identity.in_class(book.class_id):
         flash("You cannot approve requests for books outside your assigned classes.", 'danger')
         return redirect(url_for('teacher.teacher_dashboard'))
 
-    # Check if the book is already borrowed
-    if book.borrowed_by_id:
-        flash(f'Book "{book.title}" is already borrowed by someone else.', 'danger')
-        return redirect(url_for('teacher.teacher_dashboard'))
-
-    # Safely access the student associated with the borrow request
-    student = borrow_request.student
-    if not student:
-        flash("Student not found.", 'danger')
+    # The book is lent only if it is still free and the request still
+    # pending when the update runs, so two approvals cannot both succeed
+    try:
+        borrowing.approve_request(borrow_request, identity.user_id)
+    except BorrowError as e:
+        flash(str(e), 'danger')
         return redirect(url_for('teacher.teacher_dashboard'))
 
-    # Mark the book as borrowed by the student and update borrow request status
-    book.borrowed_by_id = student.id
-    book.borrowed_date = datetime.utcnow()
-
-    borrow_request.borrow_date = datetime.utcnow()
-    borrow_request.status = f"Borrowed by {student.name}"
-
-    # Commit the changes to the database
-    db.session.commit()
     flash(f'Borrow request for "{book.title}" approved!', 'success')
     return redirect(url_for('teacher.teacher_dashboard'))
 
@@ -203,20 +266,18 @@ def reject_borrow(request_id):
     borrow_request = BorrowHistory.query.get_or_404(request_id)
     book = borrow_request.book
 
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
-    teacher_classes = teacher.classes  # Get all classes assigned to the teacher
+    identity = g.identity
 
     # Check if the book belongs to any class that the teacher manages
-    if book.class_id not in [class_.id for class_ in teacher_classes]:
+    if not identity.in_class(book.class_id):
         flash("You cannot reject requests for books outside your assigned classes.", 'danger')
         return redirect(url_for('teacher.teacher_dashboard'))
 
-    # Update the borrow request status as rejected
-    borrow_request.status = f"Rejected by {teacher.name}"
-
-    # Commit the changes to the database
-    db.session.commit()
+    try:
+        borrowing.reject_request(borrow_request, identity.user_id)
+    except BorrowError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('teacher.teacher_dashboard'))
 
     flash(f'Borrow request for "{book.title}" has been rejected.', 'success')
     return redirect(url_for('teacher.teacher_dashboard'))
@@ -228,90 +289,73 @@ def return_book(borrow_id):
     borrow_record = BorrowHistory.query.get_or_404(borrow_id)
     book = borrow_record.book
 
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
-    teacher_class = teacher.classes[0]
+    identity = g.identity
 
-    if book.class_id != teacher_class.id:
+    if not identity.in_class(book.class_id):
         flash("You cannot return books outside your class.", 'danger')
         return redirect(url_for('teacher.teacher_dashboard'))
 
-    book.borrowed_by_id = None
-    borrow_record.return_date = datetime.utcnow()
-    borrow_record.status = f"Returned by {borrow_record.student.name}"
-
-    db.session.commit()
+    try:
+        borrowing.return_book(borrow_record, identity.user_id)
+    except BorrowError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('teacher.teacher_dashboard'))
 
     flash(f'Book "{book.title}" has been marked as returned.', "success")
     return redirect(url_for('teacher.teacher_dashboard'))
 
 
 
+def decide_donation(donation_request, state, actor_id):
+    """Move a pending donation request to `state`, or roll back and return False if it is no longer pending.
+
+    A conditional UPDATE, so two teachers handling the same request at once
+    cannot both win (and add the book twice).
+    """
+    decided = db.session.execute(
+        update(DonationRequest)
+        .where(DonationRequest.id == donation_request.id, DonationRequest.state == DonationState.PENDING)
+        .values(state=state, actor_id=actor_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not decided:
+        db.session.rollback()
+    return bool(decided)
+
+
 @teacher_bp.route('/approve_donation/<int:donation_id>', methods=['GET', 'POST'])
 @teacher_required
 def approve_donation(donation_id):
     donation_request = DonationRequest.query.get_or_404(donation_id)
 
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
-    teacher_class = teacher.classes[0]
+    identity = g.identity
 
-    if donation_request.class_id != teacher_class.id:
+    if not identity.in_class(donation_request.class_id):
         flash("You cannot approve donations outside your class.", 'danger')
         return redirect(url_for('teacher.teacher_dashboard'))
 
+    if donation_request.state != DonationState.PENDING:
+        flash("This donation request has already been processed.", 'danger')
+        return redirect(url_for('teacher.teacher_dashboard'))
+
     if request.method == 'POST':
-        # Fetch data from form or Open Library API if available
+        if not decide_donation(donation_request, DonationState.APPROVED, identity.user_id):
+            flash("This donation request has already been processed.", 'danger')
+            return redirect(url_for('teacher.teacher_dashboard'))
+
+        # The book is created from the donation form right away; title, author
+        # and cover are filled in from Open Library by a background job
         title = donation_request.title
         series = donation_request.series
         author = donation_request.author
         isbn = donation_request.isbn
         cover_url = None
         cover_filename = None
-        if isbn:
-            isbn_clean = isbn.replace('-', '').strip()
-            openlibrary_url = f'https://openlibrary.org/api/books?bibkeys=ISBN%3A{isbn_clean}&jscmd=details&format=json'
-            try:
-                response = requests.get(openlibrary_url)
-                if response.status_code == 200:
-                    data = response.json()
-                    book_key = f'ISBN:{isbn_clean}'
-                    if book_key in data:
-                        book_data = data[book_key]
-                        details = book_data.get('details', {})
-                        title = details.get('title', title)
-                        # Get authors
-                        authors_list = details.get('authors', [])
-                        if authors_list:
-                            author_names = []
-                            for author_entry in authors_list:
-                                author_name = author_entry.get('name', '')
-                                if author_name:
-                                    author_names.append(author_name)
-                            author = ', '.join(author_names) if author_names else author
-                        # Get cover
-                        covers = details.get('covers', [])
-                        if covers:
-                            cover_id = covers[0]
-                            cover_url = f'https://covers.openlibrary.org/b/id/{cover_id}-M.jpg'
-                        else:
-                            # Try to get thumbnail_url if cover is not available in details
-                            cover_url = book_data.get('thumbnail_url', None)
-                    else:
-                        flash('ISBN not found in Open Library.', 'warning')
-                else:
-                    flash('Error fetching data from Open Library.', 'danger')
-            except Exception as e:
-                #flash(e)
-                flash('Error fetching data from Open Library. except', 'danger')
+        cover_variants = False
         # Handle file upload
         file = request.files.get('cover_image')
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            filename = f"{datetime.utcnow().timestamp()}_{filename}"
-            upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(upload_path)
-            cover_filename = filename
+            cover_filename, cover_variants = save_cover(file)
 
         # Approve donation and create the book
         new_book = Book(
@@ -321,13 +365,17 @@ def approve_donation(donation_id):
             isbn=isbn,
             cover_url=cover_url,
             cover_filename=cover_filename,
+            cover_variants=cover_variants,
             donated_by_id=donation_request.student_id,
             class_id=donation_request.class_id
         )
         db.session.add(new_book)
-        donation_request.status = "Approved"
+        notify_class_change(donation_request.class_id, 'donation_approved')
         db.session.commit()
 
+        if isbn:
+            run_in_background(enrich_book, new_book.id, isbn)
+
         flash(f'Donation of "{title}" has been approved and added to the inventory.', 'success')
         return redirect(url_for('teacher.teacher_dashboard'))
 
@@ -338,16 +386,17 @@ def approve_donation(donation_id):
 def reject_donation(donation_id):
     donation_request = DonationRequest.query.get_or_404(donation_id)
 
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
-    teacher_class = teacher.classes[0]
+    identity = g.identity
 
-    if donation_request.class_id != teacher_class.id:
+    if not identity.in_class(donation_request.class_id):
         flash("You cannot reject donations outside your class.", 'danger')
         return redirect(url_for('teacher.teacher_dashboard'))
 
-    donation_request.status = "Rejected"
+    if not decide_donation(donation_request, DonationState.REJECTED, identity.user_id):
+        flash("This donation request has already been processed.", 'danger')
+        return redirect(url_for('teacher.teacher_dashboard'))
 
+    notify_class_change(donation_request.class_id, 'donation_rejected')
     db.session.commit()
 
     flash(f'Donation of "{donation_request.title}" has been rejected.', 'success')
@@ -358,15 +407,19 @@ def reject_donation(donation_id):
 def book_details(book_id):
     book = Book.query.get_or_404(book_id)
 
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
-    teacher_class = teacher.classes[0]
+    identity = g.identity
 
-    if book.class_id != teacher_class.id:
+    if not identity.in_class(book.class_id):
         flash("You cannot view details of books outside your class.", 'danger')
         return redirect(url_for('teacher.teacher_dashboard'))
 
-    borrow_histories = BorrowHistory.query.filter_by(book_id=book.id).order_by(BorrowHistory.borrow_date.desc()).all()
+    borrow_histories = keyset_paginate(
+        BorrowHistory.query.filter_by(book_id=book.id).options(
+            selectinload(BorrowHistory.student),
+            selectinload(BorrowHistory.actor).selectinload(User.teacher_profile)
+        ),
+        BorrowHistory.id, 'history', current_app.config['HISTORY_PER_PAGE'], descending=True
+    )
 
     # Render the teacher-specific template
     return render_template('book_details_teacher.html', book=book, borrow_histories=borrow_histories)
@@ -376,16 +429,23 @@ def book_details(book_id):
 def student_history(student_id):
     student = Student.query.get_or_404(student_id)
 
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
-    teacher_class = teacher.classes[0]
+    identity = g.identity
 
-    if student not in teacher_class.students:
+    if not any(identity.in_class(class_.id) for class_ in student.classes):
         flash("You cannot view history of students outside your class.", 'danger')
         return redirect(url_for('teacher.teacher_dashboard'))
 
-    borrow_history = BorrowHistory.query.filter_by(student_id=student.id).order_by(BorrowHistory.id.desc()).all()
-    donation_requests = DonationRequest.query.filter_by(student_id=student.id).order_by(DonationRequest.id.desc()).all()
+    borrow_history = keyset_paginate(
+        BorrowHistory.query.filter_by(student_id=student.id).options(
+            selectinload(BorrowHistory.book),
+            selectinload(BorrowHistory.actor).selectinload(User.teacher_profile)
+        ),
+        BorrowHistory.id, 'borrows', current_app.config['HISTORY_PER_PAGE'], descending=True
+    )
+    donation_requests = keyset_paginate(
+        DonationRequest.query.filter_by(student_id=student.id),
+        DonationRequest.id, 'donations', current_app.config['HISTORY_PER_PAGE'], descending=True
+    )
 
     return render_template('student_history.html', student=student, borrow_history=borrow_history, donation_requests=donation_requests)
 
@@ -393,11 +453,9 @@ def student_history(student_id):
 @teacher_required
 def edit_book(book_id):
     book = Book.query.get_or_404(book_id)
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
-    teacher_class = teacher.classes[0]
+    identity = g.identity
 
-    if book.class_id != teacher_class.id:
+    if not identity.in_class(book.class_id):
         flash("You cannot edit books outside your class.", 'danger')
         return redirect(url_for('teacher.teacher_dashboard'))
 
@@ -411,19 +469,14 @@ def edit_book(book_id):
         # Handle file upload for cover image
         file = request.files.get('cover_image')
         if file and allowed_file(file.filename):
-            # Remove old cover image if exists
+            # Remove old cover image and its variants if they exist
             if book.cover_filename:
-                old_cover_path = os.path.join(current_app.config['UPLOAD_FOLDER'], book.cover_filename)
-                if os.path.exists(old_cover_path):
-                    os.remove(old_cover_path)
+                remove_cover(book.cover_filename)
 
             # Save new cover image
-            filename = secure_filename(file.filename)
-            filename = f"{datetime.utcnow().timestamp()}_{filename}"
-            upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(upload_path)
-            book.cover_filename = filename
+            book.cover_filename, book.cover_variants = save_cover(file)
 
+        notify_class_change(book.class_id, 'book_updated')
         db.session.commit()
         flash(f'Book "{book.title}" has been updated successfully!', 'success')
         return redirect(url_for('teacher.teacher_dashboard'))
@@ -434,11 +487,10 @@ def edit_book(book_id):
 @teacher_bp.route('/add_book', methods=['GET', 'POST'])
 @teacher_required
 def add_book():
-    user = User.query.get(session['user_id'])
-    teacher = user.teacher_profile
+    identity = g.identity
 
     # Fetch the classes the teacher is responsible for
-    teacher_classes = teacher.classes
+    teacher_classes = identity.classes
 
     if request.method == 'POST':
         title = request.form.get('title')
@@ -448,7 +500,7 @@ def add_book():
         class_id = request.form.get('class_id')
 
         # Check if the class belongs to the teacher
-        if not any(class_.id == int(class_id) for class_ in teacher_classes):
+        if not identity.in_class(class_id):
             flash("You cannot add books to a class that you don't manage.", 'danger')
             return redirect(url_for('teacher.teacher_dashboard'))
 
@@ -461,9 +513,54 @@ def add_book():
             class_id=class_id
         )
         db.session.add(new_book)
+        notify_class_change(int(class_id), 'book_added')
         db.session.commit()
 
         flash(f'Book "{title}" has been added successfully!', 'success')
         return redirect(url_for('teacher.teacher_dashboard'))
 
     return render_template('add_book.html', classes=teacher_classes)
+
+@teacher_bp.route('/bulk_add_books', methods=['GET', 'POST'])
+@teacher_required
+def bulk_add_books():
+    identity = g.identity
+    if request.method == 'GET':
+        return render_template('bulk_add_books.html', classes=identity.classes)
+
+    class_id = request.form.get('class_id', type=int)
+    if not identity.in_class(class_id):
+        return jsonify({'error': "You cannot add books to a class that you don't manage."}), 403
+
+    # Read now: uploaded files are closed once the view returns, before the
+    # response is streamed
+    text = request.form.get('isbns', '')
+    file = request.files.get('isbn_file')
+    if file and file.filename:
+        try:
+            text += '\n' + file.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return jsonify({'error': 'The ISBN file must be UTF-8 encoded text.'}), 400
+
+    isbns, invalid = parse_isbns(text)
+    if not isbns:
+        return jsonify({'error': 'No valid ISBNs found.'}), 400
+    limit = current_app.config['INTAKE_MAX_ISBNS']
+    if len(isbns) > limit:
+        return jsonify({'error': f'At most {limit} ISBNs can be added at once.'}), 400
+
+    # One JSON line per ISBN as it is looked up (and, if found, saved)
+    def generate():
+        yield json.dumps({'total': len(isbns) + len(invalid)}) + '\n'
+        for entry in invalid:
+            yield json.dumps({'isbn': entry, 'status': 'invalid'}) + '\n'
+        for result in intake_books(isbns, class_id):
+            if 'book_id' in result:
+                result['edit_url'] = url_for('teacher.edit_book', book_id=result['book_id'])
+            yield json.dumps(result) + '\n'
+        yield json.dumps({'done': True}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',
+    })
@@ -0,0 +1,156 @@
+# assets.py
+
+from collections import namedtuple
+from flask import current_app, request, url_for
+from werkzeug.security import safe_join
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip is offered
+    brotli = None
+
+# Files worth compressing; images and fonts are compressed already
+TEXT_TYPES = {
+    'text/css', 'text/javascript', 'application/javascript', 'application/json',
+    'image/svg+xml', 'text/plain', 'text/html',
+}
+
+# Responses from the views that are compressed on the fly
+DYNAMIC_TYPES = {'text/html', 'application/json'}
+
+Asset = namedtuple('Asset', ['filename', 'digest', 'mtime', 'mimetype', 'bodies'])
+
+
+def _compressed_bodies(data):
+    """The file's bytes under each content coding worth offering, best first."""
+    bodies = {}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(data, quality=11)
+    bodies['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+    # Only keep codings that actually save something
+    return {coding: body for coding, body in bodies.items() if len(body) < len(data)}
+
+
+class AssetManifest:
+    """Content digests (and precompressed copies) of the files in the static folder.
+
+    Each file is read once, the first time its URL is needed. In debug mode
+    a file is read again whenever its modification time changes, so edits
+    show up without a restart.
+    """
+
+    def __init__(self):
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        """The asset for `filename` (relative to the static folder), or None.
+
+        Names that would resolve outside the static folder, such as
+        `../app.py`, are treated as missing.
+        """
+        app = current_app
+        path = safe_join(app.static_folder, filename)
+        if path is None:
+            return None
+        asset = self._assets.get(filename)
+        if asset is not None and not app.debug:
+            return asset
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        if asset is not None and asset.mtime == mtime:
+            return asset
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        bodies = {'identity': data}
+        if mimetype in TEXT_TYPES:
+            bodies.update(_compressed_bodies(data))
+        else:
+            bodies = None  # Served from disk by send_file
+        asset = Asset(filename, hashlib.sha256(data).hexdigest()[:12], mtime, mimetype, bodies)
+        with self._lock:
+            self._assets[filename] = asset
+        return asset
+
+
+manifest = AssetManifest()
+
+
+def fingerprinted(filename, digest):
+    """`js/app.js` -> `js/app.<digest>.js`"""
+    root, ext = os.path.splitext(filename)
+    return f'{root}.{digest}{ext}'
+
+
+def split_fingerprint(path):
+    """`js/app.<digest>.js` -> (`js/app.js`, digest), or (path, None) without a digest."""
+    root, ext = os.path.splitext(path)
+    name, dot, digest = root.rpartition('.')
+    if not dot or len(digest) != 12:
+        return path, None
+    return name + ext, digest
+
+
+def asset_url(filename):
+    """url_for('static', ...) with the file's content digest in the name.
+
+    The URL changes whenever the file does, so the assets route can let
+    browsers cache it for good. Falls back to the plain static URL for
+    files that do not exist.
+    """
+    asset = manifest.get(filename)
+    if asset is None:
+        return url_for('static', filename=filename)
+    return url_for('assets.asset', filename=fingerprinted(filename, asset.digest))
+
+
+def preferred_coding(available):
+    """The best of `available` content codings the client accepts, or 'identity'."""
+    for coding in ('br', 'gzip'):
+        if coding in available and request.accept_encodings[coding]:
+            return coding
+    return 'identity'
+
+
+def compress_response(response):
+    """after_request hook: compress HTML and JSON responses for clients that accept it.
+
+    Streamed responses (event streams, NDJSON progress) and anything
+    already encoded or shorter than COMPRESS_MIN_SIZE are left alone.
+    """
+    config = current_app.config
+    if (response.status_code != 200
+            or response.mimetype not in DYNAMIC_TYPES
+            or response.is_streamed
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    if len(data) < config['COMPRESS_MIN_SIZE']:
+        return response
+    coding = preferred_coding({'br', 'gzip'} if brotli is not None else {'gzip'})
+    if coding == 'br':
+        body = brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY'])
+    elif coding == 'gzip':
+        body = gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'])
+    else:
+        return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = coding
+    # The encoded body is a different representation of the same content
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,146 @@
+# book_intake.py
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Book
+from services.events import notify_class_change
+from services.openlibrary import OpenLibraryError, isbn_cache, normalize_isbn
+from services.tasks import run_in_background
+import re
+
+_SEPARATORS = re.compile(r'[\s,;]+')
+
+
+def valid_isbn(isbn):
+    """Check the length and check digit of a normalized ISBN-10 or ISBN-13."""
+    if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == 'X'):
+        digits = [10 if ch == 'X' else int(ch) for ch in isbn]
+        return sum((10 - i) * digit for i, digit in enumerate(digits)) % 11 == 0
+    if len(isbn) == 13 and isbn.isdigit():
+        return sum(int(ch) * (3 if i % 2 else 1) for i, ch in enumerate(isbn)) % 10 == 0
+    return False
+
+
+def parse_isbns(text):
+    """Split pasted or uploaded text into (normalized ISBNs, rejected entries).
+
+    Entries may be separated by newlines, spaces, commas or semicolons, and
+    may contain hyphens. Repeated ISBNs are kept: each one is another copy.
+    """
+    isbns, invalid = [], []
+    for entry in _SEPARATORS.split(text):
+        if not entry:
+            continue
+        isbn = normalize_isbn(entry)
+        if valid_isbn(isbn):
+            isbns.append(isbn)
+        else:
+            invalid.append(entry)
+    return isbns, invalid
+
+
+def _lookup(app, isbn):
+    # Runs on a pool thread, which needs its own app context and session
+    with app.app_context():
+        try:
+            return isbn_cache.lookup(isbn), None
+        except OpenLibraryError as e:
+            return None, str(e)
+        finally:
+            db.session.remove()
+
+
+def intake_books(isbns, class_id):
+    """Add a book to `class_id` for every ISBN, yielding one result per ISBN as it is done.
+
+    Each distinct ISBN is looked up once, on INTAKE_WORKERS threads; the
+    requests themselves are spaced out per host by the Open Library
+    client's rate limit, and answers come from the ISBN cache when it has
+    them. Results are dicts with the `isbn` and a `status`, in the order
+    lookups finish:
+
+    - "added": found and saved, with the `book_id` and `title`.
+    - "not_found" or "error" (with a `message`): the lookup came back
+      empty or failed, and a placeholder book titled with the ISBN was
+      saved under `book_id` for the teacher to fill in by hand.
+    - "error" without a `book_id`: the book could not be saved.
+
+    Books are inserted INTAKE_BATCH_SIZE at a time, one transaction per
+    batch, so a result is yielded once its batch is committed. If a batch
+    fails, its books are retried one by one so only the failing ones are
+    reported. Covers are mirrored in the background afterwards.
+    """
+    app = current_app._get_current_object()
+    batch_size = app.config['INTAKE_BATCH_SIZE']
+    copies = {}
+    for isbn in isbns:
+        copies[isbn] = copies.get(isbn, 0) + 1
+
+    pending = []  # (result without book_id, row to insert)
+
+    def save(rows):
+        book_ids = db.session.scalars(
+            insert(Book).returning(Book.id, sort_by_parameter_order=True), rows
+        ).all()
+        notify_class_change(class_id, 'book_added')
+        db.session.commit()
+        return book_ids
+
+    def flush():
+        batch = list(pending)
+        pending.clear()
+        try:
+            saved = list(zip(batch, save([row for _, row in batch])))
+        except SQLAlchemyError:
+            db.session.rollback()
+            app.logger.exception('Saving a batch of %d books failed; retrying them one at a time', len(batch))
+            saved = []
+            for result, row in batch:
+                try:
+                    saved.append(((result, row), save([row])[0]))
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    yield {'isbn': result['isbn'], 'status': 'error',
+                           'message': f'Could not save the book: {e.__class__.__name__}'}
+
+        from services.covers import mirror_cover
+        for (result, row), book_id in saved:
+            if row['cover_url']:
+                run_in_background(mirror_cover, book_id)
+            yield dict(result, book_id=book_id)
+
+    def queue(result, details):
+        details = details or {}
+        row = {
+            'title': details.get('title') or result['isbn'],
+            'author': details.get('author') or 'Unknown',
+            'isbn': result['isbn'],
+            'cover_url': details.get('cover_url'),
+            'class_id': class_id,
+        }
+        if result['status'] == 'added':
+            result['title'] = row['title']
+        pending.extend((result, row) for _ in range(copies[result['isbn']]))
+
+    pool = ThreadPoolExecutor(max_workers=app.config['INTAKE_WORKERS'], thread_name_prefix='book-intake')
+    try:
+        futures = {pool.submit(_lookup, app, isbn): isbn for isbn in copies}
+        for future in as_completed(futures):
+            isbn = futures[future]
+            details, error = future.result()
+            if error:
+                queue({'isbn': isbn, 'status': 'error', 'message': error}, None)
+            elif details is None:
+                queue({'isbn': isbn, 'status': 'not_found'}, None)
+            else:
+                queue({'isbn': isbn, 'status': 'added'}, details)
+            if len(pending) >= batch_size:
+                yield from flush()
+        if pending:
+            yield from flush()
+    finally:
+        # Also reached when the client goes away mid-stream: drop the
+        # lookups that have not started rather than waiting for them
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,243 @@
+# borrowing.py
+
+from datetime import datetime
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import exists, func, insert, literal, select, update
+from models import db, Book, BorrowHistory, BorrowState, Student
+from services.events import notify_class_change
+import click
+
+# States that count towards a student's borrow limit
+ACTIVE_STATES = (BorrowState.PENDING, BorrowState.BORROWED)
+
+
+class BorrowError(Exception):
+    """A borrow action was refused; the message is meant for the user."""
+
+
+def _active(student_id, *conditions):
+    return select(BorrowHistory.id).where(
+        BorrowHistory.student_id == student_id,
+        BorrowHistory.state.in_(ACTIVE_STATES),
+        *conditions
+    )
+
+
+def _finish(class_id, kind):
+    notify_class_change(class_id, kind)
+    db.session.commit()
+
+
+def _refuse(message):
+    db.session.rollback()
+    raise BorrowError(message)
+
+
+def _adjust_count(student_id, delta):
+    db.session.execute(
+        update(Student)
+        .where(Student.id == student_id)
+        .values(active_borrows=Student.active_borrows + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def active_count(student_id):
+    """The student's open requests plus borrows, from the maintained counter."""
+    return db.session.scalar(select(Student.active_borrows).where(Student.id == student_id)) or 0
+
+
+# Each action below is a conditional UPDATE or INSERT ... SELECT whose
+# WHERE clause holds every precondition, followed by a check of how many
+# rows it changed. The database evaluates the conditions and makes the
+# change as one step under its write lock, so two requests racing for the
+# same book (or the same student's last free slot) cannot both succeed.
+# Only when a statement changes nothing are the rows read again, to tell
+# the user why. Student.active_borrows moves in the same transaction as
+# the request it counts.
+
+
+def request_borrow(student_id, class_id, book, actor_id):
+    """Record a pending request by the student for `book`, which must be in their class.
+
+    Refused if the book is borrowed, if the student already has an open
+    request or borrow for it, or if they are at BORROW_LIMIT open requests
+    and borrows. Returns the new BorrowHistory ID.
+    """
+    limit = current_app.config['BORROW_LIMIT']
+    if book.class_id != class_id:
+        raise BorrowError("You cannot request books from another class.")
+
+    # Take a slot first: this is the limit check, against the counter
+    reserved = db.session.execute(
+        update(Student)
+        .where(Student.id == student_id, Student.active_borrows < limit)
+        .values(active_borrows=Student.active_borrows + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not reserved:
+        _refuse(f"You cannot have more than {limit} active borrow requests or borrowed books at a time.")
+
+    statement = insert(BorrowHistory).from_select(
+        ['book_id', 'student_id', 'state', 'actor_id', 'status'],
+        select(
+            literal(book.id), literal(student_id), literal(int(BorrowState.PENDING)),
+            literal(actor_id), literal('')
+        ).where(
+            exists().where(Book.id == book.id, Book.borrowed_by_id.is_(None)),
+            ~exists(_active(student_id, BorrowHistory.book_id == book.id))
+        )
+    ).returning(BorrowHistory.id)
+    request_id = db.session.scalar(statement)
+    if request_id is None:
+        if db.session.scalar(select(Book.borrowed_by_id).where(Book.id == book.id)) is not None:
+            _refuse(f'The book "{book.title}" is already borrowed by someone else.')
+        _refuse(f'You have already requested or borrowed "{book.title}".')
+
+    _finish(book.class_id, 'borrow_requested')
+    return request_id
+
+
+def approve_request(borrow_request, actor_id):
+    """Lend the requested book to the student, if it is still free and the request still pending."""
+    book = borrow_request.book
+    now = datetime.utcnow()
+
+    lent = db.session.execute(
+        update(Book)
+        .where(Book.id == book.id, Book.borrowed_by_id.is_(None))
+        .values(borrowed_by_id=borrow_request.student_id, borrowed_date=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not lent:
+        _refuse(f'Book "{book.title}" is already borrowed by someone else.')
+
+    approved = db.session.execute(
+        update(BorrowHistory)
+        .where(BorrowHistory.id == borrow_request.id, BorrowHistory.state == BorrowState.PENDING)
+        .values(state=BorrowState.BORROWED, borrow_date=now, actor_id=actor_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not approved:
+        _refuse("This borrow request is no longer pending.")
+
+    _finish(book.class_id, 'borrow_approved')
+
+
+def _close_request(borrow_request, actor_id, state, kind, *conditions):
+    closed = db.session.execute(
+        update(BorrowHistory)
+        .where(BorrowHistory.id == borrow_request.id, BorrowHistory.state == BorrowState.PENDING, *conditions)
+        .values(state=state, actor_id=actor_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not closed:
+        _refuse("This borrow request is no longer pending.")
+    _adjust_count(borrow_request.student_id, -1)
+    _finish(borrow_request.book.class_id, kind)
+
+
+def reject_request(borrow_request, actor_id):
+    _close_request(borrow_request, actor_id, BorrowState.REJECTED, 'borrow_rejected')
+
+
+def cancel_request(borrow_request, student_id, actor_id):
+    """Withdraw a pending request; only the student who made it can."""
+    _close_request(borrow_request, actor_id, BorrowState.CANCELLED, 'borrow_cancelled',
+                   BorrowHistory.student_id == student_id)
+
+
+def return_book(borrow_record, actor_id):
+    """Close an active borrow and make the book available again."""
+    book = borrow_record.book
+    returned = db.session.execute(
+        update(BorrowHistory)
+        .where(BorrowHistory.id == borrow_record.id, BorrowHistory.state == BorrowState.BORROWED)
+        .values(state=BorrowState.RETURNED, return_date=datetime.utcnow(), actor_id=actor_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not returned:
+        _refuse("This book is not currently borrowed.")
+    _adjust_count(borrow_record.student_id, -1)
+
+    # Only free the book if it is still lent to this student
+    db.session.execute(
+        update(Book)
+        .where(Book.id == book.id, Book.borrowed_by_id == borrow_record.student_id)
+        .values(borrowed_by_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    _finish(book.class_id, 'book_returned')
+
+
+def release_books(book_ids):
+    """Take open requests and borrows for the books in `book_ids` off their students' counters.
+
+    `book_ids` is a SELECT of book IDs. Call it in the transaction that
+    deletes those books, before the delete, since the borrow history goes
+    with them.
+    """
+    open_rows = (
+        select(func.count())
+        .where(BorrowHistory.student_id == Student.id,
+               BorrowHistory.state.in_(ACTIVE_STATES),
+               BorrowHistory.book_id.in_(book_ids))
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(Student)
+        .where(Student.id.in_(
+            select(BorrowHistory.student_id).where(
+                BorrowHistory.state.in_(ACTIVE_STATES),
+                BorrowHistory.book_id.in_(book_ids)
+            )
+        ))
+        .values(active_borrows=Student.active_borrows - open_rows)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _actual_count():
+    # Correlated count of the outer student's open requests and borrows
+    return (
+        select(func.count())
+        .where(BorrowHistory.student_id == Student.id, BorrowHistory.state.in_(ACTIVE_STATES))
+        .scalar_subquery()
+    )
+
+
+def counter_drift():
+    """Students whose counter disagrees with their borrow history, as (id, name, stored, actual)."""
+    actual = _actual_count()
+    return db.session.execute(
+        select(Student.id, Student.name, Student.active_borrows, actual)
+        .where(Student.active_borrows != actual)
+        .order_by(Student.id)
+    ).all()
+
+
+def recount_active_borrows():
+    """Recompute every student's counter from the borrow history in one UPDATE."""
+    db.session.execute(
+        update(Student).values(active_borrows=_actual_count()).execution_options(synchronize_session=False)
+    )
+
+
+@click.command('reconcile-borrow-counts')
+@click.option('--dry-run', is_flag=True, help='Only report drift; leave the counters as they are.')
+@with_appcontext
+def reconcile_borrow_counts_command(dry_run):
+    """Check each student's active-borrow counter against their borrow history."""
+    drift = counter_drift()
+    for student_id, name, stored, actual in drift:
+        click.echo(f'student {student_id} ({name}): counter {stored}, actual {actual}')
+    if not drift:
+        click.echo('All counters match the borrow history.')
+        return
+    if dry_run:
+        click.echo(f'{len(drift)} counters out of step; run without --dry-run to fix them.')
+        return
+    recount_active_borrows()
+    db.session.commit()
+    click.echo(f'Fixed {len(drift)} counters.')
@@ -0,0 +1,99 @@
+# covers.py
+
+from flask import current_app
+from flask.cli import with_appcontext
+from hashlib import sha1
+from models import db, Book
+from services.images import build_cover_variants, remove_cover
+from services.openlibrary import get_with_retries, OpenLibraryError
+from services.events import notify_class_change
+import click
+import os
+import re
+
+# Mirrored covers are named after their book, so a missing file can be
+# traced back to the external URL it was copied from
+MIRROR_PATTERN = re.compile(r'^mirror_(\d+)_')
+IMAGE_EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp'}
+
+
+class CoverDownloadError(Exception):
+    """An external cover could not be downloaded or is not an image."""
+
+
+def mirror_book_id(filename):
+    match = MIRROR_PATTERN.match(os.path.basename(filename))
+    return int(match.group(1)) if match else None
+
+
+def download_cover(url):
+    """Fetch an external cover; returns `(data, extension)`."""
+    try:
+        response = get_with_retries(url, stream=True)
+    except OpenLibraryError as e:
+        raise CoverDownloadError(str(e)) from e
+
+    with response:
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+        extension = IMAGE_EXTENSIONS.get(content_type)
+        if extension is None:
+            raise CoverDownloadError(f'{url} is not an image ({content_type or "no content type"})')
+
+        limit = current_app.config['COVER_MIRROR_MAX_BYTES']
+        data = bytearray()  # Appended in place, not copied for every chunk
+        for chunk in response.iter_content(64 * 1024):
+            data += chunk
+            if len(data) > limit:
+                raise CoverDownloadError(f'{url} is larger than {limit} bytes')
+    return bytes(data), extension
+
+
+def mirror_cover(book_id):
+    """Background job: copy a book's external cover into the upload store.
+
+    The copy gets the same resized variants as uploaded covers. Book.cover_mirror
+    is only set once they are written, so templates keep using the original
+    URL until then (and whenever mirroring fails).
+    """
+    book = db.session.get(Book, book_id)
+    if book is None or not book.cover_url:
+        return
+    url = book.cover_url
+    db.session.commit()  # Don't hold a read transaction open during the download
+
+    try:
+        data, extension = download_cover(url)
+    except CoverDownloadError as e:
+        current_app.logger.warning('Could not mirror cover of book %s: %s', book_id, e)
+        return
+
+    filename = f'mirror_{book_id}_{sha1(data).hexdigest()[:12]}.{extension}'
+    with open(os.path.join(current_app.config['UPLOAD_FOLDER'], filename), 'wb') as f:
+        f.write(data)
+    if not build_cover_variants(filename):
+        remove_cover(filename)
+        return
+
+    book = db.session.get(Book, book_id)
+    if book is None or book.cover_url != url:
+        remove_cover(filename)  # Deleted or given a new cover meanwhile
+        return
+    old_mirror = book.cover_mirror
+    book.cover_mirror = filename
+    notify_class_change(book.class_id, 'book_updated')
+    db.session.commit()
+    if old_mirror and old_mirror != filename:
+        remove_cover(old_mirror)
+
+
+@click.command('mirror-covers')
+@with_appcontext
+def mirror_covers_command():
+    """Download external covers that have not been mirrored yet."""
+    book_ids = [book_id for book_id, in db.session.query(Book.id).filter(
+        Book.cover_url != None,
+        Book.cover_mirror == None
+    )]
+    for count, book_id in enumerate(book_ids, 1):
+        mirror_cover(book_id)
+        click.echo(f'{count}/{len(book_ids)}: book {book_id}')
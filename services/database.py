@@ -0,0 +1,109 @@
+# database.py
+
+from models import db
+import os
+import threading
+
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_LEVELS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+CHECKPOINT_MODES = {'PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'}
+
+_checkpointer_pid = None
+_checkpointer_lock = threading.Lock()
+
+
+def _choice(name, value, allowed):
+    value = value.upper()
+    if value not in allowed:
+        raise ValueError(f'{name} must be one of {", ".join(sorted(allowed))}, not {value!r}')
+    return value
+
+
+def sqlite_pragmas(config):
+    """The PRAGMA statements run on every new SQLite connection, from the SQLITE_* settings."""
+    pragmas = [
+        'PRAGMA foreign_keys=ON',
+        f'PRAGMA busy_timeout={int(config["SQLITE_BUSY_TIMEOUT"])}',
+        f'PRAGMA journal_mode={_choice("SQLITE_JOURNAL_MODE", config["SQLITE_JOURNAL_MODE"], JOURNAL_MODES)}',
+        f'PRAGMA synchronous={_choice("SQLITE_SYNCHRONOUS", config["SQLITE_SYNCHRONOUS"], SYNCHRONOUS_LEVELS)}',
+        f'PRAGMA cache_size={int(config["SQLITE_CACHE_SIZE"])}',
+        f'PRAGMA mmap_size={int(config["SQLITE_MMAP_SIZE"])}',
+    ]
+    if config['SQLITE_JOURNAL_MODE'].upper() == 'WAL':
+        pragmas.append(f'PRAGMA wal_autocheckpoint={int(config["SQLITE_WAL_AUTOCHECKPOINT"])}')
+    return pragmas
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    for pragma in pragmas:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def start_wal_checkpointer(app, stop=None):
+    """Checkpoint the WAL every SQLITE_CHECKPOINT_INTERVAL seconds.
+
+    SQLite's own auto-checkpoint runs on whichever request commits past
+    SQLITE_WAL_AUTOCHECKPOINT pages, and stops short whenever a reader is
+    active, so under steady traffic the -wal file keeps growing. This
+    thread (one per process) checkpoints off the request path instead,
+    until the `stop` event, if one is given, is set. Does nothing unless
+    the database is in WAL mode and the interval is positive.
+
+    Even a complete PASSIVE or FULL checkpoint only lets the next writer
+    start the log over if no other writer got in first, which under a
+    steady stream of writes never happens. So when the log has grown past
+    SQLITE_WAL_AUTOCHECKPOINT pages, a RESTART checkpoint follows: it
+    holds new writers back (for at most busy_timeout) while it copies the
+    few pages left, so the log is reused from the start.
+    """
+    interval = app.config['SQLITE_CHECKPOINT_INTERVAL']
+    if interval <= 0 or app.config['SQLITE_JOURNAL_MODE'].upper() != 'WAL':
+        return None
+    mode = _choice('SQLITE_CHECKPOINT_MODE', app.config['SQLITE_CHECKPOINT_MODE'], CHECKPOINT_MODES)
+    restart_after = app.config['SQLITE_WAL_AUTOCHECKPOINT']
+    stop = stop or threading.Event()
+
+    def checkpoint(connection, mode):
+        busy, log_pages, checkpointed = connection.exec_driver_sql(f'PRAGMA wal_checkpoint({mode})').one()
+        app.logger.debug('WAL checkpoint (%s): %s of %s pages, busy=%s', mode, checkpointed, log_pages, busy)
+        return log_pages
+
+    def run():
+        with app.app_context():
+            if db.engine.dialect.name != 'sqlite':
+                return
+            while not stop.wait(interval):
+                try:
+                    with db.engine.connect() as connection:
+                        log_pages = checkpoint(connection, mode)
+                        if mode in ('PASSIVE', 'FULL') and 0 < restart_after < log_pages:
+                            checkpoint(connection, 'RESTART')
+                except Exception:
+                    app.logger.exception('WAL checkpoint failed')
+
+    thread = threading.Thread(target=run, name='wal-checkpoint', daemon=True)
+    thread.start()
+    return thread
+
+
+def init_wal_checkpointer(app):
+    """Start the WAL checkpointer with the first request each process serves.
+
+    Not at import time: a server that preloads the app (gunicorn --preload)
+    imports it once and then forks its workers, which do not inherit the
+    thread, and commands such as `flask db upgrade` need no checkpointer.
+    """
+    if app.config['SQLITE_CHECKPOINT_INTERVAL'] <= 0 or app.config['SQLITE_JOURNAL_MODE'].upper() != 'WAL':
+        return
+
+    @app.before_request
+    def ensure_wal_checkpointer():
+        global _checkpointer_pid
+        if _checkpointer_pid == os.getpid():
+            return
+        with _checkpointer_lock:
+            if _checkpointer_pid != os.getpid():
+                start_wal_checkpointer(app)
+                _checkpointer_pid = os.getpid()
@@ -0,0 +1,227 @@
+# events.py
+
+from datetime import datetime, timedelta
+from flask import Response, current_app
+from sqlalchemy import event, func, select, delete
+from sqlalchemy.orm import Session
+from models import db, ClassEvent
+from services.versions import bump_class_version
+from services.metrics import registry as metrics
+import json
+import threading
+import time
+
+
+class MemoryBroker:
+    """Wakes stream listeners in this process when a class changes.
+
+    Only changes committed by the same process are seen, so this is for the
+    development server or a single multi-threaded worker. Each class keeps
+    only its newest event: listeners re-fetch the pending lists when woken,
+    so a burst of changes collapses into one refresh.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._condition = threading.Condition()
+        self._latest = {}  # class_id -> (event id, kind)
+        self._sequence = 0
+
+    def record(self, session, class_id, kind):
+        # Begin the session's transaction if nothing else has yet, so that a
+        # rollback (which is a no-op without one) still discards the event
+        session.connection()
+        session.info.setdefault('class_events', []).append((class_id, kind))
+
+    def prepare(self, session, pending):
+        return pending
+
+    def committed(self, events):
+        with self._condition:
+            for class_id, kind in events:
+                self._sequence += 1
+                self._latest[class_id] = (self._sequence, kind)
+            self._condition.notify_all()
+
+    def latest(self, class_id):
+        return self._latest.get(class_id, (0, None))[0]
+
+    def wait(self, class_id, after_id, timeout):
+        """Block until `class_id` has an event newer than `after_id`.
+
+        Returns the newest (id, kind), or None if `timeout` seconds pass first.
+        """
+        with self._condition:
+            if self._condition.wait_for(lambda: self.latest(class_id) > after_id, timeout):
+                return self._latest[class_id]
+        return None
+
+
+class DatabaseBroker(MemoryBroker):
+    """Shares events between worker processes through the class_event table.
+
+    Events are inserted in the transaction that makes the change, so they are
+    visible exactly when the change is. One thread per process tails the
+    table by ID and wakes that process's listeners, which keeps the cost at
+    one indexed query per EVENT_POLL_INTERVAL per worker however many
+    teacher tabs are open. It stands in for a real message broker (Redis
+    pub/sub and the like); a broker with the same record/committed/wait
+    methods can replace it without touching the routes.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def record(self, session, class_id, kind):
+        class_event = ClassEvent(class_id=class_id, kind=kind)
+        session.add(class_event)
+        session.info.setdefault('class_events', []).append(class_event)
+
+    def prepare(self, session, pending):
+        # IDs are needed after the commit, when the objects are expired
+        session.flush()
+        return [(class_event.id, class_event.class_id, class_event.kind) for class_event in pending]
+
+    def committed(self, events):
+        # Wake local listeners now rather than on the next poll
+        self._deliver(events)
+
+    def latest(self, class_id):
+        self._ensure_started()
+        return super().latest(class_id)
+
+    def _deliver(self, rows):
+        with self._condition:
+            for event_id, class_id, kind in rows:
+                if event_id > self._latest.get(class_id, (0, None))[0]:
+                    self._latest[class_id] = (event_id, kind)
+            self._condition.notify_all()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None:
+                last_id = self._load_latest()
+                self._thread = threading.Thread(
+                    target=self._run, args=(last_id,), name='class-events', daemon=True
+                )
+                self._thread.start()
+
+    def _load_latest(self):
+        with self.app.app_context(), db.engine.connect() as connection:
+            rows = connection.execute(
+                select(func.max(ClassEvent.id), ClassEvent.class_id, ClassEvent.kind)
+                .group_by(ClassEvent.class_id)
+            ).all()
+        self._deliver(rows)
+        return max((row[0] for row in rows), default=0)
+
+    def _run(self, last_id):
+        interval = self.app.config['EVENT_POLL_INTERVAL']
+        retention = timedelta(seconds=self.app.config['EVENT_RETENTION'])
+        next_prune = 0
+        with self.app.app_context():
+            while True:
+                time.sleep(interval)
+                try:
+                    with db.engine.connect() as connection:
+                        rows = connection.execute(
+                            select(ClassEvent.id, ClassEvent.class_id, ClassEvent.kind)
+                            .where(ClassEvent.id > last_id)
+                            .order_by(ClassEvent.id)
+                        ).all()
+                    if rows:
+                        self._deliver(rows)
+                        last_id = rows[-1][0]
+                    if time.monotonic() >= next_prune:
+                        with db.engine.begin() as connection:
+                            connection.execute(
+                                delete(ClassEvent).where(ClassEvent.created_at < datetime.utcnow() - retention)
+                            )
+                        next_prune = time.monotonic() + retention.total_seconds() / 10
+                except Exception:
+                    self.app.logger.exception('Reading class events failed')
+
+
+BROKERS = {
+    'memory': MemoryBroker,
+    'database': DatabaseBroker,
+}
+
+
+def init_events(app):
+    app.extensions['class_events'] = BROKERS[app.config['EVENT_BROKER']](app)
+
+
+def get_broker():
+    return current_app.extensions['class_events']
+
+
+def notify_class_change(class_id, kind):
+    """Record a change to `class_id` in the current transaction.
+
+    Bumps the class's change version and tells stream listeners about it.
+    Call this before db.session.commit(); nothing is sent, and the version
+    is not bumped, if the transaction is rolled back instead.
+    """
+    bump_class_version(class_id)
+    get_broker().record(db.session, class_id, kind)
+
+
+@event.listens_for(Session, 'before_commit')
+def _prepare_class_events(session):
+    pending = session.info.get('class_events')
+    if pending:
+        session.info['class_events'] = get_broker().prepare(session, pending)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_class_events(session):
+    committed = session.info.pop('class_events', None)
+    if committed:
+        get_broker().committed(committed)
+        for row in committed:
+            metrics.inc('library_changes_total', kind=row[-1])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_class_events(session):
+    session.info.pop('class_events', None)
+
+
+def event_stream(class_id, last_event_id=None):
+    """A text/event-stream response that sends one event per change to `class_id`.
+
+    Each event carries the ID of the newest change, so a reconnecting
+    browser sends it back as Last-Event-ID and is told straight away about
+    anything it missed. Comment lines keep idle connections open through
+    proxies, and the stream ends after EVENT_STREAM_TIMEOUT seconds so a
+    worker thread is never held indefinitely; EventSource reconnects on
+    its own. The generator only waits on the broker, so it holds no
+    database connection between events.
+    """
+    broker = get_broker()
+    config = current_app.config
+    heartbeat = config['EVENT_HEARTBEAT']
+    deadline = time.monotonic() + config['EVENT_STREAM_TIMEOUT']
+    after_id = broker.latest(class_id) if last_event_id is None else last_event_id
+
+    def generate():
+        nonlocal after_id
+        yield f'retry: {int(config["EVENT_RETRY"] * 1000)}\n\n'
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            latest = broker.wait(class_id, after_id, min(heartbeat, remaining))
+            if latest is None:
+                yield ': keep-alive\n\n'
+                continue
+            after_id, kind = latest
+            yield f'id: {after_id}\nevent: change\ndata: {json.dumps({"kind": kind})}\n\n'
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # stop nginx from buffering the stream
+    })
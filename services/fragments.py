@@ -0,0 +1,187 @@
+# fragments.py
+
+from collections import OrderedDict
+from flask import current_app
+from jinja2 import meta
+from markupsafe import Markup
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+_SLOT = re.compile(r'<!--slot:(\w+):([^>]*?)-->')
+
+
+class MemoryBackend:
+    """LRU of the most recent FRAGMENT_CACHE_SIZE fragments, private to this process."""
+
+    def __init__(self, app):
+        self.size = app.config['FRAGMENT_CACHE_SIZE']
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+class FileSystemBackend:
+    """One JSON file per fragment in FRAGMENT_CACHE_DIR, shared by every worker on the host.
+
+    Files are replaced atomically, so a reader never sees half a fragment.
+    Every FRAGMENT_CACHE_PRUNE_EVERY writes, files not used for
+    FRAGMENT_CACHE_TTL seconds are deleted.
+    """
+
+    def __init__(self, app):
+        self.directory = app.config['FRAGMENT_CACHE_DIR'] or os.path.join(app.instance_path, 'fragments')
+        self.ttl = app.config['FRAGMENT_CACHE_TTL']
+        self.prune_every = app.config['FRAGMENT_CACHE_PRUNE_EVERY']
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key:
+            return None
+        os.utime(path)  # Keep fragments in use from being pruned
+        return entry['value']
+
+    def set(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'value': value}, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            current_app.logger.exception('Could not write fragment %s', key)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass  # Removed by another worker
+
+
+class NullBackend:
+    """Caches nothing; every fragment is rendered afresh."""
+
+    def __init__(self, app):
+        pass
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'filesystem': FileSystemBackend,
+    'none': NullBackend,
+}
+
+
+class FragmentCache:
+    """Rendered page fragments, keyed by the template that renders them and the data they show.
+
+    Keys should include everything the fragment depends on, normally a
+    class and its change version (see services/versions.py), so that
+    fragments never need deleting: a write bumps the version and later
+    requests simply look under a new key. The source of the template, and
+    of every template it imports or includes, is part of the key too, so
+    editing any of them does not serve stale markup from a shared backend.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._digests = {}
+
+    def _template_digest(self, template_name):
+        digest = self._digests.get(template_name)
+        if digest is None:
+            env = current_app.jinja_env
+            sources = {}
+            pending = [template_name]
+            while pending:
+                name = pending.pop()
+                if name in sources:
+                    continue
+                sources[name] = env.loader.get_source(env, name)[0]
+                # Names built at render time come back as None and cannot be followed
+                pending.extend(filter(None, meta.find_referenced_templates(env.parse(sources[name]))))
+            combined = hashlib.sha1()
+            for name in sorted(sources):
+                combined.update(f'{name}\0{sources[name]}\0'.encode())
+            digest = self._digests[template_name] = combined.hexdigest()[:12]
+        return digest
+
+    def fetch(self, template_name, key, build):
+        """The cached value for `key`, or `build()` (a JSON-serializable value), cached."""
+        full_key = ':'.join(str(part) for part in (template_name, self._template_digest(template_name), *key))
+        value = self.backend.get(full_key)
+        if value is None:
+            value = build()
+            self.backend.set(full_key, value)
+        return value
+
+
+def init_fragment_cache(app):
+    name = app.config['FRAGMENT_CACHE']
+    if name not in BACKENDS:
+        raise ValueError(f'FRAGMENT_CACHE must be one of {", ".join(sorted(BACKENDS))}, not {name!r}')
+    app.extensions['fragment_cache'] = FragmentCache(BACKENDS[name](app))
+
+
+def get_fragment_cache():
+    return current_app.extensions['fragment_cache']
+
+
+def slot(name, *args):
+    """A placeholder in a shared fragment, filled in per request by fill_slots()."""
+    return Markup(f'<!--slot:{name}:{":".join(str(arg) for arg in args)}-->')
+
+
+def fill_slots(html, name, fill):
+    """Replace each `name` slot in `html` with `fill(*args)`, which must return safe markup."""
+    def replace(match):
+        if match.group(1) != name:
+            return match.group(0)
+        return str(fill(*match.group(2).split(':')))
+    return Markup(_SLOT.sub(replace, html))
@@ -0,0 +1,124 @@
+# identity.py
+
+from collections import OrderedDict, namedtuple
+from dataclasses import dataclass
+from flask import current_app, g, session
+from sqlalchemy import select
+from models import db, Teacher, Student, Class, teacher_class, student_class
+import threading
+import time
+
+ClassRef = namedtuple('ClassRef', ['id', 'name'])
+
+# Role -> (profile model, association table linking it to classes)
+PROFILES = {
+    'teacher': (Teacher, teacher_class),
+    'student': (Student, student_class),
+}
+
+
+@dataclass(frozen=True)
+class Identity:
+    """Who is logged in: their user, role profile and the classes they belong to.
+
+    Holds plain values rather than ORM objects so that it can outlive the
+    request (and its database session) in the identity cache.
+    """
+    user_id: int
+    username: str
+    role: str
+    profile_id: int = None  # Teacher.id or Student.id; None for admins
+    name: str = None
+    classes: tuple = ()  # ClassRefs, ordered by class ID
+
+    @property
+    def class_ids(self):
+        return frozenset(class_.id for class_ in self.classes)
+
+    @property
+    def class_id(self):
+        """The first class, which is the only one for students."""
+        return self.classes[0].id if self.classes else None
+
+    def first_class(self):
+        return self.classes[0] if self.classes else None
+
+    def in_class(self, class_id):
+        return class_id is not None and int(class_id) in self.class_ids
+
+
+def resolve_identity(user_id, username, role):
+    """Build an Identity from the database with one query (none for admins)."""
+    if role not in PROFILES:
+        return Identity(user_id, username, role)
+
+    profile, link = PROFILES[role]
+    rows = db.session.execute(
+        select(profile.id, profile.name, Class.id, Class.name)
+        .outerjoin(link, link.c[f'{role}_id'] == profile.id)
+        .outerjoin(Class, Class.id == link.c.class_id)
+        .where(profile.user_id == user_id)
+        .order_by(Class.id)
+    ).all()
+    if not rows:
+        return Identity(user_id, username, role)
+    classes = tuple(ClassRef(class_id, class_name) for _, _, class_id, class_name in rows if class_id is not None)
+    return Identity(user_id, username, role, rows[0][0], rows[0][1], classes)
+
+
+class IdentityCache:
+    """Short-lived in-process cache of identities, keyed by user ID.
+
+    Entries live for IDENTITY_CACHE_TTL seconds (0, the default, turns the
+    cache off). The admin routes that change class membership or delete users
+    call invalidate(), which only reaches this worker process, so the cache
+    is only safe to turn on when the app runs as a single process; with more,
+    a teacher removed from a class keeps access to it until the TTL runs out.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()  # user_id -> (identity, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def put(self, identity):
+        ttl = current_app.config['IDENTITY_CACHE_TTL']
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[identity.user_id] = (identity, time.monotonic() + ttl)
+            self._entries.move_to_end(identity.user_id)
+            while len(self._entries) > current_app.config['IDENTITY_CACHE_SIZE']:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids):
+        """Forget the given users, or everyone if no IDs are given."""
+        with self._lock:
+            if not user_ids:
+                self._entries.clear()
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+
+identity_cache = IdentityCache()
+
+
+def load_identity():
+    """The logged-in user's Identity, resolved at most once per request and kept on `g`."""
+    if 'identity' not in g:
+        identity = identity_cache.get(session['user_id'])
+        if identity is None or identity.role != session['role']:
+            identity = resolve_identity(session['user_id'], session['username'], session['role'])
+            identity_cache.put(identity)
+        g.identity = identity
+    return g.identity
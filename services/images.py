@@ -0,0 +1,152 @@
+# images.py
+
+from datetime import datetime
+from flask import current_app, url_for
+from flask.cli import with_appcontext
+from werkzeug.utils import secure_filename
+import click
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it uploads are served as-is
+    Image = None
+
+# Variant name -> maximum width in pixels
+COVER_VARIANTS = {'thumb': 160, 'card': 320, 'detail': 640}
+# Every variant is written as WebP, with a JPEG fallback
+COVER_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+# `sizes` attribute for each place a cover is shown
+COVER_SIZES = {
+    'thumb': '80px',
+    'card': '(min-width: 768px) 210px, 90vw',
+    'detail': '(min-width: 768px) 300px, 90vw',
+}
+# Longest side of the stored original after EXIF is stripped
+MASTER_MAX_SIZE = 1600
+VARIANT_FOLDER = 'variants'
+
+
+def variant_filename(filename, variant, ext):
+    stem = os.path.splitext(filename)[0]
+    return f'{VARIANT_FOLDER}/{stem}-{variant}.{ext}'
+
+
+def save_cover(file):
+    """Store an uploaded cover image and build its resized variants.
+
+    Returns `(filename, has_variants)`; `filename` is relative to
+    UPLOAD_FOLDER, as stored in Book.cover_filename.
+    """
+    filename = f"{datetime.utcnow().timestamp()}_{secure_filename(file.filename)}"
+    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+    return filename, build_cover_variants(filename)
+
+
+def build_cover_variants(filename):
+    """Strip EXIF from an uploaded cover and write its thumbnail/card/detail variants.
+
+    The original is re-encoded without metadata (after applying the camera
+    rotation) and capped at MASTER_MAX_SIZE. Returns False, leaving the file
+    untouched, when Pillow is missing or the image cannot be decoded.
+    """
+    if Image is None:
+        return False
+
+    folder = current_app.config['UPLOAD_FOLDER']
+    path = os.path.join(folder, filename)
+    os.makedirs(os.path.join(folder, VARIANT_FOLDER), exist_ok=True)
+    try:
+        with Image.open(path) as original:
+            image_format = original.format
+            image = ImageOps.exif_transpose(original)
+            image.thumbnail((MASTER_MAX_SIZE, MASTER_MAX_SIZE))
+            image.save(path, format=image_format, quality=90)
+
+            image = _flatten(image)
+            for variant, width in COVER_VARIANTS.items():
+                resized = image.copy()
+                resized.thumbnail((width, width * 4))
+                for ext, variant_format in COVER_FORMATS.items():
+                    resized.save(
+                        os.path.join(folder, variant_filename(filename, variant, ext)),
+                        format=variant_format, quality=80, optimize=True
+                    )
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        current_app.logger.warning('Could not process cover %s: %s', filename, e)
+        return False
+    return True
+
+
+def _flatten(image):
+    # JPEG has no alpha channel, so paste transparent images onto white
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def remove_cover(filename):
+    """Delete an uploaded cover and all of its variants."""
+    folder = current_app.config['UPLOAD_FOLDER']
+    paths = [os.path.join(folder, filename)]
+    for variant in COVER_VARIANTS:
+        for ext in COVER_FORMATS:
+            paths.append(os.path.join(folder, variant_filename(filename, variant, ext)))
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def delete_cover_files(book):
+    """Delete a book's uploaded and mirrored covers, with all their variants.
+
+    `book` is a Book or any row with its cover_filename and cover_mirror.
+    Call it after the book's deletion is committed, so the files are only
+    lost once the book is.
+    """
+    for filename in (book.cover_filename, book.cover_mirror):
+        if filename:
+            remove_cover(filename)
+
+
+def cover_sources(filename, variant):
+    """`src`, per-format `srcset` and `sizes` for showing a cover as `variant`."""
+    def variant_url(name, ext):
+        return url_for('media.cover', filename=variant_filename(filename, name, ext))
+
+    sources = {
+        ext: ', '.join(f'{variant_url(name, ext)} {width}w' for name, width in COVER_VARIANTS.items())
+        for ext in COVER_FORMATS
+    }
+    sources['src'] = variant_url(variant, 'jpg')
+    sources['sizes'] = COVER_SIZES[variant]
+    return sources
+
+
+@click.command('process-covers')
+@click.option('--force', is_flag=True, help='Rebuild variants for covers that already have them.')
+@with_appcontext
+def process_covers_command(force):
+    """Build resized variants for cover images uploaded before the pipeline existed."""
+    from models import db, Book
+
+    if Image is None:
+        raise click.ClickException('Pillow is not installed.')
+
+    query = Book.query.filter(Book.cover_filename != None)
+    if not force:
+        query = query.filter(Book.cover_variants == False)
+
+    processed = failed = 0
+    for book in query.all():
+        if build_cover_variants(book.cover_filename):
+            book.cover_variants = True
+            processed += 1
+        else:
+            failed += 1
+        db.session.commit()
+        click.echo(f'{processed + failed}: {book.cover_filename}')
+    click.echo(f'Processed {processed} covers, {failed} failed.')
@@ -0,0 +1,318 @@
+# metrics.py
+
+from flask import current_app, g, request
+from time import perf_counter
+import atexit
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help, histogram buckets). Counters and histograms are summed
+# over every process that has ever written them; gauges only over the
+# processes still running.
+METRICS = {
+    'library_http_requests_total': ('counter', 'Requests handled, by endpoint and status.', None),
+    'library_http_request_duration_seconds': ('histogram', 'Time to produce a response, by endpoint.', LATENCY_BUCKETS),
+    'library_http_requests_in_flight': ('gauge', 'Requests being handled right now.', None),
+    'library_db_pool_connections_in_use': ('gauge', 'Database connections checked out of the pool.', None),
+    'library_db_pool_size': ('gauge', 'Connections the pool keeps open, not counting overflow.', None),
+    'library_db_pool_overflow': ('gauge', 'Connections open beyond the pool size.', None),
+    'library_changes_total': ('counter', 'Committed changes to class data: borrow requests, approvals, '
+                                         'rejections, returns, donations and book edits, by kind.', None),
+    'library_openlibrary_request_duration_seconds': ('histogram', 'Time per Open Library request attempt.',
+                                                     LATENCY_BUCKETS),
+    'library_openlibrary_failures_total': ('counter', 'Open Library request attempts that failed, by reason.', None),
+    'library_isbn_cache_total': ('counter', 'ISBN lookups by result: memory_hit, db_hit, or for a miss found, '
+                                            'not_found or error.', None),
+    'library_upload_bytes_total': ('counter', 'Bytes received in file uploads, by endpoint.', None),
+}
+
+
+def _is_gauge(name):
+    # Histogram samples are named after their metric plus _bucket, _sum or _count
+    kind = METRICS.get(name) or METRICS.get(name.rsplit('_', 1)[0]) or ('counter',)
+    return kind[0] == 'gauge'
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _process_started(pid):
+    """When process `pid` started, in clock ticks after boot; None if it is not running or there is no /proc."""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Field 22; the command name before it may itself contain spaces and ")"
+    return int(stat.rsplit(b')', 1)[1].split()[19])
+
+
+def _process_alive(pid, started):
+    """Whether the process that wrote a snapshot is still running.
+
+    The start time tells a reused PID apart from the original process.
+    Without /proc, only whether some process has the PID can be checked.
+    """
+    if started is not None:
+        return _process_started(pid) == started
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    """This process's metric values, shared with the other workers through files in METRICS_DIR.
+
+    Every process writes a snapshot of its values to a file of its own
+    every METRICS_FLUSH_INTERVAL seconds, from a background thread; the
+    request path only updates a dict. /metrics adds up the snapshots of
+    all processes (its own values live), so the numbers cover every
+    worker, at most one interval behind. When a worker has exited (its PID
+    is gone, or now belongs to a process that started later), its
+    counters are folded into an archive file and its snapshot deleted,
+    so totals never go backwards while the directory stays small.
+
+    A forked child starts with empty values and a file of its own.
+    Values recorded before init_metrics() (or with metrics off) stay in
+    memory and are never published.
+    """
+
+    def __init__(self):
+        self.directory = None
+        self.interval = None
+        # Functions called with the registry before each snapshot, to set
+        # gauges that are read rather than counted
+        self.collectors = []
+        self._reset()
+
+    def _reset(self):
+        self._values = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._started = _process_started(self._pid)
+        self._filename = f'{self._pid}-{time.time_ns()}.json'
+        self._thread = None
+
+    def configure(self, directory, interval):
+        self.directory = directory
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+
+    # Recording
+
+    def inc(self, name, amount=1, **labels):
+        self._ensure_started()
+        key = _key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, name, value, **labels):
+        self._ensure_started()
+        buckets = METRICS[name][2]
+        with self._lock:
+            for bound in buckets:
+                if value <= bound:
+                    key = _key(name + '_bucket', dict(labels, le=repr(bound)))
+                    self._values[key] = self._values.get(key, 0) + 1
+            for suffix, amount in (('_bucket', 1), ('_count', 1), ('_sum', value)):
+                key = _key(name + suffix, dict(labels, le='+Inf') if suffix == '_bucket' else labels)
+                self._values[key] = self._values.get(key, 0) + amount
+
+    # Sharing between processes
+
+    def _ensure_started(self):
+        if self._thread is not None or self.directory is None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                pass  # A full disk must not take requests down; the next flush retries
+
+    def snapshot(self):
+        for collect in self.collectors:
+            collect(self)
+        with self._lock:
+            return dict(self._values)
+
+    def flush(self):
+        if self.directory is None:
+            return
+        samples = [[name, labels, value] for (name, labels), value in self.snapshot().items()]
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'pid': self._pid, 'started': self._started, 'samples': samples}, f)
+        os.replace(tmp_path, os.path.join(self.directory, self._filename))
+
+    def collect(self):
+        """Every metric summed over all processes, as {(name, labels): value}."""
+        totals = {}
+
+        def add(samples):
+            for name, labels, value in samples:
+                key = (name, tuple(tuple(label) for label in labels))
+                totals[key] = totals.get(key, 0) + value
+
+        add([name, labels, value] for (name, labels), value in self.snapshot().items())
+        if self.directory is None:
+            return totals
+
+        with open(os.path.join(self.directory, 'lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(self.directory, 'archive.json')
+            try:
+                with open(archive_path, encoding='utf-8') as f:
+                    archive = json.load(f)
+            except (OSError, ValueError):
+                archive = {}
+            archived = False
+
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith('.json') or entry.name in ('archive.json', self._filename):
+                    continue
+                try:
+                    with open(entry.path, encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if _process_alive(data['pid'], data.get('started')):
+                    add(data['samples'])
+                    continue
+                # Keep a dead worker's counters; its gauges no longer apply
+                for name, labels, value in data['samples']:
+                    if not _is_gauge(name):
+                        key = json.dumps([name, labels])
+                        archive[key] = archive.get(key, 0) + value
+                os.remove(entry.path)
+                archived = True
+
+            if archived:
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(archive, f)
+                os.replace(tmp_path, archive_path)
+        add(json.loads(key) + [value] for key, value in archive.items())
+        return totals
+
+
+registry = Registry()
+os.register_at_fork(after_in_child=registry._reset)
+atexit.register(registry.flush)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition(totals):
+    """`totals` from Registry.collect() in the Prometheus text format."""
+    by_name = {}
+    for (name, labels), value in totals.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for metric, (kind, help_text, _) in METRICS.items():
+        names = [metric + suffix for suffix in ('_bucket', '_sum', '_count')] if kind == 'histogram' else [metric]
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for name in names:
+            samples = by_name.get(name, [])
+            if name == metric + '_bucket':
+                # Numeric order of le within each label set
+                samples.sort(key=lambda sample: [
+                    (key, float(value) if key == 'le' else value) for key, value in sample[0]
+                ])
+            else:
+                samples.sort()
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+                lines.append(f'{name}{{{label_text}}} {_format_value(value)}' if labels
+                             else f'{name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# Request hooks
+
+def _start_request():
+    g.metrics_started = perf_counter()
+    g.metrics_in_flight = True
+    registry.inc('library_http_requests_in_flight')
+
+
+def _finish_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    blueprint = request.blueprint or ''
+    registry.observe('library_http_request_duration_seconds', perf_counter() - started,
+                     blueprint=blueprint, endpoint=endpoint)
+    registry.inc('library_http_requests_total', blueprint=blueprint, endpoint=endpoint,
+                 method=request.method, status=str(response.status_code))
+    if request.mimetype == 'multipart/form-data' and request.content_length:
+        registry.inc('library_upload_bytes_total', request.content_length, endpoint=endpoint)
+    return response
+
+
+def _end_request(exc):
+    # Streamed responses count as in flight until the stream ends
+    if g.pop('metrics_in_flight', False):
+        registry.inc('library_http_requests_in_flight', -1)
+
+
+def init_metrics(app):
+    """Record request metrics and share them through METRICS_DIR, unless METRICS is off."""
+    if not app.config['METRICS']:
+        return
+    registry.configure(app.config['METRICS_DIR'] or os.path.join(app.instance_path, 'metrics'),
+                       app.config['METRICS_FLUSH_INTERVAL'])
+
+    from models import db
+
+    with app.app_context():
+        pool = db.engine.pool
+
+    def pool_usage(registry):
+        # Only QueuePool keeps these numbers
+        if hasattr(pool, 'checkedout'):
+            registry.set('library_db_pool_connections_in_use', pool.checkedout())
+            registry.set('library_db_pool_size', pool.size())
+            registry.set('library_db_pool_overflow', max(pool.overflow(), 0))
+
+    registry.collectors.append(pool_usage)
+    app.extensions['metrics'] = registry
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+
+
+def metrics_enabled():
+    return 'metrics' in current_app.extensions
@@ -0,0 +1,264 @@
+# openlibrary.py
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.dialects.sqlite import insert
+from models import db, Book, IsbnMetadata
+from services.events import notify_class_change
+from services.metrics import registry as metrics
+from urllib.parse import urlsplit
+import requests
+import threading
+import time
+
+_MISSING = object()
+
+
+class OpenLibraryError(Exception):
+    """Open Library could not be reached or kept returning errors."""
+
+
+class OpenLibraryNotFound(OpenLibraryError):
+    """Open Library answered 404 Not Found."""
+
+
+def normalize_isbn(isbn):
+    return ''.join(ch for ch in isbn if ch.isdigit() or ch in 'xX').upper()
+
+
+class HostRateLimiter:
+    """Spaces out requests to each host, shared by all threads in the process.
+
+    Each caller is given the next free slot for the URL's host, at most
+    `rate` per second, and sleeps until then, so a burst of concurrent
+    lookups reaches Open Library as a steady trickle instead.
+    """
+
+    def __init__(self):
+        self._next_slot = {}  # host -> monotonic time of the next free slot
+        self._lock = threading.Lock()
+
+    def wait(self, url, rate):
+        if rate <= 0:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + 1 / rate
+        if slot > now:
+            time.sleep(slot - now)
+
+
+rate_limiter = HostRateLimiter()
+
+
+def get_with_retries(url, **kwargs):
+    """GET `url`, retrying timeouts, connection errors, 429s and 5xx responses.
+
+    Waits OPENLIBRARY_BACKOFF seconds before the first retry and doubles the
+    wait each time. Every attempt first waits its turn under the per-host
+    OPENLIBRARY_RATE_LIMIT. Returns the first 200 response; raises
+    OpenLibraryNotFound for a 404, and OpenLibraryError for any other
+    status or once the retries are used up.
+    """
+    config = current_app.config
+    delay = config['OPENLIBRARY_BACKOFF']
+    error = None
+
+    for attempt in range(config['OPENLIBRARY_RETRIES'] + 1):
+        if attempt:
+            time.sleep(delay)
+            delay *= 2
+        rate_limiter.wait(url, config['OPENLIBRARY_RATE_LIMIT'])
+        started = time.perf_counter()
+        try:
+            response = requests.get(url, timeout=config['OPENLIBRARY_TIMEOUT'], **kwargs)
+        except requests.RequestException as e:
+            metrics.observe('library_openlibrary_request_duration_seconds', time.perf_counter() - started)
+            metrics.inc('library_openlibrary_failures_total', reason=type(e).__name__)
+            error = e
+            continue
+        metrics.observe('library_openlibrary_request_duration_seconds', time.perf_counter() - started)
+        if response.status_code == 429 or response.status_code >= 500:
+            metrics.inc('library_openlibrary_failures_total', reason=f'http_{response.status_code}')
+            error = f'HTTP {response.status_code}'
+            continue
+        if response.status_code != 200:
+            metrics.inc('library_openlibrary_failures_total', reason=f'http_{response.status_code}')
+            error_class = OpenLibraryNotFound if response.status_code == 404 else OpenLibraryError
+            raise error_class(f'{url} returned HTTP {response.status_code}')
+        return response
+
+    raise OpenLibraryError(f'Request to {url} failed: {error}')
+
+
+def fetch_book_details(isbn):
+    """Look up a normalized ISBN on Open Library.
+
+    Returns a dict with `title`, `author` and `cover_url` (each possibly
+    None), or None when Open Library has no record for the ISBN (an empty
+    answer or a 404). Raises OpenLibraryError when Open Library cannot be
+    reached.
+    """
+    url = f"{current_app.config['OPENLIBRARY_URL']}/api/books"
+    params = {'bibkeys': f'ISBN:{isbn}', 'jscmd': 'details', 'format': 'json'}
+    try:
+        response = get_with_retries(url, params=params)
+    except OpenLibraryNotFound:
+        return None
+    try:
+        return parse_book_details(response.json(), isbn)
+    except ValueError as e:
+        raise OpenLibraryError(f'Invalid response from Open Library for ISBN {isbn}') from e
+
+
+def parse_book_details(data, isbn):
+    book_data = data.get(f'ISBN:{isbn}')
+    if not book_data:
+        return None
+
+    details = book_data.get('details', {})
+    author_names = [entry.get('name', '') for entry in details.get('authors', [])]
+    author_names = [name for name in author_names if name]
+
+    covers = details.get('covers', [])
+    if covers:
+        cover_url = f"{current_app.config['OPENLIBRARY_COVERS_URL']}/b/id/{covers[0]}-M.jpg"
+    else:
+        # Fall back to the thumbnail when the details have no cover
+        cover_url = book_data.get('thumbnail_url')
+
+    return {
+        'title': details.get('title'),
+        'author': ', '.join(author_names) if author_names else None,
+        'cover_url': cover_url,
+    }
+
+
+class IsbnCache:
+    """Read-through cache of Open Library lookups.
+
+    A small in-process LRU sits in front of the isbn_metadata table, which
+    is shared by every worker and survives restarts. Both layers cache
+    "not found" answers too, for ISBN_CACHE_NEGATIVE_TTL. Lookup errors are
+    never cached.
+    """
+
+    RESULTS = ('memory_hit', 'db_hit', 'found', 'not_found', 'error')
+
+    def __init__(self):
+        self._entries = OrderedDict()  # isbn -> (details or None, expires_at)
+        self._lock = threading.Lock()
+
+    def stats(self):
+        """Lookups by result summed over every worker, and this worker's LRU size."""
+        stats = dict.fromkeys(self.RESULTS, 0)
+        for (name, labels), value in metrics.collect().items():
+            if name == 'library_isbn_cache_total':
+                stats[dict(labels)['result']] += value
+        lookups = sum(stats.values())
+        stats['hit_ratio'] = (stats['memory_hit'] + stats['db_hit']) / lookups if lookups else 0.0
+        with self._lock:
+            stats['memory_entries'] = len(self._entries)
+        return stats
+
+    def _remember(self, isbn, details, expires_at):
+        with self._lock:
+            self._entries[isbn] = (details, expires_at)
+            self._entries.move_to_end(isbn)
+            while len(self._entries) > current_app.config['ISBN_CACHE_SIZE']:
+                self._entries.popitem(last=False)
+
+    def _recall(self, isbn, now):
+        with self._lock:
+            entry = self._entries.get(isbn)
+            if entry is None:
+                return _MISSING
+            if entry[1] <= now:
+                del self._entries[isbn]
+                return _MISSING
+            self._entries.move_to_end(isbn)
+            return entry[0]
+
+    def lookup(self, isbn):
+        """Same contract as fetch_book_details(), but served from the cache when possible."""
+        isbn = normalize_isbn(isbn)
+        now = datetime.utcnow()
+
+        details = self._recall(isbn, now)
+        if details is not _MISSING:
+            metrics.inc('library_isbn_cache_total', result='memory_hit')
+            return details
+
+        row = db.session.get(IsbnMetadata, isbn)
+        if row is not None and row.expires_at > now:
+            metrics.inc('library_isbn_cache_total', result='db_hit')
+            details = {'title': row.title, 'author': row.author, 'cover_url': row.cover_url} if row.found else None
+            self._remember(isbn, details, row.expires_at)
+            return details
+
+        try:
+            details = fetch_book_details(isbn)
+        except OpenLibraryError:
+            metrics.inc('library_isbn_cache_total', result='error')
+            raise
+        metrics.inc('library_isbn_cache_total', result='found' if details else 'not_found')
+
+        config = current_app.config
+        ttl = config['ISBN_CACHE_TTL'] if details else config['ISBN_CACHE_NEGATIVE_TTL']
+        expires_at = now + timedelta(seconds=ttl)
+        self._store(isbn, details, now, expires_at)
+        self._remember(isbn, details, expires_at)
+        return details
+
+    def _store(self, isbn, details, fetched_at, expires_at):
+        # Written on its own connection so the caller's session is not committed
+        values = {
+            'isbn': isbn,
+            'found': details is not None,
+            'title': details['title'] if details else None,
+            'author': details['author'] if details else None,
+            'cover_url': details['cover_url'] if details else None,
+            'fetched_at': fetched_at,
+            'expires_at': expires_at,
+        }
+        statement = insert(IsbnMetadata).values(**values)
+        statement = statement.on_conflict_do_update(index_elements=['isbn'], set_=values)
+        with db.engine.begin() as connection:
+            connection.execute(statement)
+
+
+isbn_cache = IsbnCache()
+
+
+def lookup_isbn(isbn):
+    return isbn_cache.lookup(isbn)
+
+
+def enrich_book(book_id, isbn):
+    """Background job: fill in a book's title, author and cover from Open Library."""
+    isbn = normalize_isbn(isbn)
+    try:
+        details = lookup_isbn(isbn)
+    except OpenLibraryError as e:
+        current_app.logger.warning('Could not enrich book %s: %s', book_id, e)
+        return
+
+    if details is None:
+        current_app.logger.info('ISBN %s not found in Open Library', isbn)
+        return
+
+    book = db.session.get(Book, book_id)
+    if book is None:
+        return  # Deleted while the lookup was running
+    book.title = details['title'] or book.title
+    book.author = details['author'] or book.author
+    book.cover_url = details['cover_url'] or book.cover_url
+    notify_class_change(book.class_id, 'book_updated')
+    db.session.commit()
+
+    if book.cover_url:
+        from services.covers import mirror_cover
+        mirror_cover(book_id)
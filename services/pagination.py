@@ -0,0 +1,72 @@
+# pagination.py
+
+from flask import request, url_for
+
+
+class KeysetPage:
+    """One page of rows plus the cursors for the neighbouring pages.
+
+    A cursor is the key value of the first or last row on this page; it is
+    None when there is nothing further in that direction.
+    """
+
+    def __init__(self, items, name, prev_cursor=None, next_cursor=None):
+        self.items = items
+        self.name = name
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_other_pages(self):
+        return self.prev_cursor is not None or self.next_cursor is not None
+
+
+def keyset_paginate(query, key, name, per_page, descending=False):
+    """Return the page of `query` selected by the `<name>_after` / `<name>_before` query args.
+
+    Rows are ordered by `key`, which must be unique (normally the primary
+    key), and each page continues from the key of the previous page's last
+    row with `WHERE key > ?` rather than an OFFSET, so every page costs the
+    same index range scan however deep into the list it is.
+    """
+    after = request.args.get(f'{name}_after', type=int)
+    before = request.args.get(f'{name}_before', type=int)
+    forward = key.desc() if descending else key.asc()
+    backward = key.asc() if descending else key.desc()
+
+    if before is not None:
+        condition = key > before if descending else key < before
+        items = query.filter(condition).order_by(backward).limit(per_page + 1).all()
+        has_prev = len(items) > per_page
+        items = list(reversed(items[:per_page]))
+        has_next = True
+    else:
+        if after is not None:
+            query = query.filter(key < after if descending else key > after)
+        items = query.order_by(forward).limit(per_page + 1).all()
+        has_next = len(items) > per_page
+        items = items[:per_page]
+        has_prev = after is not None
+
+    key_of = lambda item: getattr(item, key.key)
+    return KeysetPage(
+        items,
+        name,
+        prev_cursor=key_of(items[0]) if items and has_prev else None,
+        next_cursor=key_of(items[-1]) if items and has_next else None
+    )
+
+
+def page_url(page, anchor=None, **cursor):
+    """URL of the current view with `page`'s cursor replaced and other query args kept."""
+    args = request.args.to_dict()
+    args.pop(f'{page.name}_after', None)
+    args.pop(f'{page.name}_before', None)
+    args.update({f'{page.name}_{direction}': value for direction, value in cursor.items()})
+    return url_for(request.endpoint, _anchor=anchor, **request.view_args, **args)
@@ -0,0 +1,171 @@
+# perf.py
+
+from collections import Counter, deque, namedtuple
+from datetime import datetime
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from time import perf_counter
+from models import db
+import sqlite3
+import threading
+
+SlowQuery = namedtuple('SlowQuery', ['at', 'endpoint', 'duration_ms', 'statement', 'plan'])
+RepeatedQuery = namedtuple('RepeatedQuery', ['at', 'endpoint', 'count', 'statement'])
+
+# Statements EXPLAIN QUERY PLAN can describe
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class RequestStats:
+    """SQL issued while handling the current request."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+
+
+class RouteStats:
+    """The most recent requests to one endpoint, as (total ms, queries, DB ms)."""
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+        self.requests = 0
+
+    def add(self, total_ms, queries, db_ms):
+        self.samples.append((total_ms, queries, db_ms))
+        self.requests += 1
+
+    def summary(self):
+        samples = list(self.samples)
+        totals = [sample[0] for sample in samples]
+        return {
+            'requests': self.requests,
+            'p50_ms': _percentile(totals, 0.5),
+            'p95_ms': _percentile(totals, 0.95),
+            'max_ms': max(totals),
+            'queries': sum(sample[1] for sample in samples) / len(samples),
+            'max_queries': max(sample[1] for sample in samples),
+            'db_ms': sum(sample[2] for sample in samples) / len(samples),
+        }
+
+
+class PerfMonitor:
+    """Query counts and database time per request, kept in bounded buffers for /admin/perf.
+
+    Every statement run while a request is being handled is counted and
+    timed. When the response is ready the totals go into the endpoint's
+    ring buffer and into a Server-Timing header. Statements slower than
+    SQL_SLOW_QUERY_MS are logged together with SQLite's query plan.
+    Statements repeated SQL_REPEAT_THRESHOLD times or more in one request,
+    usually lazy loads in a loop, are logged as possible N+1 queries.
+
+    Everything is per process. Statements run while a streamed response
+    is being sent come after the totals are taken, so they are not counted.
+    """
+
+    def __init__(self, app):
+        self.slow_ms = app.config['SQL_SLOW_QUERY_MS']
+        self.repeat_threshold = app.config['SQL_REPEAT_THRESHOLD']
+        self.route_samples = app.config['PERF_ROUTE_SAMPLES']
+        self.routes = {}
+        self.slow_queries = deque(maxlen=app.config['PERF_LOG_SIZE'])
+        self.repeated_queries = deque(maxlen=app.config['PERF_LOG_SIZE'])
+        self._lock = threading.Lock()
+
+    def _route(self, endpoint):
+        route = self.routes.get(endpoint)
+        if route is None:
+            with self._lock:
+                route = self.routes.setdefault(endpoint, RouteStats(self.route_samples))
+        return route
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - conn.info['query_started'].pop()
+        if not has_request_context():
+            return  # Background threads and CLI commands
+        stats = g.get('request_sql')
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.db_time += elapsed
+        stats.statements[statement] += 1
+
+        duration_ms = elapsed * 1000
+        if duration_ms >= self.slow_ms:
+            plan = None if executemany else self.explain(cursor, statement, parameters)
+            self.slow_queries.append(SlowQuery(datetime.utcnow(), request.endpoint, duration_ms, statement, plan))
+            current_app.logger.warning('Slow query (%.0f ms) in %s: %s\n%s', duration_ms, request.endpoint,
+                                       statement, plan or '(no query plan)')
+
+    def explain(self, cursor, statement, parameters):
+        """SQLite's plan for `statement`, one step per line, or None."""
+        connection = getattr(cursor, 'connection', None)
+        if not isinstance(connection, sqlite3.Connection) or not statement.lstrip().upper().startswith(_EXPLAINABLE):
+            return None
+        try:
+            # A cursor of its own, so the results of the statement being
+            # timed are left alone
+            rows = connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        except sqlite3.Error:
+            return None
+        depth = {0: -1}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node] + detail)
+        return '\n'.join(lines)
+
+    def start_request(self):
+        g.request_sql = RequestStats()
+
+    def finish_request(self, response):
+        stats = g.pop('request_sql', None)
+        if stats is None:
+            return response
+        total_ms = (perf_counter() - stats.started) * 1000
+        db_ms = stats.db_time * 1000
+        endpoint = request.endpoint or '(unmatched)'
+        self._route(endpoint).add(total_ms, stats.queries, db_ms)
+
+        for statement, count in stats.statements.items():
+            if count >= self.repeat_threshold:
+                self.repeated_queries.append(RepeatedQuery(datetime.utcnow(), endpoint, count, statement))
+                current_app.logger.warning('Possible N+1 in %s: %d x %s', endpoint, count, statement)
+
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{stats.queries} queries"')
+        response.headers.add('Server-Timing', f'total;dur={total_ms:.1f}')
+        return response
+
+    def worst_routes(self):
+        """Summaries of each endpoint seen, slowest (by p95) first."""
+        with self._lock:
+            routes = list(self.routes.items())
+        summaries = [dict(route.summary(), endpoint=endpoint) for endpoint, route in routes if route.samples]
+        return sorted(summaries, key=lambda summary: summary['p95_ms'], reverse=True)
+
+
+def init_perf_monitor(app):
+    """Instrument the app's engine and requests, unless SQL_INSTRUMENTATION is off."""
+    if not app.config['SQL_INSTRUMENTATION']:
+        return
+    monitor = app.extensions['perf_monitor'] = PerfMonitor(app)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', monitor.before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', monitor.after_cursor_execute)
+    app.before_request(monitor.start_request)
+    app.after_request(monitor.finish_request)
+
+
+def get_perf_monitor():
+    return current_app.extensions.get('perf_monitor')
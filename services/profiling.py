@@ -0,0 +1,192 @@
+# profiling.py
+
+from datetime import datetime
+from flask import current_app, g, request, session, url_for
+from time import perf_counter
+import cProfile
+import hmac
+import json
+import os
+import re
+import sys
+
+FORMATS = {'pstats': '.prof', 'speedscope': '.speedscope.json'}
+
+
+class SpeedscopeTracer:
+    """Records every Python and C function call on this thread as speedscope "evented" data.
+
+    cProfile only keeps totals per function; this keeps the call tree in
+    order, which is what the flame graph in speedscope.app shows. It is
+    slower than cProfile, so times are inflated but their proportions hold.
+    """
+
+    def __init__(self):
+        self.frames = []
+        self._frame_ids = {}
+        self.events = []
+        self._stack = []
+        self._start = None
+
+    def _frame(self, key, name, file, line):
+        frame_id = self._frame_ids.get(key)
+        if frame_id is None:
+            frame_id = self._frame_ids[key] = len(self.frames)
+            self.frames.append({'name': name, 'file': file, 'line': line})
+        return frame_id
+
+    def _now(self):
+        return (perf_counter() - self._start) * 1000
+
+    def _trace(self, frame, event, arg):
+        if event == 'call':
+            code = frame.f_code
+            frame_id = self._frame((code.co_filename, code.co_firstlineno, code.co_name),
+                                   getattr(code, 'co_qualname', code.co_name), code.co_filename, code.co_firstlineno)
+        elif event == 'c_call':
+            name = getattr(arg, '__qualname__', None) or getattr(arg, '__name__', repr(arg))
+            module = getattr(arg, '__module__', None) or 'builtins'
+            frame_id = self._frame(('c', module, name), f'{module}.{name}', module, 0)
+        else:
+            # Returns from frames entered before tracing started have no
+            # matching open event
+            if self._stack:
+                self.events.append({'type': 'C', 'frame': self._stack.pop(), 'at': self._now()})
+            return
+        self._stack.append(frame_id)
+        self.events.append({'type': 'O', 'frame': frame_id, 'at': self._now()})
+
+    def enable(self):
+        self._start = perf_counter()
+        sys.setprofile(self._trace)
+
+    def disable(self):
+        sys.setprofile(None)
+        end = self._now()
+        while self._stack:
+            self.events.append({'type': 'C', 'frame': self._stack.pop(), 'at': end})
+
+    def dump(self, path, name):
+        end = self.events[-1]['at'] if self.events else 0
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                '$schema': 'https://www.speedscope.app/file-format-schema.json',
+                'shared': {'frames': self.frames},
+                'profiles': [{
+                    'type': 'evented',
+                    'name': name,
+                    'unit': 'milliseconds',
+                    'startValue': 0,
+                    'endValue': end,
+                    'events': self.events,
+                }],
+                'name': name,
+                'exporter': 'library_management',
+            }, f)
+
+
+class ProfilerHooks:
+    """Runs single requests under a profiler when asked to, and keeps the last PROFILE_KEEP results.
+
+    A request is profiled when it carries an X-Profile header or a
+    `profile` query argument and either comes from a logged-in admin or
+    the value matches PROFILE_TOKEN (so a profile can be taken of a
+    student's page, say, from a student's session). The format is pstats
+    (for pstats, snakeviz and the like) unless X-Profile-Format or
+    `profile_format` asks for speedscope. The file's download URL is sent
+    back in the X-Profile header.
+
+    The hooks are only installed when PROFILING_ENABLED is on. Even then,
+    requests that do not ask for a profile only pay for the header and
+    argument lookups; no profiler is created. Only the view, template
+    rendering and request hooks are covered, not a streamed body.
+    """
+
+    def __init__(self, app):
+        self.directory = app.config['PROFILE_DIR'] or os.path.join(app.instance_path, 'profiles')
+        self.keep = app.config['PROFILE_KEEP']
+        self.token = app.config['PROFILE_TOKEN']
+
+    def _requested(self):
+        value = request.headers.get('X-Profile') or request.args.get('profile')
+        if not value:
+            return False
+        if session.get('role') == 'admin':
+            return True
+        return bool(self.token) and hmac.compare_digest(value.encode(), self.token.encode())
+
+    def start(self):
+        if not self._requested():
+            return
+        kind = request.headers.get('X-Profile-Format') or request.args.get('profile_format') or 'pstats'
+        if kind not in FORMATS:
+            kind = 'pstats'
+        profiler = cProfile.Profile() if kind == 'pstats' else SpeedscopeTracer()
+        g.profiler = (kind, profiler)
+        profiler.enable()
+
+    def finish(self, response):
+        kind, profiler = g.pop('profiler', (None, None))
+        if profiler is None:
+            return response
+        profiler.disable()
+
+        endpoint = request.endpoint or 'unmatched'
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        filename = f'{stamp}-{re.sub(r"[^A-Za-z0-9_.-]", "_", endpoint)}{FORMATS[kind]}'
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, filename)
+        if kind == 'pstats':
+            profiler.dump_stats(path)
+        else:
+            profiler.dump(path, f'{request.method} {request.full_path}')
+        self.rotate()
+        response.headers['X-Profile'] = url_for('admin.download_profile', filename=filename)
+        return response
+
+    def abandon(self, exc):
+        # A failure after start() and before finish(): stop without saving
+        kind, profiler = g.pop('profiler', (None, None))
+        if profiler is not None:
+            profiler.disable()
+
+    def rotate(self):
+        """Delete all but the newest PROFILE_KEEP profiles."""
+        for name in saved_profiles(self.directory)[self.keep:]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass  # Removed by another worker
+
+    def profiles(self):
+        """The saved profiles, newest first, as (filename, size in bytes)."""
+        result = []
+        for name in saved_profiles(self.directory):
+            try:
+                result.append((name, os.path.getsize(os.path.join(self.directory, name))))
+            except OSError:
+                pass
+        return result
+
+
+def saved_profiles(directory):
+    """Profile filenames in `directory`, newest first (the names start with a timestamp)."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted((name for name in names if name.endswith(tuple(FORMATS.values()))), reverse=True)
+
+
+def init_profiler(app):
+    """Register the profiling hooks if PROFILING_ENABLED is set; otherwise install nothing."""
+    if not app.config['PROFILING_ENABLED']:
+        return
+    hooks = app.extensions['profiler'] = ProfilerHooks(app)
+    app.before_request(hooks.start)
+    app.after_request(hooks.finish)
+    app.teardown_request(hooks.abandon)
+
+
+def get_profiler():
+    return current_app.extensions.get('profiler')
@@ -0,0 +1,81 @@
+# search.py
+
+from markupsafe import Markup, escape
+from sqlalchemy import text
+from models import db
+import re
+
+# Markers that highlight() puts around matched terms. Control characters
+# cannot appear in book data typed into a form, so after escaping the
+# text they can safely be turned into <mark> tags.
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+# The book_search index and the triggers that keep it in step with the
+# book table come from migration 0f674d230e73. It is an external-content
+# FTS5 table keyed by book.id, with class_id indexed as a token and ISBNs
+# without hyphens or spaces; highlight() is never asked for the isbn
+# column, since it would read the raw value back.
+
+# bm25() weights for title, author, series, isbn and class_id: a hit in the
+# title counts for more than one in the author, and so on
+RANK = 'bm25(book_search, 10.0, 5.0, 3.0, 1.0, 0.0)'
+
+_WORDS = re.compile(r'\w+')
+_ISBN_HYPHENS = re.compile(r'(?<=[\dXx])-(?=[\dXx])')
+
+
+def match_query(search):
+    """Turn what the user typed into an FTS5 query over the text columns.
+
+    Every word must match, and the last one may be the start of a word, so
+    results narrow as the user types. Punctuation is dropped, which also
+    keeps FTS5 operators out of the query. Hyphens between digits are
+    dropped, as they are in the indexed ISBNs.
+    """
+    words = _WORDS.findall(_ISBN_HYPHENS.sub('', search))
+    if not words:
+        return None
+    terms = ' '.join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+    return f'{{title author series isbn}} : ({terms.strip()})'
+
+
+def highlighted(value):
+    """Escape a highlight() result and mark the matched terms with <mark>."""
+    if value is None:
+        return None
+    return Markup(str(escape(value)).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>'))
+
+
+def search_books(class_id, search, limit=20):
+    """The best `limit` books in the class matching `search`, best first.
+
+    Returns dicts with the book's id, isbn and whether it is borrowed, plus
+    its title, author and series as HTML with the matched terms highlighted.
+    """
+    query = match_query(search)
+    if query is None:
+        return []
+    rows = db.session.execute(text(f"""
+        SELECT book.id, book.isbn, book.borrowed_by_id,
+               highlight(book_search, 0, :start, :end) AS title,
+               highlight(book_search, 1, :start, :end) AS author,
+               highlight(book_search, 2, :start, :end) AS series
+        FROM book_search
+        JOIN book ON book.id = book_search.rowid
+        WHERE book_search MATCH :query
+        ORDER BY {RANK}
+        LIMIT :limit
+    """), {
+        'query': f'class_id : "{int(class_id)}" AND {query}',
+        'limit': limit,
+        'start': _MARK_START,
+        'end': _MARK_END,
+    }).mappings()
+    return [{
+        'id': row['id'],
+        'isbn': row['isbn'],
+        'borrowed': row['borrowed_by_id'] is not None,
+        'title': highlighted(row['title']),
+        'author': highlighted(row['author']),
+        'series': highlighted(row['series']),
+    } for row in rows]
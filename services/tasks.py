@@ -0,0 +1,44 @@
+# tasks.py
+
+from concurrent.futures import ThreadPoolExecutor, Future
+from flask import current_app
+import threading
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config['BACKGROUND_WORKERS'],
+                thread_name_prefix='library-tasks'
+            )
+        return _executor
+
+
+def run_in_background(func, *args, **kwargs):
+    """Run `func(*args, **kwargs)` on the background worker pool.
+
+    The job gets its own application context (and so its own database
+    session), so pass it IDs rather than ORM objects, and commit anything
+    it needs to read before calling this. Exceptions are logged, never
+    raised to the caller. With BACKGROUND_TASKS_EAGER set (handy in tests)
+    the job runs inline instead.
+    """
+    app = current_app._get_current_object()
+
+    def job():
+        with app.app_context():
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                app.logger.exception('Background job %s failed', func.__name__)
+
+    if app.config.get('BACKGROUND_TASKS_EAGER'):
+        future = Future()
+        future.set_result(job())
+        return future
+    return _get_executor(app).submit(job)
@@ -0,0 +1,213 @@
+# user_import.py
+
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select
+from werkzeug.security import generate_password_hash
+from models import db, User, Student, Teacher, Class, student_class, teacher_class
+import click
+import csv
+import multiprocessing
+import secrets
+import sys
+import threading
+
+# Role -> (profile model, association table linking it to classes)
+PROFILES = {
+    'student': (Student, student_class),
+    'teacher': (Teacher, teacher_class),
+}
+
+REQUIRED_COLUMNS = ('username', 'name', 'class')
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+def _get_hash_pool(app):
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            # Spawned, not forked: a fork would copy this multi-threaded
+            # process mid-flight, locks held by other threads (logging, the
+            # connection pool) included, and could deadlock in the child
+            _hash_pool = ProcessPoolExecutor(
+                max_workers=app.config['IMPORT_HASH_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _hash_pool
+
+
+class ImportProgress:
+    """Running totals of an import, updated after each chunk.
+
+    `errors` holds (line, username, message) for rejected rows, and
+    `passwords` the (username, password) pairs generated for rows that
+    had none, so they can be handed out.
+    """
+
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.errors = []
+        self.passwords = []
+
+    def to_dict(self):
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'failed': len(self.errors),
+        }
+
+
+def read_chunks(lines, chunk_size):
+    """Yield lists of (line number, row) from CSV text, `chunk_size` rows at a time."""
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None:
+        return
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+    if missing:
+        raise ValueError(f'CSV is missing the column(s): {", ".join(missing)}')
+
+    chunk = []
+    for row in reader:
+        chunk.append((reader.line_num, {key: (value or '').strip() for key, value in row.items() if key}))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_users(lines, default_role='student', chunk_size=None):
+    """Create the users listed in a CSV, yielding an ImportProgress after each chunk.
+
+    Columns are username, name and class (a class name), plus an optional
+    password and role. Rows without a password get a random one. Bad rows
+    (missing fields, unknown role, a class name that matches no class or
+    several, usernames that are taken or repeated) are reported and
+    skipped; the rest of their chunk still goes in. Each chunk is hashed in parallel in the process pool and inserted
+    with one multi-row INSERT per table, in a single transaction.
+    """
+    app = current_app._get_current_object()
+    chunk_size = chunk_size or app.config['IMPORT_CHUNK_SIZE']
+    progress = ImportProgress()
+    seen = set()
+
+    for chunk in read_chunks(lines, chunk_size):
+        progress.processed += len(chunk)
+        rows = _validate(chunk, default_role, seen, progress)
+        if rows:
+            _insert(app, rows, progress)
+        yield progress
+
+
+def _validate(chunk, default_role, seen, progress):
+    usernames = {row['username'] for _, row in chunk if row.get('username')}
+    class_names = {row['class'] for _, row in chunk if row.get('class')}
+    taken = set(db.session.scalars(select(User.username).where(User.username.in_(usernames))))
+    # Class names are not unique; a name shared by several classes cannot be used
+    class_ids = {}
+    for name, class_id in db.session.execute(select(Class.name, Class.id).where(Class.name.in_(class_names))):
+        class_ids.setdefault(name, []).append(class_id)
+
+    valid = []
+    for line, row in chunk:
+        username = row.get('username', '')
+        role = (row.get('role') or default_role).lower()
+        error = None
+        if not username or not row.get('name') or not row.get('class'):
+            error = 'username, name and class are required'
+        elif role not in PROFILES:
+            error = f'unknown role "{role}"'
+        elif username in seen:
+            error = 'username appears more than once in the file'
+        elif username in taken:
+            error = 'username already exists'
+        elif row['class'] not in class_ids:
+            error = f'unknown class "{row["class"]}"'
+        elif len(class_ids[row['class']]) > 1:
+            error = f'more than one class is named "{row["class"]}"'
+
+        if error:
+            progress.errors.append((line, username, error))
+            continue
+        seen.add(username)
+        valid.append({
+            'line': line,
+            'username': username,
+            'name': row['name'],
+            'role': role,
+            'class_id': class_ids[row['class']][0],
+            'password': row.get('password') or None,
+        })
+    return valid
+
+
+def _insert(app, rows, progress):
+    generated = []
+    for row in rows:
+        if row['password'] is None:
+            row['password'] = secrets.token_urlsafe(9)
+            generated.append((row['username'], row['password']))
+
+    # Hashing is deliberately slow, so spread it over several processes
+    chunksize = max(1, len(rows) // (app.config['IMPORT_HASH_WORKERS'] * 4))
+    hashes = list(_get_hash_pool(app).map(generate_password_hash, [row['password'] for row in rows], chunksize=chunksize))
+
+    try:
+        user_ids = db.session.scalars(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [{'username': row['username'], 'password': password_hash, 'role': row['role']}
+             for row, password_hash in zip(rows, hashes)]
+        ).all()
+        for role, (profile, link) in PROFILES.items():
+            members = [(row, user_id) for row, user_id in zip(rows, user_ids) if row['role'] == role]
+            if not members:
+                continue
+            profile_ids = db.session.scalars(
+                insert(profile).returning(profile.id, sort_by_parameter_order=True),
+                [{'user_id': user_id, 'name': row['name']} for row, user_id in members]
+            ).all()
+            db.session.execute(
+                insert(link),
+                [{f'{role}_id': profile_id, 'class_id': row['class_id']}
+                 for (row, _), profile_id in zip(members, profile_ids)]
+            )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.exception('User import chunk failed')
+        progress.errors.extend((row['line'], row['username'], f'not saved: {e}') for row in rows)
+        return
+
+    progress.created += len(rows)
+    progress.passwords.extend(generated)
+
+
+@click.command('import-users')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--role', type=click.Choice(sorted(PROFILES)), default='student',
+              help='Role for rows without a role column.')
+@click.option('--chunk-size', type=int, default=None, help='Rows per transaction.')
+@click.option('--report', type=click.File('w'), default=None,
+              help='Write rejected rows and generated passwords to this CSV file.')
+@with_appcontext
+def import_users_command(csv_file, role, chunk_size, report):
+    """Create students and teachers from a CSV of username,name,class[,password][,role]."""
+    progress = ImportProgress()
+    try:
+        for progress in import_users(csv_file, role, chunk_size):
+            click.echo(f'{progress.processed} rows read, {progress.created} created, {len(progress.errors)} rejected')
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    writer = csv.writer(report or sys.stdout)
+    if progress.errors or progress.passwords or report:
+        writer.writerow(['line', 'username', 'error', 'generated_password'])
+        for line, username, error in progress.errors:
+            writer.writerow([line, username, error, ''])
+        for username, password in progress.passwords:
+            writer.writerow(['', username, '', password])
@@ -0,0 +1,44 @@
+# versions.py
+
+from flask import request, make_response
+from sqlalchemy import update, select
+from models import db, Class
+
+
+def bump_class_version(class_id):
+    """Increment `class_id`'s change version in the current transaction.
+
+    Called (through services.events.notify_class_change) by every write to
+    the class's books, borrow history or donations, so any view built only
+    from that data is unchanged for as long as the version is.
+    """
+    db.session.execute(
+        update(Class).where(Class.id == class_id).values(version=Class.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def class_version(class_id):
+    return db.session.execute(select(Class.version).where(Class.id == class_id)).scalar()
+
+
+def class_etag(view, class_id, version):
+    return f'{view}-{class_id}-{version}'
+
+
+def conditional_response(etag, build):
+    """Answer 304 Not Modified if the client already has `etag`, else `build()`.
+
+    `build` is only called when the client's copy is stale, so the queries
+    and serialization behind the view are skipped for unchanged data. The
+    response must be revalidated on every use (no-cache), which lets a
+    plain fetch() send If-None-Match and get a 304 without any extra code.
+    """
+    # Weak comparison: compress_response() weakens the tag of a compressed body
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,100 @@
+// static/js/admin_dashboard.js
+
+// Escape text before it is placed in the list markup
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : value;
+    return div.innerHTML;
+}
+
+function actionForm(url, label, question) {
+    return `
+        <form action="${escapeHtml(url)}" method="POST" style="display:inline;" onsubmit="return confirm('${question}');">
+            <button type="submit" class="btn btn-danger btn-sm">${label}</button>
+        </form>
+    `;
+}
+
+// One list item per kind of record. Inside a class, people get an unassign
+// button; in the "All" lists they get a delete button.
+const renderers = {
+    teacher: item => `
+        <li class="list-group-item d-flex justify-content-between align-items-center">
+            ${escapeHtml(item.name)}
+            ${item.unassign_url
+                ? actionForm(item.unassign_url, 'unassign Teacher', 'Are you sure you want to unassign this teacher?')
+                : actionForm(item.delete_url, 'Delete Teacher', 'Are you sure you want to delete this teacher?')}
+        </li>
+    `,
+    student: item => `
+        <li class="list-group-item d-flex justify-content-between align-items-center">
+            ${escapeHtml(item.name)}
+            ${item.unassign_url
+                ? actionForm(item.unassign_url, 'unassign Student', 'Are you sure you want to unassign this student?')
+                : actionForm(item.delete_url, 'Delete Student', 'Are you sure you want to delete this student?')}
+        </li>
+    `,
+    book: item => `
+        <li class="list-group-item d-flex justify-content-between align-items-center">
+            <span>
+                <strong>${escapeHtml(item.title)}</strong> &middot; ${escapeHtml(item.author)}
+                ${item.series ? `<small class="text-muted">(${escapeHtml(item.series)})</small>` : ''}
+                ${item.borrower
+                    ? `<span class="text-danger">Borrowed by ${escapeHtml(item.borrower)}</span>`
+                    : '<span class="text-success">Available</span>'}
+            </span>
+            ${actionForm(item.delete_url, 'Delete Book', 'Are you sure you want to delete this book?')}
+        </li>
+    `,
+};
+
+// Fetch a page into a lazy list: replace its items, or append for "Load more"
+function loadList(list, url, append) {
+    const items = list.querySelector('.lazy-items');
+    const more = list.querySelector('.lazy-more');
+    fetch(url, { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(data => {
+            const render = renderers[list.dataset.kind];
+            const html = data.items.map(render).join('');
+            if (append) {
+                items.insertAdjacentHTML('beforeend', html);
+            } else {
+                items.innerHTML = html || '<li class="list-group-item">Nothing found.</li>';
+            }
+            more.hidden = !data.next_url;
+            more.dataset.url = data.next_url || '';
+        })
+        .catch(error => console.error('Error loading list:', error));
+}
+
+function searchUrl(list) {
+    const url = new URL(list.dataset.url, window.location.origin);
+    const search = list.querySelector('.lazy-search').value.trim();
+    if (search) {
+        url.searchParams.set('q', search);
+    }
+    return url.toString();
+}
+
+document.querySelectorAll('.lazy-list').forEach(list => {
+    let timer = null;
+    list.querySelector('.lazy-search').addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => loadList(list, searchUrl(list), false), 300);
+    });
+    list.querySelector('.lazy-more').addEventListener('click', event => {
+        loadList(list, event.target.dataset.url, true);
+    });
+});
+
+// Load a section's lists the first time it is opened
+$(document).on('show.bs.collapse', '.collapse', function (event) {
+    if (event.target !== this) {
+        return;
+    }
+    this.querySelectorAll('.lazy-list:not([data-loaded])').forEach(list => {
+        list.dataset.loaded = 'true';
+        loadList(list, searchUrl(list), false);
+    });
+});
@@ -0,0 +1,55 @@
+// static/js/book_search.js
+
+// Escape text before it is placed in the list markup
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : value;
+    return div.innerHTML;
+}
+
+// Title, author and series arrive as escaped HTML with <mark> around the matches
+function renderResult(book) {
+    return `
+        <a href="${escapeHtml(book.url)}" class="list-group-item list-group-item-action">
+            <strong>${book.title}</strong> &middot; ${book.author}
+            ${book.series ? `<small class="text-muted">(${book.series})</small>` : ''}
+            ${book.isbn ? `<small class="text-muted">ISBN ${escapeHtml(book.isbn)}</small>` : ''}
+            ${book.borrowed
+                ? '<span class="badge badge-danger float-right">Borrowed</span>'
+                : '<span class="badge badge-success float-right">Available</span>'}
+        </a>
+    `;
+}
+
+document.querySelectorAll('.book-search').forEach(box => {
+    const input = box.querySelector('.book-search-input');
+    const results = box.querySelector('.book-search-results');
+    let timer = null;
+    let latest = 0;
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+            const search = input.value.trim();
+            const request = ++latest;
+            if (!search) {
+                results.innerHTML = '';
+                return;
+            }
+            const url = new URL(box.dataset.url, window.location.origin);
+            url.searchParams.set('q', search);
+            fetch(url, { credentials: 'same-origin' })
+                .then(response => response.json())
+                .then(data => {
+                    // Ignore answers to searches the user has already typed past
+                    if (request !== latest) {
+                        return;
+                    }
+                    results.innerHTML = data.results.length
+                        ? data.results.map(renderResult).join('')
+                        : '<li class="list-group-item">No books found.</li>';
+                })
+                .catch(error => console.error('Error searching books:', error));
+        }, 200);
+    });
+});
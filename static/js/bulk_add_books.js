@@ -0,0 +1,98 @@
+// static/js/bulk_add_books.js
+
+const bulkAddForm = document.getElementById('bulkAddForm');
+const counts = { total: 0, added: 0, not_found: 0, error: 0, invalid: 0, needsDetails: 0 };
+
+// Escape text before it is placed in the table markup
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : value;
+    return div.innerHTML;
+}
+
+// Books saved without details carry the ISBN as their title until edited
+function placeholderNote(result) {
+    return ` &ndash; added with the ISBN as its title, <a href="${escapeHtml(result.edit_url)}">enter the details</a>`;
+}
+
+function describe(result) {
+    switch (result.status) {
+        case 'added':
+            return `<span class="text-success">Added "${escapeHtml(result.title)}"</span>`;
+        case 'not_found':
+            return '<span class="text-warning">Not found on Open Library</span>' + placeholderNote(result);
+        case 'invalid':
+            return '<span class="text-danger">Not a valid ISBN</span>';
+        default:
+            if (result.book_id === undefined) {
+                return `<span class="text-danger">${escapeHtml(result.message)}</span>`;
+            }
+            return `<span class="text-danger">Lookup failed: ${escapeHtml(result.message)}</span>` + placeholderNote(result);
+    }
+}
+
+function showSummary(finished) {
+    const done = counts.added + counts.not_found + counts.error + counts.invalid;
+    document.getElementById('bulkAddSummary').textContent =
+        `${done} of ${counts.total} ISBNs done: ${counts.added} added, ${counts.not_found} not found, ` +
+        `${counts.error} failed, ${counts.invalid} invalid.` + (finished ? ' Finished.' : '') +
+        (counts.needsDetails ? ` ${counts.needsDetails} added without details need to be filled in.` : '');
+}
+
+// Apply one line of the server's result stream
+function showResult(result) {
+    const summary = document.getElementById('bulkAddSummary');
+    if (result.error) {
+        summary.className = 'text-danger';
+        summary.textContent = result.error;
+        return;
+    }
+    if (result.total !== undefined) {
+        counts.total = result.total;
+    } else if (result.done) {
+        showSummary(true);
+        return;
+    } else {
+        counts[result.status] += 1;
+        if (result.status !== 'added' && result.book_id !== undefined) {
+            counts.needsDetails += 1;
+        }
+        document.getElementById('bulkAddResults').insertAdjacentHTML('beforeend',
+            `<tr><td>${escapeHtml(result.isbn)}</td><td>${describe(result)}</td></tr>`);
+    }
+    showSummary(false);
+}
+
+// Send the ISBNs and read the newline-delimited JSON response as it arrives
+bulkAddForm.addEventListener('submit', event => {
+    event.preventDefault();
+    const button = bulkAddForm.querySelector('button[type="submit"]');
+    button.disabled = true;
+    Object.keys(counts).forEach(key => { counts[key] = 0; });
+    document.getElementById('bulkAddStatus').hidden = false;
+    document.getElementById('bulkAddSummary').className = '';
+    document.getElementById('bulkAddSummary').textContent = 'Looking up books…';
+    document.getElementById('bulkAddResults').innerHTML = '';
+
+    fetch(bulkAddForm.action, { method: 'POST', body: new FormData(bulkAddForm), credentials: 'same-origin' })
+        .then(async response => {
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) {
+                    break;
+                }
+                buffered += decoder.decode(value, { stream: true });
+                const lines = buffered.split('\n');
+                buffered = lines.pop();
+                lines.filter(line => line.trim()).forEach(line => showResult(JSON.parse(line)));
+            }
+            if (buffered.trim()) {
+                showResult(JSON.parse(buffered));
+            }
+        })
+        .catch(error => console.error('Error adding books:', error))
+        .finally(() => { button.disabled = false; });
+});
@@ -0,0 +1,67 @@
+// static/js/import_users.js
+
+const importForm = document.getElementById('importForm');
+
+// Escape text before it is placed in the table markup
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value == null ? '' : value;
+    return div.innerHTML;
+}
+
+function appendRows(bodyId, rows) {
+    const body = document.getElementById(bodyId);
+    body.insertAdjacentHTML('beforeend', rows.map(cells =>
+        '<tr>' + cells.map(cell => `<td>${escapeHtml(cell)}</td>`).join('') + '</tr>'
+    ).join(''));
+}
+
+// Apply one line of the server's progress stream
+function showProgress(update) {
+    const summary = document.getElementById('importSummary');
+    if (update.error) {
+        summary.className = 'text-danger';
+        summary.textContent = update.error;
+        return;
+    }
+    if (update.done) {
+        summary.textContent += ' Import finished.';
+        return;
+    }
+    summary.textContent = `${update.processed} rows read, ${update.created} users created, ${update.failed} rows rejected.`;
+    appendRows('importErrors', update.errors);
+    appendRows('importPasswords', update.passwords);
+}
+
+// Upload the file and read the newline-delimited JSON response as it arrives
+importForm.addEventListener('submit', event => {
+    event.preventDefault();
+    const button = importForm.querySelector('button[type="submit"]');
+    button.disabled = true;
+    document.getElementById('importStatus').hidden = false;
+    document.getElementById('importSummary').textContent = 'Uploading…';
+    document.getElementById('importErrors').innerHTML = '';
+    document.getElementById('importPasswords').innerHTML = '';
+
+    fetch(importForm.action, { method: 'POST', body: new FormData(importForm), credentials: 'same-origin' })
+        .then(async response => {
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) {
+                    break;
+                }
+                buffered += decoder.decode(value, { stream: true });
+                const lines = buffered.split('\n');
+                buffered = lines.pop();
+                lines.filter(line => line.trim()).forEach(line => showProgress(JSON.parse(line)));
+            }
+            if (buffered.trim()) {
+                showProgress(JSON.parse(buffered));
+            }
+        })
+        .catch(error => console.error('Error importing users:', error))
+        .finally(() => { button.disabled = false; });
+});
@@ -1,8 +1,18 @@
 // static/js/teacher_dashboard.js
 
+// The dashboard element carries the class ID and the endpoint URLs
+const dashboard = document.getElementById('pendingRequests');
+
+// Escape text before it is placed in the table markup
+function escapeHtml(value) {
+    const div = document.createElement('div');
+    div.textContent = value;
+    return div.innerHTML;
+}
+
 // Function to fetch pending requests from the server
 function fetchPendingRequests() {
-    fetch('/api/pending_requests')
+    fetch(dashboard.dataset.apiUrl, { credentials: 'same-origin' })
         .then(response => response.json())
         .then(data => {
             updateBorrowRequests(data.borrow_requests);
@@ -11,62 +21,57 @@ function fetchPendingRequests() {
         .catch(error => console.error('Error fetching pending requests:', error));
 }
 
+// Build one table row with Approve / Reject buttons; the action URLs in the
+// tbody's data attributes end in /0, which is swapped for the request ID
+function requestRow(body, request) {
+    const approveUrl = body.dataset.approveUrl.replace(/\/0$/, '/' + request.request_id);
+    const rejectUrl = body.dataset.rejectUrl.replace(/\/0$/, '/' + request.request_id);
+    return `
+        <tr>
+            <td>${escapeHtml(request.book_title)}</td>
+            <td>${escapeHtml(request.student_name)}</td>
+            <td>${escapeHtml(request.request_date)}</td>
+            <td>
+                <form action="${approveUrl}" method="POST" style="display:inline-block;">
+                    <button type="submit" class="btn btn-success btn-sm">Approve</button>
+                </form>
+                <form action="${rejectUrl}" method="POST" style="display:inline-block;">
+                    <button type="submit" class="btn btn-danger btn-sm">Reject</button>
+                </form>
+            </td>
+        </tr>
+    `;
+}
+
+function updateRequestTable(bodyId, requests, emptyMessage) {
+    const body = document.getElementById(bodyId);
+    if (requests.length === 0) {
+        body.innerHTML = `<tr><td colspan="4">${emptyMessage}</td></tr>`;
+        return;
+    }
+    body.innerHTML = requests.map(request => requestRow(body, request)).join('');
+}
+
 // Function to update borrow requests table
 function updateBorrowRequests(borrowRequests) {
-    const borrowRequestsBody = document.getElementById('borrowRequestsBody');
-    borrowRequestsBody.innerHTML = '';  // Clear the existing table
-
-    borrowRequests.forEach(request => {
-        const row = `
-            <tr>
-                <td>${request.book_title}</td>
-                <td>${request.student_name}</td>
-                <td>${request.class_name}</td>
-                <td>${request.request_date}</td>
-                <td>
-                    <form action="/teacher/approve_borrow/${request.request_id}" method="POST" style="display:inline;">
-                        <button type="submit" class="btn btn-success btn-sm">Approve</button>
-                    </form>
-                    <form action="/teacher/reject_borrow/${request.request_id}" method="POST" style="display:inline;">
-                        <button type="submit" class="btn btn-danger btn-sm">Reject</button>
-                    </form>
-                </td>
-            </tr>
-        `;
-        borrowRequestsBody.innerHTML += row;
-    });
+    updateRequestTable('borrowRequestsBody', borrowRequests, 'No pending borrow requests.');
 }
 
 // Function to update donation requests table
 function updateDonationRequests(donationRequests) {
-    const donationRequestsBody = document.getElementById('donationRequestsBody');
-    donationRequestsBody.innerHTML = '';  // Clear the existing table
-
-    donationRequests.forEach(request => {
-        const row = `
-            <tr>
-                <td>${request.book_title}</td>
-                <td>${request.student_name}</td>
-                <td>${request.class_name}</td>
-                <td>${request.request_date}</td>
-                <td>
-                    <form action="/teacher/approve_donation/${request.request_id}" method="POST" style="display:inline;">
-                        <button type="submit" class="btn btn-success btn-sm">Approve</button>
-                    </form>
-                    <form action="/teacher/reject_donation/${request.request_id}" method="POST" style="display:inline;">
-                        <button type="submit" class="btn btn-danger btn-sm">Reject</button>
-                    </form>
-                </td>
-            </tr>
-        `;
-        donationRequestsBody.innerHTML += row;
-    });
+    updateRequestTable('donationRequestsBody', donationRequests, 'No pending donation requests.');
 }
 
-// Poll the server every 10 seconds for new requests
-setInterval(fetchPendingRequests, 10000);  // 10,000 ms = 10 seconds
-
-// Initial fetch when the page loads
-document.addEventListener('DOMContentLoaded', function () {
-    fetchPendingRequests();
-});
+// Refresh the tables whenever the server reports a change to the class's
+// requests. The stream reconnects by itself; each (re)connect fetches once
+// so nothing that happened while it was down is missed. Browsers without
+// EventSource fall back to polling every 10 seconds.
+if (dashboard) {
+    if (window.EventSource) {
+        const stream = new EventSource(dashboard.dataset.streamUrl);
+        stream.addEventListener('open', fetchPendingRequests);
+        stream.addEventListener('change', fetchPendingRequests);
+    } else {
+        setInterval(fetchPendingRequests, 10000);  // 10,000 ms = 10 seconds
+    }
+}
@@ -0,0 +1,205 @@
+# conftest.py
+"""Shared fixtures: the app on a throwaway SQLite file, emptied after every test.
+
+app.py builds the app when it is imported, reading its settings from the
+environment, so the environment is set up here before the first import.
+The schema comes from the migrations, as it does in a deployment.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from werkzeug.security import generate_password_hash
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP_DIR = tempfile.mkdtemp(prefix='library-tests-')
+DB_PATH = os.path.join(TMP_DIR, 'library.db')
+
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + DB_PATH,
+    # Caches that would outlive the rows a test deletes
+    'FRAGMENT_CACHE': 'none',
+    'METRICS_DIR': os.path.join(TMP_DIR, 'metrics'),
+    'PROFILE_DIR': os.path.join(TMP_DIR, 'profiles'),
+    # Exercise the process pool without starting one per CPU
+    'IMPORT_HASH_WORKERS': '2',
+    # Never reach the real Open Library
+    'OPENLIBRARY_URL': 'http://127.0.0.1:9',
+    'OPENLIBRARY_COVERS_URL': 'http://127.0.0.1:9',
+})
+
+# Cheap hashes keep the fixtures fast; the app accepts any werkzeug hash
+PASSWORD = 'pw'
+PASSWORD_HASH = generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from flask_migrate import upgrade
+    from app import app
+    app.config['TESTING'] = True
+
+    # Requests made while a test holds an app context share its `g`, where in
+    # a deployment each request gets its own; keep per-request state apart
+    @app.teardown_request
+    def forget_request_state(exc):
+        from flask import g
+        g.pop('identity', None)
+
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+    return app
+
+
+@pytest.fixture(autouse=True)
+def clean_database(app):
+    yield
+    from models import db
+    from services.openlibrary import isbn_cache
+    from services.identity import identity_cache
+    with app.app_context():
+        db.session.remove()
+        # Child tables first; deleting books fires the search index triggers
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+    isbn_cache._entries.clear()
+    identity_cache.invalidate()
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context() as context:
+        yield context
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class Factory:
+    """Creates and commits rows for a test; every method returns the new object."""
+
+    def __init__(self):
+        from models import db
+        self.db = db
+
+    def _add(self, obj):
+        self.db.session.add(obj)
+        self.db.session.commit()
+        return obj
+
+    def user(self, username, role):
+        from models import User
+        return self._add(User(username=username, password=PASSWORD_HASH, role=role))
+
+    def class_(self, name='Class 1'):
+        from models import Class
+        return self._add(Class(name=name))
+
+    def teacher(self, username, *classes):
+        from models import Teacher
+        user = self.user(username, 'teacher')
+        return self._add(Teacher(name=username.title(), user_id=user.id, classes=list(classes)))
+
+    def student(self, username, *classes):
+        from models import Student
+        user = self.user(username, 'student')
+        return self._add(Student(name=username.title(), user_id=user.id, classes=list(classes)))
+
+    def book(self, class_, title='Book', **fields):
+        from models import Book
+        fields.setdefault('author', 'Author')
+        return self._add(Book(title=title, class_id=class_.id, **fields))
+
+
+@pytest.fixture
+def factory(ctx):
+    return Factory()
+
+
+@pytest.fixture
+def login_as(client):
+    """login_as(user, client=client): log in as a User, Student or Teacher without posting the form."""
+    def login_as(user, client=client):
+        user = getattr(user, 'user', user)
+        with client.session_transaction() as session:
+            session['user_id'] = user.id
+            session['username'] = user.username
+            session['role'] = user.role
+    return login_as
+
+
+class OpenLibraryStub:
+    """A local stand-in for Open Library's /api/books, on a free port.
+
+    `answers` maps an ISBN to what the stub does when asked for it: a dict
+    of book details (a 200 with those details), an HTTP status code, or
+    ('sleep', seconds) to hang before answering. Any other ISBN gets
+    Open Library's empty 200 answer. Every ISBN asked for is appended to
+    `requests`.
+    """
+
+    def __init__(self):
+        self.answers = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                bibkey = parse_qs(urlsplit(self.path).query).get('bibkeys', [''])[0]
+                isbn = bibkey.removeprefix('ISBN:')
+                stub.requests.append(isbn)
+                answer = stub.answers.get(isbn)
+                if isinstance(answer, tuple):
+                    time.sleep(answer[1])
+                    answer = None
+                if isinstance(answer, int):
+                    self.send_response(answer)
+                    self.end_headers()
+                    return
+                body = json.dumps({bibkey: {'details': answer}} if answer else {}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def openlibrary(app, monkeypatch):
+    """Point the Open Library client at an OpenLibraryStub, with quick timeouts and retries."""
+    stub = OpenLibraryStub()
+    for name, value in {
+        'OPENLIBRARY_URL': stub.url,
+        'OPENLIBRARY_COVERS_URL': stub.url,
+        'OPENLIBRARY_TIMEOUT': 0.2,
+        'OPENLIBRARY_RETRIES': 1,
+        'OPENLIBRARY_BACKOFF': 0,
+        'OPENLIBRARY_RATE_LIMIT': 0,
+    }.items():
+        monkeypatch.setitem(app.config, name, value)
+    yield stub
+    stub.close()
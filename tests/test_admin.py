@@ -0,0 +1,50 @@
+# test_admin.py
+
+import pytest
+
+
+@pytest.fixture
+def admin(factory, login_as):
+    login_as(factory.user('admin', 'admin'))
+
+
+def test_dashboard_shows_per_class_counts(client, factory, admin):
+    from models import db, BorrowHistory, BorrowState
+    from routes.admin import class_counts
+    class_ = factory.class_('Robins')
+    factory.teacher('teacher', class_)
+    student = factory.student('student', class_)
+    factory.book(class_, 'Lent', borrowed_by_id=student.id)
+    requested = factory.book(class_, 'Requested')
+    db.session.add(BorrowHistory(book_id=requested.id, student_id=student.id, state=BorrowState.PENDING))
+    db.session.commit()
+
+    assert 'Robins' in client.get('/admin').get_data(as_text=True)
+    assert class_counts([class_.id]) == {class_.id: {
+        'teachers': 1, 'students': 1, 'books': 2, 'borrowed': 1, 'pending': 1,
+    }}
+
+
+def test_book_search_escapes_like_wildcards(client, factory, admin):
+    class_ = factory.class_()
+    factory.book(class_, '100% Wolf')
+    factory.book(class_, '100 Wolves')
+
+    response = client.get('/admin/api/books?q=100%25')
+
+    assert [book['title'] for book in response.json['items']] == ['100% Wolf']
+
+
+def test_lists_are_keyset_paginated(app, client, factory, admin, monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMIN_PAGE_SIZE', 2)
+    class_ = factory.class_()
+    for i in range(3):
+        factory.student(f'student{i}', class_)
+
+    first = client.get(f'/admin/api/students?class_id={class_.id}').json
+    second = client.get(first['next_url']).json
+
+    assert [student['name'] for student in first['items']] == ['Student0', 'Student1']
+    assert [student['name'] for student in second['items']] == ['Student2']
+    assert second['next_url'] is None
+    assert second['items'][0]['unassign_url'].startswith(f'/unassign_student/{class_.id}/')
@@ -0,0 +1,68 @@
+# test_assets.py
+
+import pytest
+
+
+def test_fingerprinted_asset_is_served(app, client):
+    with app.test_request_context():
+        from services.assets import asset_url
+        url = asset_url('style.css')
+    assert url.startswith('/assets/style.')
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/css'
+    assert 'immutable' in response.headers['Cache-Control']
+
+
+@pytest.mark.parametrize('path', [
+    '/assets/../app.py',
+    '/assets/..%2Fapp.py',
+    '/assets/..%2Ftemplates%2Flogin.html',
+    '/assets/css/..%2F..%2Fconfig.py',
+])
+def test_paths_outside_the_static_folder_are_not_found(client, path):
+    assert client.get(path).status_code == 404
+
+
+def test_manifest_refuses_paths_outside_the_static_folder(app):
+    from services.assets import manifest
+    with app.app_context():
+        assert manifest.get('../app.py') is None
+        assert manifest.get('../templates/login.html') is None
+
+
+def test_precompressed_asset_is_picked_by_accept_encoding(app, client):
+    import gzip
+    with app.test_request_context():
+        from services.assets import asset_url
+        url = asset_url('style.css')
+    plain = client.get(url)
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain.data
+    assert response.headers['ETag'] != plain.headers['ETag']
+    assert client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_pages_are_compressed_and_still_revalidate(app, client, factory, login_as, monkeypatch):
+    import gzip
+    monkeypatch.setitem(app.config, 'COMPRESS_MIN_SIZE', 0)
+    class_ = factory.class_()
+    login_as(factory.teacher('teacher', class_))
+
+    page = client.get('/teacher', headers={'Accept-Encoding': 'gzip'})
+    assert page.headers['Content-Encoding'] == 'gzip'
+    assert b'Teacher Dashboard' in gzip.decompress(page.data)
+
+    first = client.get('/api/pending_requests', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert first.headers['ETag'].startswith('W/')
+    again = client.get('/api/pending_requests',
+                       headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+    assert 'Content-Encoding' not in client.get('/teacher').headers
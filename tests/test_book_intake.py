@@ -0,0 +1,96 @@
+# test_book_intake.py
+
+from sqlalchemy import select, text
+import json
+import pytest
+
+
+def isbn13(n):
+    digits = f'978{n:09d}'
+    check = (10 - sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits)) % 10) % 10
+    return digits + str(check)
+
+
+FOUND, MISSING, BROKEN = isbn13(1), isbn13(2), isbn13(3)
+
+
+@pytest.fixture
+def class_id(factory):
+    return factory.class_().id
+
+
+@pytest.fixture
+def stub(openlibrary):
+    openlibrary.answers[FOUND] = {'title': 'Matilda', 'authors': [{'name': 'Roald Dahl'}]}
+    openlibrary.answers[BROKEN] = 503
+    return openlibrary
+
+
+def books(class_id):
+    from models import db, Book
+    db.session.expire_all()
+    return db.session.scalars(select(Book).where(Book.class_id == class_id).order_by(Book.id)).all()
+
+
+def test_every_isbn_ends_up_on_the_shelf(ctx, stub, class_id):
+    from services.book_intake import intake_books
+
+    results = list(intake_books([FOUND, MISSING, BROKEN, FOUND], class_id))
+
+    by_status = {}
+    for result in results:
+        by_status.setdefault(result['status'], []).append(result)
+    assert [r['title'] for r in by_status['added']] == ['Matilda', 'Matilda']
+    assert [r['isbn'] for r in by_status['not_found']] == [MISSING]
+    assert [r['isbn'] for r in by_status['error']] == [BROKEN]
+    assert all('book_id' in result for result in results)
+    # Each distinct ISBN is looked up once, the failing one once per attempt
+    assert sorted(stub.requests) == sorted([FOUND, MISSING, BROKEN, BROKEN])
+
+    saved = {(book.isbn, book.title, book.author) for book in books(class_id)}
+    assert saved == {
+        (FOUND, 'Matilda', 'Roald Dahl'),
+        (MISSING, MISSING, 'Unknown'),
+        (BROKEN, BROKEN, 'Unknown'),
+    }
+    assert len(books(class_id)) == 4
+
+
+def test_a_book_that_cannot_be_saved_does_not_end_the_stream(app, ctx, stub, class_id, monkeypatch):
+    from models import db
+    from services.book_intake import intake_books
+    monkeypatch.setitem(app.config, 'INTAKE_BATCH_SIZE', 10)
+    db.session.execute(text(
+        f"CREATE TRIGGER test_reject_book BEFORE INSERT ON book WHEN NEW.isbn = '{MISSING}' "
+        "BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+    ))
+    db.session.commit()
+    try:
+        results = list(intake_books([FOUND, MISSING, BROKEN], class_id))
+    finally:
+        db.session.rollback()
+        db.session.execute(text('DROP TRIGGER test_reject_book'))
+        db.session.commit()
+
+    failed = [result for result in results if 'book_id' not in result]
+    assert failed == [{'isbn': MISSING, 'status': 'error', 'message': 'Could not save the book: IntegrityError'}]
+    assert len(results) == 3
+    assert sorted(book.isbn for book in books(class_id)) == sorted([FOUND, BROKEN])
+
+
+def test_bulk_add_route_links_placeholders_to_the_edit_form(client, factory, login_as, stub):
+    class_ = factory.class_()
+    login_as(factory.teacher('teacher', class_))
+
+    response = client.post('/bulk_add_books', data={
+        'class_id': class_.id, 'isbns': f'{FOUND}, {MISSING}\nnot-an-isbn',
+    })
+
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert lines[0] == {'total': 3}
+    assert lines[1] == {'isbn': 'not-an-isbn', 'status': 'invalid'}
+    assert lines[-1] == {'done': True}
+    results = {line['isbn']: line for line in lines[2:-1]}
+    assert results[FOUND]['status'] == 'added'
+    assert results[MISSING]['status'] == 'not_found'
+    assert results[MISSING]['edit_url'] == f"/edit_book/{results[MISSING]['book_id']}"
@@ -0,0 +1,201 @@
+# test_borrowing.py
+
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, select
+import threading
+import pytest
+
+THREADS = 8
+
+
+def race(app, action, arguments):
+    """Run action(argument) for each argument on its own thread, all released at once.
+
+    Each thread gets its own app context, and so its own session and
+    connection. Returns how many calls succeeded and how many were refused.
+    """
+    from models import db
+    from services.borrowing import BorrowError
+    barrier = threading.Barrier(len(arguments))
+
+    def run(argument):
+        with app.app_context():
+            try:
+                barrier.wait()
+                action(argument)
+                return True
+            except BorrowError:
+                return False
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=len(arguments)) as pool:
+        results = list(pool.map(run, arguments))
+    return results.count(True), results.count(False)
+
+
+@pytest.fixture
+def library(factory):
+    class_ = factory.class_()
+    teacher = factory.teacher('teacher', class_)
+    students = [factory.student(f'student{i}', class_) for i in range(THREADS)]
+    book = factory.book(class_, 'Contested')
+    return class_, teacher, students, book
+
+
+def active_rows(book_id, *states):
+    from models import db, BorrowHistory
+    return db.session.scalar(
+        select(func.count()).select_from(BorrowHistory)
+        .where(BorrowHistory.book_id == book_id, BorrowHistory.state.in_(states))
+    )
+
+
+def test_one_request_per_student_and_book(app, library):
+    from models import db, Book, BorrowState, Student
+    from services import borrowing
+    class_, teacher, students, book = library
+    student_id, class_id, book_id = students[0].id, class_.id, book.id
+
+    def request(_):
+        borrowing.request_borrow(student_id, class_id, db.session.get(Book, book_id), None)
+
+    succeeded, refused = race(app, request, range(THREADS))
+
+    assert (succeeded, refused) == (1, THREADS - 1)
+    db.session.expire_all()
+    assert active_rows(book_id, BorrowState.PENDING) == 1
+    assert db.session.get(Student, student_id).active_borrows == 1
+
+
+def test_requests_stop_at_the_borrow_limit(app, factory, library):
+    from models import db, Book, BorrowHistory, BorrowState
+    from services import borrowing
+    class_, teacher, students, book = library
+    student_id, class_id = students[0].id, class_.id
+    book_ids = [factory.book(class_, f'Book {i}').id for i in range(THREADS)]
+
+    def request(book_id):
+        borrowing.request_borrow(student_id, class_id, db.session.get(Book, book_id), None)
+
+    succeeded, refused = race(app, request, book_ids)
+
+    limit = app.config['BORROW_LIMIT']
+    assert (succeeded, refused) == (limit, THREADS - limit)
+    db.session.expire_all()
+    assert db.session.scalar(
+        select(func.count()).select_from(BorrowHistory)
+        .where(BorrowHistory.student_id == student_id, BorrowHistory.state == BorrowState.PENDING)
+    ) == limit
+    assert borrowing.counter_drift() == []
+
+
+def test_only_one_approval_lends_the_book(app, library):
+    from models import db, Book, BorrowHistory, BorrowState, Student
+    from services import borrowing
+    class_, teacher, students, book = library
+    book_id, teacher_user_id = book.id, teacher.user_id
+    request_ids = [borrowing.request_borrow(student.id, class_.id, book, student.user_id)
+                   for student in students]
+
+    def approve(request_id):
+        borrowing.approve_request(db.session.get(BorrowHistory, request_id), teacher_user_id)
+
+    succeeded, refused = race(app, approve, request_ids)
+
+    assert (succeeded, refused) == (1, THREADS - 1)
+    db.session.expire_all()
+    assert active_rows(book_id, BorrowState.BORROWED) == 1
+    winner = db.session.scalars(
+        select(BorrowHistory).where(BorrowHistory.book_id == book_id, BorrowHistory.state == BorrowState.BORROWED)
+    ).one()
+    assert db.session.get(Book, book_id).borrowed_by_id == winner.student_id
+    # Everyone holds exactly one open request or borrow: the winner's loan
+    # or their own still-pending request
+    assert active_rows(book_id, BorrowState.PENDING) == THREADS - 1
+    assert all(student.active_borrows == 1 for student in db.session.scalars(select(Student)))
+    assert borrowing.counter_drift() == []
+
+
+def active_borrows(student):
+    from models import db
+    db.session.refresh(student)
+    return student.active_borrows
+
+
+def test_counter_follows_each_step(client, factory, login_as, library):
+    from models import db, BorrowHistory
+    from services import borrowing
+    class_, teacher, students, book = library
+    student = students[0]
+    other = factory.book(class_, 'Other')
+    teacher_client = client.application.test_client()
+    login_as(student)
+    login_as(teacher, client=teacher_client)
+
+    def request(book):
+        client.post(f'/request_borrow/{book.id}')
+        return db.session.scalars(
+            select(BorrowHistory).where(BorrowHistory.book_id == book.id).order_by(BorrowHistory.id.desc())
+        ).first()
+
+    lent = request(book)
+    refused = request(other)
+    assert active_borrows(student) == 2
+    teacher_client.post(f'/approve_borrow/{lent.id}')
+    assert active_borrows(student) == 2
+    teacher_client.post(f'/reject_borrow/{refused.id}')
+    assert active_borrows(student) == 1
+    db.session.refresh(lent)
+    borrowing.return_book(lent, student.user_id)
+    assert active_borrows(student) == 0
+
+    cancelled = request(other)
+    assert active_borrows(student) == 1
+    client.post(f'/cancel_request/{cancelled.id}')
+    assert active_borrows(student) == 0
+    assert borrowing.counter_drift() == []
+
+
+def test_deleting_books_and_classes_releases_their_borrows(client, factory, login_as, library):
+    from models import db
+    from services import borrowing
+    class_, teacher, students, book = library
+    student = students[0]
+    borrowing.request_borrow(student.id, class_.id, book, student.user_id)
+    other_class = factory.class_('Class 2')
+    student.classes.append(other_class)
+    db.session.commit()
+    borrowing.request_borrow(student.id, other_class.id, factory.book(other_class, 'Elsewhere'), student.user_id)
+    assert active_borrows(student) == 2
+
+    login_as(teacher)
+    client.post(f'/delete_book/{book.id}')
+    assert active_borrows(student) == 1
+
+    login_as(factory.user('admin', 'admin'))
+    client.post(f'/delete_class/{other_class.id}')
+    assert active_borrows(student) == 0
+    assert borrowing.counter_drift() == []
+
+
+def test_reconcile_fixes_drifted_counters(app, library):
+    from models import db, Student
+    from services import borrowing
+    class_, teacher, students, book = library
+    borrowing.request_borrow(students[0].id, class_.id, book, None)
+    students[0].active_borrows = 0
+    students[1].active_borrows = 5
+    db.session.commit()
+    runner = app.test_cli_runner()
+
+    report = runner.invoke(args=['reconcile-borrow-counts', '--dry-run']).output
+    assert 'student %d (Student0): counter 0, actual 1' % students[0].id in report
+    assert 'student %d (Student1): counter 5, actual 0' % students[1].id in report
+    db.session.expire_all()
+    assert len(borrowing.counter_drift()) == 2
+
+    assert 'Fixed 2 counters.' in runner.invoke(args=['reconcile-borrow-counts']).output
+    db.session.expire_all()
+    assert borrowing.counter_drift() == []
+    assert db.session.get(Student, students[0].id).active_borrows == 1
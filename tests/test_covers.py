@@ -0,0 +1,134 @@
+# test_covers.py
+
+from io import BytesIO
+from services.images import COVER_FORMATS, COVER_VARIANTS, variant_filename
+import pytest
+
+
+@pytest.fixture
+def uploads(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    (tmp_path / 'variants').mkdir()
+    return tmp_path
+
+
+def make_cover_files(uploads, filename):
+    """Write an original and every variant; returns their paths."""
+    names = [filename] + [variant_filename(filename, variant, ext)
+                          for variant in COVER_VARIANTS for ext in COVER_FORMATS]
+    paths = [uploads / name for name in names]
+    for path in paths:
+        path.write_bytes(b'image')
+    return paths
+
+
+@pytest.fixture
+def covered_book(factory, uploads):
+    class_ = factory.class_()
+    book = factory.book(class_, cover_filename='upload.jpg', cover_mirror='mirror_1_abc.jpg', cover_variants=True)
+    paths = make_cover_files(uploads, 'upload.jpg') + make_cover_files(uploads, 'mirror_1_abc.jpg')
+    return class_, book, paths
+
+
+def test_save_cover_strips_exif_and_writes_variants(ctx, uploads):
+    from PIL import Image
+    from werkzeug.datastructures import FileStorage
+    from services.images import save_cover
+    image = Image.new('RGB', (2000, 1000), 'red')
+    exif = Image.Exif()
+    exif[0x010F] = 'Phone'  # Make
+    upload = BytesIO()
+    image.save(upload, format='JPEG', exif=exif)
+    upload.seek(0)
+
+    filename, has_variants = save_cover(FileStorage(upload, filename='cover.jpg'))
+
+    assert has_variants
+    with Image.open(uploads / filename) as stored:
+        assert max(stored.size) == 1600
+        assert not stored.getexif()
+    for variant, width in COVER_VARIANTS.items():
+        for ext in COVER_FORMATS:
+            with Image.open(uploads / variant_filename(filename, variant, ext)) as resized:
+                assert resized.width == width
+
+
+def test_teacher_deleting_a_book_removes_its_cover_files(client, factory, login_as, covered_book, uploads):
+    class_, book, paths = covered_book
+    keep = make_cover_files(uploads, 'other.jpg')
+    login_as(factory.teacher('teacher', class_))
+
+    client.post(f'/delete_book/{book.id}')
+
+    assert not any(path.exists() for path in paths)
+    assert all(path.exists() for path in keep)
+
+
+def test_deleting_a_class_removes_its_books_cover_files(client, factory, login_as, covered_book):
+    from models import db, Class
+    class_, book, paths = covered_book
+    class_id = class_.id
+    login_as(factory.user('admin', 'admin'))
+
+    client.post(f'/delete_class/{class_id}')
+
+    assert db.session.get(Class, class_id) is None
+    assert not any(path.exists() for path in paths)
+
+
+def test_failed_deletion_keeps_the_files(client, factory, login_as, covered_book, monkeypatch):
+    from models import db
+    class_, book, paths = covered_book
+    login_as(factory.teacher('teacher', class_))
+
+    def fail():
+        raise RuntimeError('database unavailable')
+    monkeypatch.setattr(db.session, 'commit', fail)
+    client.post(f'/delete_book/{book.id}')
+
+    assert all(path.exists() for path in paths)
+
+
+def test_covers_are_served_as_immutable(client, uploads):
+    make_cover_files(uploads, 'upload.jpg')
+
+    response = client.get('/covers/' + variant_filename('upload.jpg', 'card', 'webp'))
+
+    assert response.status_code == 200
+    assert response.cache_control.public
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 365 * 24 * 3600
+
+
+def test_missing_mirror_redirects_to_the_original(client, factory, uploads):
+    class_ = factory.class_()
+    book = factory.book(class_, cover_url='http://covers/1.jpg')
+
+    response = client.get('/covers/' + variant_filename(f'mirror_{book.id}_abc.jpg', 'card', 'jpg'))
+
+    assert response.status_code == 302
+    assert response.location == 'http://covers/1.jpg'
+
+
+def test_download_cover_streams_into_a_buffer(app, monkeypatch):
+    from services import covers
+    chunks = [b'a' * 10, b'b' * 10, b'c' * 5]
+
+    class Response:
+        headers = {'Content-Type': 'image/jpeg'}
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def iter_content(self, size):
+            return iter(chunks)
+
+    monkeypatch.setattr(covers, 'get_with_retries', lambda url, **kwargs: Response())
+    with app.app_context():
+        assert covers.download_cover('http://covers/1.jpg') == (b''.join(chunks), 'jpg')
+        monkeypatch.setitem(app.config, 'COVER_MIRROR_MAX_BYTES', 20)
+        with pytest.raises(covers.CoverDownloadError):
+            covers.download_cover('http://covers/1.jpg')
@@ -0,0 +1,100 @@
+# test_database.py
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sqlite3
+import threading
+import time
+import pytest
+
+WRITERS = 4
+TRANSACTIONS = 500
+PAYLOAD = b'x' * 4000  # about one page per row
+PAUSE = 0.001  # seconds between a writer's transactions, like requests
+WAL_LIMIT = 2 * 1024 * 1024  # well under what the writers add up to
+
+
+@pytest.fixture
+def scratch_table(ctx):
+    from models import db
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql('CREATE TABLE wal_test (id INTEGER PRIMARY KEY, writer INTEGER, payload BLOB)')
+    yield
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql('DROP TABLE wal_test')
+
+
+def connect(app):
+    """A connection set up the way the app sets up its own, with auto-checkpoints off."""
+    from app import SQLITE_PRAGMAS
+    from services.database import apply_sqlite_pragmas
+    path = app.config['SQLALCHEMY_DATABASE_URI'].removeprefix('sqlite:///')
+    connection = sqlite3.connect(path, timeout=app.config['SQLITE_BUSY_TIMEOUT'] / 1000)
+    apply_sqlite_pragmas(connection, SQLITE_PRAGMAS)
+    # Leave checkpointing to the checkpointer thread alone
+    connection.execute('PRAGMA wal_autocheckpoint=0')
+    return connection
+
+
+def test_journal_mode_is_wal(ctx):
+    from models import db
+    with db.engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+
+
+def test_concurrent_writers_wait_and_the_checkpointer_bounds_the_wal(app, scratch_table, monkeypatch):
+    from services.database import start_wal_checkpointer
+    monkeypatch.setitem(app.config, 'SQLITE_CHECKPOINT_INTERVAL', 0.02)
+    monkeypatch.setitem(app.config, 'SQLITE_WAL_AUTOCHECKPOINT', 100)  # pages before a RESTART checkpoint
+    wal_path = app.config['SQLALCHEMY_DATABASE_URI'].removeprefix('sqlite:///') + '-wal'
+    barrier = threading.Barrier(WRITERS)
+    stop = threading.Event()
+    # Start from an empty log: the file never shrinks on its own
+    connection = connect(app)
+    connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    connection.close()
+    checkpointer = start_wal_checkpointer(app, stop)
+
+    def write(writer):
+        connection = connect(app)
+        largest_wal = 0
+        try:
+            barrier.wait()
+            for _ in range(TRANSACTIONS):
+                with connection:
+                    connection.execute('INSERT INTO wal_test (writer, payload) VALUES (?, ?)', (writer, PAYLOAD))
+                largest_wal = max(largest_wal, os.path.getsize(wal_path))
+                time.sleep(PAUSE)
+        finally:
+            connection.close()
+        return largest_wal
+
+    try:
+        # Any "database is locked" error is raised here
+        with ThreadPoolExecutor(max_workers=WRITERS) as pool:
+            largest_wal = max(pool.map(write, range(WRITERS)))
+    finally:
+        stop.set()
+        checkpointer.join()
+
+    connection = connect(app)
+    try:
+        assert connection.execute('SELECT count(*) FROM wal_test').fetchone()[0] == WRITERS * TRANSACTIONS
+    finally:
+        connection.close()
+    assert WRITERS * TRANSACTIONS * len(PAYLOAD) > 2 * WAL_LIMIT
+    assert largest_wal < WAL_LIMIT
+
+
+def test_checkpointer_starts_with_the_first_request_of_each_process(app, client, monkeypatch):
+    from services import database
+    started = []
+    monkeypatch.setattr(database, 'start_wal_checkpointer', started.append)
+    # As in a worker just forked from a process that had already started one
+    monkeypatch.setattr(database, '_checkpointer_pid', os.getpid() + 1)
+
+    client.get('/login')
+    client.get('/login')
+
+    assert started == [app]
+    assert database._checkpointer_pid == os.getpid()
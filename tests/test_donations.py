@@ -0,0 +1,63 @@
+# test_donations.py
+
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, select
+import threading
+import pytest
+
+THREADS = 6
+
+
+@pytest.fixture
+def donation(factory):
+    from models import db, DonationRequest
+    class_ = factory.class_()
+    teacher = factory.teacher('teacher', class_)
+    student = factory.student('student', class_)
+    donation = DonationRequest(title='Gift', author='Someone', student_id=student.id, class_id=class_.id)
+    db.session.add(donation)
+    db.session.commit()
+    return teacher, donation
+
+
+def flashes(client):
+    with client.session_transaction() as session:
+        return [message for _, message in session.get('_flashes', [])]
+
+
+def test_racing_approvals_add_the_book_once(app, login_as, donation):
+    from models import db, Book, DonationRequest, DonationState
+    teacher, donation = donation
+    donation_id, class_id = donation.id, donation.class_id
+    clients = [app.test_client() for _ in range(THREADS)]
+    for client in clients:
+        login_as(teacher, client)
+    barrier = threading.Barrier(THREADS)
+
+    def approve(client):
+        barrier.wait()
+        response = client.post(f'/approve_donation/{donation_id}')
+        assert response.status_code == 302
+        return flashes(client)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        messages = [message for result in pool.map(approve, clients) for message in result]
+
+    assert sum('has been approved' in message for message in messages) == 1
+    assert messages.count('This donation request has already been processed.') == THREADS - 1
+    db.session.expire_all()
+    assert db.session.scalar(select(func.count()).select_from(Book).where(Book.class_id == class_id)) == 1
+    assert db.session.get(DonationRequest, donation_id).state == DonationState.APPROVED
+
+
+def test_reject_after_approval_changes_nothing(client, login_as, donation):
+    from models import db, DonationRequest, DonationState
+    teacher, donation = donation
+    login_as(teacher)
+
+    client.post(f'/approve_donation/{donation.id}')
+    client.post(f'/reject_donation/{donation.id}')
+
+    assert flashes(client)[-1] == 'This donation request has already been processed.'
+    db.session.expire_all()
+    assert db.session.get(DonationRequest, donation.id).state == DonationState.APPROVED
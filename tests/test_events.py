@@ -0,0 +1,125 @@
+# test_events.py
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import func, select
+import subprocess
+import sys
+import time
+import pytest
+
+
+@pytest.fixture(params=['memory', 'database'])
+def broker(request, app, monkeypatch):
+    """A fresh broker of each kind in place of the app's own."""
+    from services.events import BROKERS
+    broker = BROKERS[request.param](app)
+    monkeypatch.setitem(app.extensions, 'class_events', broker)
+    return broker
+
+
+@pytest.fixture
+def teacher(factory, login_as):
+    class_ = factory.class_()
+    teacher = factory.teacher('teacher', class_)
+    login_as(teacher)
+    return teacher, class_
+
+
+def change(class_id, kind='borrow_requested'):
+    from models import db
+    from services.events import notify_class_change
+    notify_class_change(class_id, kind)
+    db.session.commit()
+
+
+def test_commit_wakes_waiting_listener(ctx, broker):
+    after_id = broker.latest(1)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        waiting = pool.submit(broker.wait, 1, after_id, 5)
+        time.sleep(0.1)
+        started = time.monotonic()
+        change(1)
+        event_id, kind = waiting.result()
+
+    assert time.monotonic() - started < 1
+    assert event_id > after_id
+    assert kind == 'borrow_requested'
+    # Other classes are not woken
+    assert broker.wait(2, broker.latest(2), 0.1) is None
+
+
+def test_rollback_publishes_nothing(ctx, broker):
+    from models import db, ClassEvent
+    from services.events import notify_class_change
+    after_id = broker.latest(1)
+
+    notify_class_change(1, 'borrow_requested')
+    db.session.rollback()
+    db.session.commit()  # A later commit must not send the discarded event
+
+    assert broker.wait(1, after_id, 0.2) is None
+    assert 'class_events' not in db.session.info
+    assert db.session.scalar(select(func.count()).select_from(ClassEvent)) == 0
+
+
+def test_database_broker_delivers_events_from_other_processes(ctx, app, monkeypatch):
+    from conftest import DB_PATH
+    from services.events import DatabaseBroker
+    monkeypatch.setitem(app.config, 'EVENT_POLL_INTERVAL', 0.2)
+    broker = DatabaseBroker(app)
+    after_id = broker.latest(1)
+
+    subprocess.run([sys.executable, '-c', (
+        'import sqlite3, sys\n'
+        'connection = sqlite3.connect(sys.argv[1])\n'
+        'connection.execute("INSERT INTO class_event (class_id, kind, created_at) VALUES (1, \'book_returned\', ?)",'
+        ' (sys.argv[2],))\n'
+        'connection.commit()\n'
+    ), DB_PATH, str(datetime.utcnow())], check=True)
+
+    event_id, kind = broker.wait(1, after_id, 5)
+    assert event_id > after_id
+    assert kind == 'book_returned'
+
+
+def read_stream(client, class_id, **headers):
+    response = client.get(f'/api/pending_requests/stream?class_id={class_id}', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    return response.get_data(as_text=True)
+
+
+@pytest.fixture
+def short_streams(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'EVENT_STREAM_TIMEOUT', 0.3)
+    monkeypatch.setitem(app.config, 'EVENT_HEARTBEAT', 0.1)
+
+
+def test_last_event_id_resumes_after_missed_events(client, teacher, short_streams):
+    from services.events import get_broker
+    teacher, class_ = teacher
+    change(class_.id, 'borrow_requested')
+    seen = get_broker().latest(class_.id)
+    change(class_.id, 'donation_requested')
+    newest = get_broker().latest(class_.id)
+
+    body = read_stream(client, class_.id, **{'Last-Event-ID': str(seen)})
+
+    # The missed change comes first, before any keep-alive
+    events = body.split('\n\n')
+    assert events[1] == f'id: {newest}\nevent: change\ndata: {{"kind": "donation_requested"}}'
+    # A new connection starts from the newest event instead
+    assert 'event: change' not in read_stream(client, class_.id)
+
+
+def test_stream_closes_after_timeout(client, teacher, short_streams):
+    teacher, class_ = teacher
+
+    started = time.monotonic()
+    body = read_stream(client, class_.id)
+
+    assert time.monotonic() - started < 2
+    assert body.startswith('retry: 3000\n\n')
+    assert ': keep-alive\n\n' in body
@@ -0,0 +1,123 @@
+# test_fragments.py
+
+from jinja2 import DictLoader
+from markupsafe import Markup
+import pytest
+
+
+@pytest.fixture
+def cache(app, monkeypatch):
+    """An in-memory fragment cache in place of the tests' "none" backend."""
+    from services.fragments import FragmentCache, MemoryBackend
+    cache = FragmentCache(MemoryBackend(app))
+    monkeypatch.setitem(app.extensions, 'fragment_cache', cache)
+    return cache
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Record the key of every fragment that had to be rendered."""
+    from services.fragments import FragmentCache
+    keys = []
+    fetch = FragmentCache.fetch
+
+    def counting_fetch(self, template_name, key, build):
+        def counted():
+            keys.append(key)
+            return build()
+        return fetch(self, template_name, key, counted)
+
+    monkeypatch.setattr(FragmentCache, 'fetch', counting_fetch)
+    return keys
+
+
+@pytest.fixture
+def student(app, factory, login_as, monkeypatch):
+    monkeypatch.setitem(app.config, 'BOOKS_PER_PAGE', 2)
+    class_ = factory.class_()
+    books = [factory.book(class_, f'Book {i}') for i in range(5)]
+    student = factory.student('student', class_)
+    login_as(student)
+    return student, class_, books
+
+
+def test_repeat_views_are_served_from_the_cache(client, cache, builds, student):
+    first = client.get('/').get_data(as_text=True)
+    second = client.get('/').get_data(as_text=True)
+
+    assert len(builds) == 1
+    assert second == first
+    assert 'Book 0' in second and 'Book 2' not in second
+
+
+def test_cursors_for_the_same_page_share_an_entry(client, cache, builds, student):
+    student, class_, books = student
+
+    forward = client.get(f'/?books_after={books[0].id}').get_data(as_text=True)
+    backward = client.get(f'/?books_before={books[3].id}').get_data(as_text=True)
+
+    # Both land on Book 1 and Book 2, which are rendered once
+    assert builds == [(class_.id, 0, books[1].id, books[2].id)]
+    for page in (forward, backward):
+        assert 'Book 1' in page and 'Book 2' in page and 'Book 3' not in page
+        assert 'books_before=%d' % books[1].id in page
+        assert 'books_after=%d' % books[2].id in page
+
+
+def test_class_changes_invalidate_the_grid(client, cache, builds, student):
+    from models import db
+    from services.events import notify_class_change
+    student, class_, books = student
+    client.get('/')
+
+    books[0].title = 'Renamed'
+    notify_class_change(class_.id, 'book_edited')
+    db.session.commit()
+
+    assert 'Renamed' in client.get('/').get_data(as_text=True)
+    assert len(builds) == 2
+
+
+def test_student_buttons_are_filled_in_per_student(client, factory, login_as, cache, builds, student):
+    from services import borrowing
+    student, class_, books = student
+    borrowing.request_borrow(student.id, class_.id, books[0], student.user_id)
+    other = factory.student('other', class_)
+
+    mine = client.get('/').get_data(as_text=True)
+    login_as(other)
+    theirs = client.get('/').get_data(as_text=True)
+
+    assert len(builds) == 1
+    assert 'Cancel Request' in mine and 'Cancel Request' not in theirs
+    assert '<!--slot:' not in mine + theirs
+
+
+def test_fill_slots():
+    from services.fragments import fill_slots, slot
+    html = Markup(f'<p>{slot("actions", 7, 1)}</p><p>{slot("other", 8)}</p>')
+
+    filled = fill_slots(html, 'actions', lambda book_id, lent: Markup(f'<b>{book_id}/{lent}</b>'))
+
+    assert filled == '<p><b>7/1</b></p><p><!--slot:other:8--></p>'
+    assert isinstance(filled, Markup)
+
+
+def test_template_digest_covers_imported_templates(app, ctx, monkeypatch):
+    from services.fragments import FragmentCache, NullBackend
+    templates = {
+        'grid.html': '{% from "cover.html" import cover %}{% include "card.html" %}{{ cover() }}',
+        'cover.html': '{% macro cover() %}<img>{% endmacro %}',
+        'card.html': '<div></div>',
+    }
+    monkeypatch.setattr(app.jinja_env, 'loader', DictLoader(templates))
+
+    def digest():
+        return FragmentCache(NullBackend(app))._template_digest('grid.html')
+
+    before = digest()
+    templates['cover.html'] = '{% macro cover() %}<img loading="lazy">{% endmacro %}'
+    after_import = digest()
+    templates['card.html'] = '<div class="card"></div>'
+
+    assert len({before, after_import, digest()}) == 3
@@ -0,0 +1,44 @@
+# test_identity.py
+
+import pytest
+
+
+@pytest.fixture
+def assigned(app, factory, login_as):
+    """A logged-in teacher of one class, and an admin client to unassign them."""
+    class_ = factory.class_('Robins')
+    teacher = factory.teacher('teacher', class_)
+    login_as(teacher)
+    admin = app.test_client()
+    login_as(factory.user('admin', 'admin'), client=admin)
+    return teacher, class_, admin
+
+
+def unassign(admin, class_, teacher):
+    response = admin.post(f'/unassign_teacher/{class_.id}/{teacher.id}')
+    assert response.status_code == 302
+
+
+@pytest.mark.parametrize('ttl', [0, 30])
+def test_unassigned_teacher_loses_access_immediately(app, client, assigned, monkeypatch, ttl):
+    monkeypatch.setitem(app.config, 'IDENTITY_CACHE_TTL', ttl)
+    teacher, class_, admin = assigned
+    assert b'Class: Robins' in client.get('/teacher').data
+    assert client.get(f'/api/pending_requests?class_id={class_.id}').status_code == 200
+
+    unassign(admin, class_, teacher)
+
+    assert b'Class: Robins' not in client.get('/teacher').data
+    response = client.get(f'/api/pending_requests?class_id={class_.id}')
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'You are not assigned to a class.'}
+
+
+def test_identity_cache_is_off_by_default(app, client, assigned):
+    from services.identity import identity_cache
+    teacher, class_, admin = assigned
+    assert app.config['IDENTITY_CACHE_TTL'] == 0
+
+    client.get('/teacher')
+
+    assert identity_cache.get(teacher.user_id) is None
@@ -0,0 +1,89 @@
+# test_metrics.py
+
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COUNTER = ('library_changes_total', (('kind', 'borrow_requested'),))
+GAUGE = ('library_http_requests_in_flight', ())
+
+
+def make_registry(directory):
+    from services.metrics import Registry
+    registry = Registry()
+    registry.configure(str(directory), interval=60)
+    return registry
+
+
+def snapshots(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.json') and name != 'archive.json')
+
+
+def test_adds_up_workers_and_archives_exited_ones(tmp_path):
+    registry = make_registry(tmp_path)
+    registry.inc('library_changes_total', 2, kind='borrow_requested')
+
+    worker = subprocess.Popen([sys.executable, '-c', (
+        'import sys\n'
+        'from services.metrics import Registry\n'
+        'registry = Registry()\n'
+        'registry.configure(sys.argv[1], 60)\n'
+        'registry.inc("library_changes_total", 3, kind="borrow_requested")\n'
+        'registry.set("library_http_requests_in_flight", 4)\n'
+        'registry.flush()\n'
+        'print("ready", flush=True)\n'
+        'sys.stdin.readline()\n'
+    ), str(tmp_path)], cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert worker.stdout.readline() == 'ready\n'
+        totals = registry.collect()
+        assert (totals[COUNTER], totals[GAUGE]) == (5, 4)
+    finally:
+        worker.communicate('\n')
+
+    # The exited worker's counters stay; its gauges and snapshot go
+    for _ in range(2):
+        totals = registry.collect()
+        assert totals[COUNTER] == 5
+        assert GAUGE not in totals
+    assert snapshots(tmp_path) == []
+
+
+def write_snapshot(directory, filename, started):
+    samples = [['library_changes_total', [['kind', 'borrow_requested']], 1],
+               ['library_http_requests_in_flight', [], 1]]
+    with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+        json.dump({'pid': os.getpid(), 'started': started, 'samples': samples}, f)
+
+
+def test_reused_pid_counts_as_exited(tmp_path):
+    from services.metrics import _process_started
+    started = _process_started(os.getpid())
+    if started is None:
+        pytest.skip('needs /proc')
+    registry = make_registry(tmp_path)
+    # Both carry this process's PID, but only one was written by this process
+    write_snapshot(tmp_path, 'live.json', started)
+    write_snapshot(tmp_path, 'reused.json', started - 1)
+
+    totals = registry.collect()
+
+    assert (totals[COUNTER], totals[GAUGE]) == (2, 1)
+    assert snapshots(tmp_path) == ['live.json']
+
+
+def test_endpoint_serves_the_text_format(app, client, monkeypatch):
+    client.get('/login')
+
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert '# TYPE library_http_request_duration_seconds histogram' in body
+    assert 'library_http_requests_total{blueprint="auth",endpoint="auth.login",method="GET",status="200"}' in body
+
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secret')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
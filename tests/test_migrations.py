@@ -0,0 +1,87 @@
+# test_migrations.py
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import downgrade, upgrade
+from sqlalchemy import select, text
+import os
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+def without_search_index(name, type_, parent_names):
+    """Skip the full-text index, which has no model (as migrations/env.py does)."""
+    return not (type_ == 'table' and name.startswith('book_search'))
+
+
+def schema_differences():
+    """What autogenerate would put in a new revision: empty while the migrations match models.py."""
+    from models import db
+    with db.engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={'include_name': without_search_index})
+        return compare_metadata(context, db.metadata)
+
+
+def test_migrations_match_models(ctx):
+    assert schema_differences() == []
+
+
+def test_downgrade_to_base_and_back(ctx):
+    downgrade(directory=MIGRATIONS, revision='base')
+    upgrade(directory=MIGRATIONS)
+    assert schema_differences() == []
+
+
+def test_states_are_filled_in_from_the_old_status_text(ctx):
+    from models import db, BorrowHistory, BorrowState, DonationRequest, DonationState
+    downgrade(directory=MIGRATIONS, revision='0b97f6e311a6')
+    for statement in [
+        "INSERT INTO user (id, username, password, role) VALUES (1, 'mrs_k', '', 'teacher'), (2, 'amal', '', 'student')",
+        "INSERT INTO teacher (id, name, user_id) VALUES (1, 'Mrs K', 1)",
+        "INSERT INTO student (id, name, user_id) VALUES (1, 'Amal', 2)",
+        "INSERT INTO class (id, name) VALUES (1, '3A')",
+        "INSERT INTO book (id, title, author, class_id) VALUES (1, 'Book', 'Author', 1)",
+        "INSERT INTO borrow_history (id, book_id, student_id, borrow_date, return_date, status) VALUES "
+        "(1, 1, 1, NULL, NULL, 'Pending approval'), "
+        "(2, 1, 1, '2024-10-01', NULL, 'Borrowed by Amal'), "
+        "(3, 1, 1, '2024-10-01', '2024-10-08', 'Returned by Amal'), "
+        "(4, 1, 1, NULL, NULL, 'Rejected by Mrs K')",
+        "INSERT INTO donation_request (id, title, author, student_id, class_id, status) VALUES "
+        "(1, 'Gift', 'Someone', 1, 1, 'Pending approval'), "
+        "(2, 'Gift', 'Someone', 1, 1, 'Approved'), "
+        "(3, 'Gift', 'Someone', 1, 1, 'Rejected by Mrs K')",
+    ]:
+        db.session.execute(text(statement))
+    db.session.commit()
+
+    upgrade(directory=MIGRATIONS)
+
+    borrows = db.session.execute(select(BorrowHistory.state, BorrowHistory.actor_id).order_by(BorrowHistory.id)).all()
+    assert borrows == [
+        (BorrowState.PENDING, None),
+        (BorrowState.BORROWED, None),
+        (BorrowState.RETURNED, 2),
+        (BorrowState.REJECTED, 1),
+    ]
+    donations = db.session.scalars(select(DonationRequest.state).order_by(DonationRequest.id)).all()
+    assert donations == [DonationState.PENDING, DonationState.APPROVED, DonationState.REJECTED]
+
+
+def test_active_borrows_are_counted_from_the_history(ctx):
+    from models import db, BorrowState, Student
+    downgrade(directory=MIGRATIONS, revision='0f674d230e73')
+    for statement in [
+        "INSERT INTO user (id, username, password, role) VALUES (1, 'amal', '', 'student'), (2, 'bilal', '', 'student')",
+        "INSERT INTO student (id, name, user_id) VALUES (1, 'Amal', 1), (2, 'Bilal', 2)",
+        "INSERT INTO class (id, name) VALUES (1, '3A')",
+        "INSERT INTO book (id, title, author, class_id) VALUES (1, 'Book', 'Author', 1)",
+        "INSERT INTO borrow_history (book_id, student_id, status, state) VALUES "
+        f"(1, 1, '', {BorrowState.PENDING:d}), (1, 1, '', {BorrowState.BORROWED:d}), "
+        f"(1, 1, '', {BorrowState.RETURNED:d}), (1, 2, '', {BorrowState.REJECTED:d})",
+    ]:
+        db.session.execute(text(statement))
+    db.session.commit()
+
+    upgrade(directory=MIGRATIONS)
+
+    assert db.session.execute(select(Student.id, Student.active_borrows).order_by(Student.id)).all() == [(1, 2), (2, 0)]
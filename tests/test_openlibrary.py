@@ -0,0 +1,116 @@
+# test_openlibrary.py
+
+from datetime import datetime
+import pytest
+
+ISBN = '9780000000001'
+DETAILS = {'title': 'The Hobbit', 'authors': [{'name': 'J. R. R. Tolkien'}], 'covers': [42]}
+
+
+def test_found(ctx, openlibrary):
+    from services.openlibrary import fetch_book_details
+    openlibrary.answers[ISBN] = DETAILS
+
+    details = fetch_book_details(ISBN)
+
+    assert details == {
+        'title': 'The Hobbit',
+        'author': 'J. R. R. Tolkien',
+        'cover_url': f'{openlibrary.url}/b/id/42-M.jpg',
+    }
+
+
+@pytest.mark.parametrize('answer', [None, 404], ids=['empty', 'http_404'])
+def test_not_found(ctx, openlibrary, answer):
+    from models import db, IsbnMetadata
+    from services.openlibrary import lookup_isbn
+    if answer:
+        openlibrary.answers[ISBN] = answer
+
+    assert lookup_isbn(ISBN) is None
+    # Cached as a miss, for the shorter negative TTL
+    row = db.session.get(IsbnMetadata, ISBN)
+    assert row.found is False
+    assert row.expires_at > datetime.utcnow()
+
+
+@pytest.mark.parametrize('answer', [503, ('sleep', 1)], ids=['http_503', 'timeout'])
+def test_error_is_retried_then_raised_and_not_cached(ctx, openlibrary, answer):
+    from models import db, IsbnMetadata
+    from services.openlibrary import OpenLibraryError, lookup_isbn
+    openlibrary.answers[ISBN] = answer
+
+    with pytest.raises(OpenLibraryError):
+        lookup_isbn(ISBN)
+
+    assert openlibrary.requests == [ISBN, ISBN]  # OPENLIBRARY_RETRIES is 1
+    assert db.session.get(IsbnMetadata, ISBN) is None
+
+
+def test_cache_hit_makes_no_second_request(ctx, openlibrary):
+    from services.openlibrary import isbn_cache, lookup_isbn
+    openlibrary.answers[ISBN] = DETAILS
+
+    first = lookup_isbn(ISBN)
+    assert lookup_isbn('978-0-00-000000-1') == first
+    assert openlibrary.requests == [ISBN]
+
+    # A new worker process: only the database layer is left
+    isbn_cache._entries.clear()
+    assert lookup_isbn(ISBN) == first
+    assert openlibrary.requests == [ISBN]
+
+
+def test_admin_api_counts_lookups_by_result(client, factory, login_as, openlibrary):
+    from services.openlibrary import OpenLibraryError, isbn_cache, lookup_isbn
+    login_as(factory.user('admin', 'admin'))
+    before = client.get('/admin/api/isbn_cache').json
+    openlibrary.answers[ISBN] = DETAILS
+    openlibrary.answers['9780000000002'] = 503
+
+    lookup_isbn(ISBN)
+    lookup_isbn(ISBN)
+    isbn_cache._entries.clear()
+    lookup_isbn(ISBN)
+    lookup_isbn('9780000000003')
+    with pytest.raises(OpenLibraryError):
+        lookup_isbn('9780000000002')
+    stats = client.get('/admin/api/isbn_cache').json
+
+    results = ('memory_hit', 'db_hit', 'found', 'not_found', 'error')
+    assert [stats[result] - before[result] for result in results] == [1, 1, 1, 1, 1]
+    assert stats['memory_entries'] == 2
+    assert 0 < stats['hit_ratio'] < 1
+
+
+@pytest.fixture
+def donation(factory, monkeypatch, app):
+    from models import db, DonationRequest
+    monkeypatch.setitem(app.config, 'BACKGROUND_TASKS_EAGER', True)
+    class_ = factory.class_()
+    teacher = factory.teacher('teacher', class_)
+    student = factory.student('student', class_)
+    donation = DonationRequest(title='Gift', author='Someone', isbn='978-0-00-000000-1',
+                               student_id=student.id, class_id=class_.id)
+    db.session.add(donation)
+    db.session.commit()
+    return teacher, donation
+
+
+@pytest.mark.parametrize('answer, title, author', [
+    (DETAILS, 'The Hobbit', 'J. R. R. Tolkien'),
+    (503, 'Gift', 'Someone'),
+], ids=['found', 'http_503'])
+def test_approved_donation_is_filled_in_by_the_background_job(client, login_as, openlibrary, donation,
+                                                              answer, title, author):
+    from models import db, Book
+    teacher, donation = donation
+    openlibrary.answers[ISBN] = answer
+    login_as(teacher)
+
+    response = client.post(f'/approve_donation/{donation.id}')
+
+    assert response.status_code == 302
+    db.session.expire_all()
+    book = db.session.scalars(db.select(Book)).one()
+    assert (book.title, book.author) == (title, author)
@@ -0,0 +1,71 @@
+# test_perf.py
+
+from sqlalchemy import text
+import re
+import pytest
+
+from test_query_budget import count_queries, seed_class
+
+
+@pytest.fixture
+def monitor(app, monkeypatch):
+    """The app's monitor with its buffers emptied for this test."""
+    from collections import deque
+    from services.perf import get_perf_monitor
+    monitor = get_perf_monitor()
+    monkeypatch.setattr(monitor, 'routes', {})
+    monkeypatch.setattr(monitor, 'slow_queries', deque(maxlen=monitor.slow_queries.maxlen))
+    monkeypatch.setattr(monitor, 'repeated_queries', deque(maxlen=monitor.repeated_queries.maxlen))
+    return monitor
+
+
+def server_timing_queries(response):
+    timing = ', '.join(response.headers.getlist('Server-Timing'))
+    assert 'total;dur=' in timing
+    return int(re.search(r'desc="(\d+) queries"', timing).group(1))
+
+
+@pytest.mark.parametrize('user, url', [('student', '/'), ('teacher', '/teacher')])
+def test_counts_every_statement_of_the_request(app, client, factory, login_as, monitor, user, url):
+    teacher, students = seed_class(factory, 5)
+    login_as(teacher if user == 'teacher' else students[0])
+
+    with count_queries(app) as statements:
+        response = client.get(url)
+
+    assert response.status_code == 200
+    assert server_timing_queries(response) == len(statements)
+    endpoint = 'teacher.teacher_dashboard' if user == 'teacher' else 'student.index'
+    summary, = [route for route in monitor.worst_routes() if route['endpoint'] == endpoint]
+    assert (summary['requests'], summary['queries']) == (1, len(statements))
+
+
+def test_repeated_and_slow_statements_are_logged(app, factory, monitor, monkeypatch):
+    from flask import Response
+    from models import db
+    monkeypatch.setattr(monitor, 'slow_ms', 0)
+    class_ = factory.class_()
+    book_ids = [factory.book(class_, f'Book {i}').id for i in range(monitor.repeat_threshold)]
+
+    # A view that loads books one at a time
+    with app.test_request_context('/teacher'):
+        monitor.start_request()
+        for book_id in book_ids:
+            db.session.execute(text('SELECT title FROM book WHERE id = :id'), {'id': book_id})
+        monitor.finish_request(Response('ok'))
+
+    repeated, = monitor.repeated_queries
+    assert (repeated.endpoint, repeated.count) == ('teacher.teacher_dashboard', monitor.repeat_threshold)
+    slow = [query for query in monitor.slow_queries if query.statement.startswith('SELECT title FROM book')]
+    assert len(slow) == monitor.repeat_threshold
+    assert 'USING INTEGER PRIMARY KEY' in slow[0].plan
+
+
+def test_perf_page_is_for_admins(client, factory, login_as, monitor):
+    login_as(factory.user('admin', 'admin'))
+    client.get('/admin')
+
+    page = client.get('/admin/perf')
+
+    assert page.status_code == 200
+    assert b'admin.admin_dashboard' in page.data
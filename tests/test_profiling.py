@@ -0,0 +1,69 @@
+# test_profiling.py
+
+from flask import Flask
+import json
+import os
+import pstats
+import pytest
+
+
+def make_app(tmp_path, enabled, **config):
+    from config import Config
+    from routes.admin import admin_bp
+    from services.profiling import init_profiler
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(PROFILING_ENABLED=enabled, PROFILE_DIR=str(tmp_path), **config)
+    init_profiler(app)
+    app.register_blueprint(admin_bp)  # For the download URLs
+    app.add_url_rule('/hello', 'hello', lambda: 'hello')
+    return app
+
+
+def test_disabled_by_default(app):
+    assert app.config['PROFILING_ENABLED'] is False
+    assert 'profiler' not in app.extensions
+
+
+def test_nothing_is_installed_when_disabled(tmp_path):
+    app = make_app(tmp_path, enabled=False)
+    assert 'profiler' not in app.extensions
+    assert not app.before_request_funcs
+    assert 'X-Profile' not in app.test_client().get('/hello', headers={'X-Profile': '1'}).headers
+    assert not app.after_request_funcs
+    assert not app.teardown_request_funcs
+
+
+def test_hooks_are_installed_when_enabled(tmp_path):
+    app = make_app(tmp_path, enabled=True)
+    hooks = app.extensions['profiler']
+    assert app.before_request_funcs[None] == [hooks.start]
+    assert app.after_request_funcs[None] == [hooks.finish]
+    assert app.teardown_request_funcs[None] == [hooks.abandon]
+
+
+def test_profiles_page_says_profiling_is_off(client, factory, login_as):
+    login_as(factory.user('admin', 'admin'))
+    response = client.get('/admin/profiles', follow_redirects=True)
+    assert b'PROFILING_ENABLED=on' in response.data
+
+
+@pytest.mark.parametrize('kind, suffix', [('pstats', '.prof'), ('speedscope', '.speedscope.json')])
+def test_token_profiles_one_request(tmp_path, kind, suffix):
+    app = make_app(tmp_path, enabled=True, PROFILE_TOKEN='secret', PROFILE_KEEP=1)
+    client = app.test_client()
+
+    assert 'X-Profile' not in client.get('/hello').headers
+    assert 'X-Profile' not in client.get('/hello', headers={'X-Profile': 'guess'}).headers
+    client.get('/hello?profile=secret')
+    response = client.get(f'/hello?profile=secret&profile_format={kind}')
+
+    filename, = os.listdir(tmp_path)  # The older profile was rotated out
+    assert filename.endswith('-hello' + suffix)
+    assert response.headers['X-Profile'] == f'/admin/profiles/{filename}'
+    path = os.path.join(tmp_path, filename)
+    if kind == 'pstats':
+        assert pstats.Stats(path).total_calls > 0
+    else:
+        with open(path, encoding='utf-8') as f:
+            assert json.load(f)['profiles'][0]['type'] == 'evented'
@@ -0,0 +1,125 @@
+# test_query_budget.py
+"""The main pages run a fixed number of statements, however many rows they show."""
+
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import event
+import threading
+import pytest
+
+# Ceilings for one page view; raise them only together with a look at
+# what the new statements are
+STUDENT_INDEX_QUERIES = 11
+TEACHER_DASHBOARD_QUERIES = 12
+ADMIN_DASHBOARD_QUERIES = 7
+
+
+@contextmanager
+def count_queries(app):
+    from models import db
+    with app.app_context():
+        engine = db.engine
+    statements = []
+    thread = threading.get_ident()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        # Only this request's statements, not those of background threads
+        if threading.get_ident() == thread:
+            statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def seed_class(factory, size):
+    """A class with a teacher and `size` students, books, requests, loans and donations."""
+    from models import db, BorrowHistory, BorrowState, DonationRequest
+    class_ = factory.class_()
+    teacher = factory.teacher('teacher', class_)
+    students = [factory.student(f'student{i}', class_) for i in range(size)]
+    books = [factory.book(class_, f'Book {i}', isbn=f'97800000000{i:02d}') for i in range(2 * size)]
+    now = datetime.utcnow()
+    for student, lent, requested in zip(students, books[:size], books[size:]):
+        lent.borrowed_by_id = student.id
+        lent.borrowed_date = now
+        lent.donated_by_id = student.id
+        db.session.add_all([
+            BorrowHistory(book_id=lent.id, student_id=student.id, state=BorrowState.BORROWED, borrow_date=now),
+            BorrowHistory(book_id=requested.id, student_id=student.id, state=BorrowState.PENDING, borrow_date=now),
+            DonationRequest(title='Gift', author='Someone', student_id=student.id, class_id=class_.id),
+        ])
+    db.session.commit()
+    return teacher, students
+
+
+@pytest.mark.parametrize('size', [2, 10])
+def test_student_index(app, client, factory, login_as, size):
+    teacher, students = seed_class(factory, size)
+    login_as(students[0])
+
+    with count_queries(app) as statements:
+        response = client.get('/')
+
+    assert response.status_code == 200
+    assert len(statements) <= STUDENT_INDEX_QUERIES, '\n\n'.join(statements)
+
+
+@pytest.mark.parametrize('size', [2, 10])
+def test_teacher_dashboard(app, client, factory, login_as, size):
+    teacher, students = seed_class(factory, size)
+    login_as(teacher)
+
+    with count_queries(app) as statements:
+        response = client.get('/teacher')
+
+    assert response.status_code == 200
+    assert len(statements) <= TEACHER_DASHBOARD_QUERIES, '\n\n'.join(statements)
+
+
+@pytest.mark.parametrize('size', [2, 10])
+def test_admin_dashboard(app, client, factory, login_as, monkeypatch, size):
+    monkeypatch.setitem(app.config, 'ADMIN_PAGE_SIZE', 5)
+    seed_class(factory, size)
+    for i in range(size):
+        factory.book(factory.class_(f'Class {i + 2}'))
+    login_as(factory.user('admin', 'admin'))
+
+    with count_queries(app) as statements:
+        response = client.get('/admin')
+
+    assert response.status_code == 200
+    assert len(statements) <= ADMIN_DASHBOARD_QUERIES, '\n\n'.join(statements)
+
+
+def test_unchanged_pending_requests_poll_is_one_query(app, client, factory, login_as):
+    teacher, students = seed_class(factory, 10)
+    login_as(teacher)
+    first = client.get('/api/pending_requests')
+    assert first.status_code == 200
+    assert len(first.json['borrow_requests']) == 10
+
+    with count_queries(app) as statements:
+        response = client.get('/api/pending_requests', headers={'If-None-Match': first.headers['ETag']})
+
+    assert response.status_code == 304
+    assert response.headers['ETag'] == first.headers['ETag']
+    assert len(statements) == 1, '\n\n'.join(statements)
+
+
+def test_class_change_invalidates_pending_requests_etag(client, factory, login_as):
+    from models import db
+    from services.events import notify_class_change
+    teacher, students = seed_class(factory, 2)
+    login_as(teacher)
+    etag = client.get('/api/pending_requests').headers['ETag']
+
+    notify_class_change(teacher.classes[0].id, 'borrow_requested')
+    db.session.commit()
+    response = client.get('/api/pending_requests', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert client.get('/api/pending_requests', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
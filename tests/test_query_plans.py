@@ -0,0 +1,63 @@
+# test_query_plans.py
+"""The hot lookups must be index searches, not table scans, whatever the table sizes."""
+
+from sqlalchemy import func, select, text
+import pytest
+
+
+def query_plan(statement):
+    from models import db
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    rows = db.session.execute(text('EXPLAIN QUERY PLAN ' + sql)).all()
+    return '\n'.join(row[-1] for row in rows)
+
+
+@pytest.fixture
+def statements(ctx):
+    from models import Book, BorrowHistory, BorrowState, DonationRequest, DonationState
+    active_states = [BorrowState.PENDING, BorrowState.BORROWED]
+    return {
+        # The student's open requests and borrows (student index, borrow limit)
+        'student_active': select(BorrowHistory.book_id, BorrowHistory.id, BorrowHistory.state).where(
+            BorrowHistory.student_id == 1, BorrowHistory.state.in_(active_states)
+        ),
+        # Open requests and borrows for one book (teacher dashboard)
+        'book_active': select(BorrowHistory.id).where(
+            BorrowHistory.book_id == 1, BorrowHistory.state.in_(active_states)
+        ),
+        # A page of a book's history, newest first (book details)
+        'book_history': select(BorrowHistory.id).where(BorrowHistory.book_id == 1, BorrowHistory.id < 100)
+            .order_by(BorrowHistory.id.desc()).limit(10),
+        # A page of a student's history, newest first (student index and history)
+        'student_history': select(BorrowHistory.id).where(BorrowHistory.student_id == 1, BorrowHistory.id < 100)
+            .order_by(BorrowHistory.id.desc()).limit(10),
+        # Books free to lend in a class
+        'class_available': select(Book.id).where(Book.class_id == 1, Book.borrowed_by_id.is_(None)),
+        # Per-class book and borrowed counts on the admin dashboard
+        'class_counts': select(Book.class_id, func.count(), func.count(Book.borrowed_by_id))
+            .where(Book.class_id.in_([1, 2, 3])).group_by(Book.class_id),
+        # Pending donations for a class (teacher dashboard)
+        'class_donations': select(DonationRequest.id).where(
+            DonationRequest.class_id == 1, DonationRequest.state == DonationState.PENDING
+        ),
+        # A student's donations (student index)
+        'student_donations': select(DonationRequest.id).where(DonationRequest.student_id == 1),
+    }
+
+
+@pytest.mark.parametrize('name, index', [
+    ('student_active', 'ix_borrow_history_student_state'),
+    ('book_active', 'ix_borrow_history_book_state'),
+    ('book_history', 'ix_borrow_history_book_id'),
+    ('student_history', 'ix_borrow_history_student_id'),
+    ('class_available', 'ix_book_state'),
+    ('class_counts', 'ix_book_state'),
+    ('class_donations', 'ix_donation_request_class_state'),
+    ('student_donations', 'ix_donation_request_student_id'),
+])
+def test_lookup_uses_index(statements, name, index):
+    plan = query_plan(statements[name])
+    assert f'INDEX {index} ' in plan, plan
+    assert 'SCAN borrow_history' not in plan, plan
+    assert 'SCAN book' not in plan, plan
+    assert 'SCAN donation_request' not in plan, plan
@@ -0,0 +1,97 @@
+# test_search.py
+
+from flask_migrate import downgrade, upgrade
+from sqlalchemy import text
+import os
+import pytest
+
+
+def titles(class_, search):
+    from services.search import search_books
+    return [str(result['title']) for result in search_books(class_.id, search)]
+
+
+@pytest.fixture
+def class_(factory):
+    return factory.class_()
+
+
+def test_index_follows_inserts_updates_and_deletes(ctx, factory, class_):
+    from models import db
+    book = factory.book(class_, 'The Hobbit', author='Tolkien', isbn='978-0-261-10221-7')
+    assert titles(class_, 'hob') == ['The <mark>Hobbit</mark>']
+    assert titles(class_, '9780261') == ['The Hobbit']
+
+    book.title = 'The Silmarillion'
+    book.isbn = None
+    db.session.commit()
+    assert titles(class_, 'hobbit') == []
+    assert titles(class_, '9780261') == []
+    assert titles(class_, 'silmarillion tolk') == ['The <mark>Silmarillion</mark>']
+
+    db.session.delete(book)
+    db.session.commit()
+    assert titles(class_, 'silmarillion') == []
+    assert db.session.execute(text('SELECT count(*) FROM book_search')).scalar() == 0
+
+
+def test_index_follows_cascaded_deletes(ctx, factory, class_):
+    from models import db
+    factory.book(class_, 'Matilda')
+    db.session.execute(text('DELETE FROM class WHERE id = :id'), {'id': class_.id})
+    db.session.commit()
+
+    assert db.session.execute(text('SELECT count(*) FROM book_search')).scalar() == 0
+
+
+def test_search_is_limited_to_the_class(ctx, factory, class_):
+    other = factory.class_('Class 2')
+    factory.book(class_, 'Matilda')
+    factory.book(other, 'Matilda the Musical')
+    factory.book(other, 'Class 1')  # The class is matched as its own column only
+
+    assert titles(class_, 'matilda') == ['<mark>Matilda</mark>']
+    assert titles(other, 'matilda') == ['<mark>Matilda</mark> the Musical']
+    assert titles(class_, 'class') == []
+
+
+def test_query_syntax_and_markup_are_not_interpreted(ctx, factory, class_):
+    factory.book(class_, 'Fish & <Chips>')
+
+    assert titles(class_, 'chips" OR "x') == []
+    assert titles(class_, 'chips') == ['Fish &amp; &lt;<mark>Chips</mark>&gt;']
+    assert titles(class_, '"*') == []
+
+
+def test_migration_indexes_existing_books(ctx, factory, class_):
+    from conftest import ROOT
+    from models import db
+    migrations = os.path.join(ROOT, 'migrations')
+    downgrade(directory=migrations, revision='7b153e8982a1')
+    db.session.execute(text("INSERT INTO book (title, author, class_id) VALUES ('Wonder', 'Palacio', :id)"),
+                       {'id': class_.id})
+    db.session.commit()
+
+    upgrade(directory=migrations)
+
+    assert titles(class_, 'palacio') == ['Wonder']
+
+
+def test_teachers_only_search_their_classes(client, factory, login_as, class_):
+    other = factory.class_('Class 2')
+    factory.book(class_, 'Matilda')
+    login_as(factory.teacher('teacher', class_))
+
+    response = client.get(f'/teacher/api/search?class_id={class_.id}&q=mat')
+    assert [result['title'] for result in response.json['results']] == ['<mark>Matilda</mark>']
+    assert client.get(f'/teacher/api/search?class_id={other.id}&q=mat').status_code == 403
+
+
+def test_students_search_their_own_class(client, factory, login_as, class_):
+    factory.book(class_, 'Matilda')
+    login_as(factory.student('student', class_))
+
+    results = client.get('/api/search?q=matilda').json['results']
+
+    assert [result['title'] for result in results] == ['<mark>Matilda</mark>']
+    assert results[0]['url'] == f'/book_details/{results[0]["id"]}'
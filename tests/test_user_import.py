@@ -0,0 +1,57 @@
+# test_user_import.py
+
+from sqlalchemy import select
+from werkzeug.security import check_password_hash
+
+
+def run_import(text, **kwargs):
+    from services.user_import import import_users
+    progress = None
+    for progress in import_users(text.splitlines(keepends=True), **kwargs):
+        pass
+    return progress
+
+
+def test_import_creates_users_in_their_classes(ctx, factory):
+    from models import db, Student, Teacher, User
+    factory.class_('3A')
+    factory.class_('3B')
+
+    progress = run_import(
+        'username,name,class,password,role\n'
+        'amal,Amal,3A,secret,\n'
+        'bilal,Bilal,3B,,\n'
+        'mrs_k,Mrs K,3A,chalk,teacher\n'
+    )
+
+    assert (progress.processed, progress.created, progress.errors) == (3, 3, [])
+    assert [username for username, _ in progress.passwords] == ['bilal']
+    users = {user.username: user for user in db.session.scalars(select(User))}
+    assert check_password_hash(users['amal'].password, 'secret')
+    assert check_password_hash(users['bilal'].password, progress.passwords[0][1])
+    assert [c.name for c in db.session.scalars(select(Student)).first().classes] == ['3A']
+    teacher = db.session.scalars(select(Teacher)).one()
+    assert (teacher.user.role, [c.name for c in teacher.classes]) == ('teacher', ['3A'])
+
+
+def test_ambiguous_and_unknown_classes_are_rejected(ctx, factory):
+    from models import db, User
+    factory.class_('3A')
+    factory.class_('Year 4')
+    factory.class_('Year 4')
+
+    progress = run_import(
+        'username,name,class\n'
+        'amal,Amal,3A\n'
+        'bilal,Bilal,Year 4\n'
+        'chris,Chris,5C\n'
+        'amal,Amal again,3A\n'
+    )
+
+    assert progress.created == 1
+    assert progress.errors == [
+        (3, 'bilal', 'more than one class is named "Year 4"'),
+        (4, 'chris', 'unknown class "5C"'),
+        (5, 'amal', 'username appears more than once in the file'),
+    ]
+    assert db.session.scalars(select(User.username)).all() == ['amal']